@@ -0,0 +1,5 @@
+
+"""
+Headless benchmarks for the query and render paths of toolship. Run them with
+`python -m benchmarks` from the repository root (see `README.md`).
+"""
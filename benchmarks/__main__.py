@@ -0,0 +1,66 @@
+
+import argparse
+import fnmatch
+import os
+import sys
+import typing as t
+
+from . import bench_argparse, bench_files, bench_hotkeys, bench_manager, bench_render  # noqa: F401 (registers benchmarks)
+from .harness import Recorder, SkipBenchmark, compare, environment, get_benchmarks, \
+  load_baseline, print_results, save_baseline
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(prog='python -m benchmarks')
+  parser.add_argument('-k', '--filter', default='*', help='run only the benchmarks matching this glob pattern')
+  parser.add_argument('--scale', type=float, default=1.0, help='scale the number of iterations')
+  parser.add_argument('--save', metavar='NAME', nargs='?', const='', help='save the results as a baseline '
+    '(default name: the toolship-core version)')
+  parser.add_argument('--compare', metavar='NAME', nargs='?', const='', help='compare the results against a '
+    'baseline and exit with status 1 if there are regressions (default name: the toolship-core version)')
+  parser.add_argument('--threshold', type=float, default=0.25, help='the fraction by which a measurement may '
+    'get slower before it is considered a regression (default: %(default)s)')
+  args = parser.parse_args()
+
+  def _baseline_path(name: str) -> str:
+    name = name or environment()['version']
+    return name if name.endswith('.json') else os.path.join(BASELINE_DIR, name + '.json')
+
+  results: t.Dict[str, t.Dict[str, float]] = {}
+  skipped = []
+  for name, func in get_benchmarks().items():
+    if not fnmatch.fnmatch(name, args.filter):
+      continue
+    recorder = Recorder(name, args.scale)
+    try:
+      func(recorder)
+    except SkipBenchmark as exc:
+      print(f'skipped {name}: {exc}', file=sys.stderr)
+      skipped.append(name)
+      continue
+    results.update(recorder.results)
+
+  print_results(results)
+
+  if args.save is not None:
+    if skipped:
+      # A baseline without these benchmarks could not catch their regressions.
+      sys.exit(f'error: not saving a baseline because benchmarks were skipped: {", ".join(skipped)}')
+    path = _baseline_path(args.save)
+    save_baseline(path, results)
+    print(f'saved baseline to {path}')
+
+  if args.compare is not None:
+    baseline = load_baseline(_baseline_path(args.compare))
+    baseline = {key: value for key, value in baseline.items() if fnmatch.fnmatch(key.split('.', 1)[0], args.filter)}
+    regressions = compare(baseline, results, args.threshold)
+    for regression in regressions:
+      print('regression:', regression, file=sys.stderr)
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
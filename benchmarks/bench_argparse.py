@@ -0,0 +1,14 @@
+
+from toolship.core.query import Query
+from .harness import Recorder, benchmark
+from .synthetic import SyntheticArgparsingPlugin
+
+
+@benchmark('argparse')
+def bench_argparse(recorder: Recorder) -> None:
+  plugin = SyntheticArgparsingPlugin()
+  recorder.measure('match_search_query.miss', lambda: plugin.match_search_query('other query'), repeat=2000)
+  recorder.measure('match_search_query.hit', lambda: plugin.match_search_query('syn alpha -n 3'), repeat=2000)
+  # A pre-tokenized query, as it is shared between plugins by the Toolship.
+  query = Query('syn alpha -n 3')
+  recorder.measure('match_search_query.hit.shared-query', lambda: plugin.match_search_query(query), repeat=2000)
@@ -0,0 +1,38 @@
+import os
+import random
+import tempfile
+import typing as t
+
+from .harness import Recorder, SkipBenchmark, benchmark
+
+_WORDS = ['src', 'lib', 'core', 'test', 'util', 'plugin', 'manager', 'index', 'docs', 'build',
+  'config', 'main', 'model', 'view', 'query', 'cache', 'files', 'render', 'hotkeys', 'data']
+_EXTENSIONS = ['.py', '.md', '.txt', '.json', '.yml', '.c', '.h', '']
+
+
+def make_paths(count: int, seed: int = 0) -> t.List[str]:
+  rng = random.Random(seed)
+  paths = []
+  for idx in range(count):
+    parts = [rng.choice(_WORDS) + (str(rng.randrange(100)) if rng.random() < 0.3 else '')
+      for _ in range(rng.randint(2, 7))]
+    paths.append('/home/user/' + '/'.join(parts) + f'_{idx}' + rng.choice(_EXTENSIONS))
+  return paths
+
+
+@benchmark('files')
+def bench_files(recorder: Recorder) -> None:
+  try:
+    from toolship.files.index import FileIndex, build_index
+  except ImportError as exc:
+    raise SkipBenchmark(str(exc))
+
+  with tempfile.TemporaryDirectory() as tmp:
+    path = os.path.join(tmp, 'files.idx')
+    paths = make_paths(100000)
+    recorder.measure('build_index.100000', lambda: build_index(path, paths), repeat=1, warmup=0)
+    index = FileIndex(path)
+    for name, terms in [('rare', ['manager42_']), ('common', ['plugin']), ('multi', ['core', 'index']),
+                        ('short', ['py']), ('none', ['xyzzy'])]:
+      recorder.measure(f'FileIndex.search.{name}', lambda: index.search(terms, 50), repeat=100)
+    del index
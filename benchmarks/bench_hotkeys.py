@@ -0,0 +1,21 @@
+
+from .harness import Recorder, SkipBenchmark, benchmark
+
+
+@benchmark('hotkeys')
+def bench_hotkeys(recorder: Recorder) -> None:
+  try:
+    from pynput.keyboard import KeyCode
+    from toolship.core.hotkeys import HotkeyListener
+  except ImportError as exc:
+    raise SkipBenchmark(str(exc))
+
+  for count in (1, 50):
+    listener = HotkeyListener()
+    for idx in range(count):
+      listener.add(f'ctrl+alt+{chr(ord("a") + idx % 26)}+{idx}', lambda: None)
+    key = KeyCode(char='x')
+    def _event() -> None:
+      listener._on_down(key)
+      listener._on_up(key)
+    recorder.measure(f'HotkeyListener._on_down.{count}', _event, repeat=5000)
@@ -0,0 +1,67 @@
+
+import itertools
+import random
+import typing as t
+
+from toolship.core.cache import QueryCache
+from toolship.core.manager import Toolship
+from .harness import Recorder, benchmark
+from .synthetic import WORDS, SyntheticPlugin, make_catalog
+
+
+def _queries(seed: int = 0) -> t.Iterator[str]:
+  rng = random.Random(seed)
+  while True:
+    word = rng.choice(WORDS)
+    for length in range(1, len(word) + 1):
+      yield word[:length]
+
+
+def _make_toolship(
+  parallel: bool,
+  latencies: t.List[float],
+  count: int,
+  failure_rate: float = 0.0,
+  cacheable: bool = False,
+  **kwargs: t.Any,
+) -> Toolship:
+  toolship = Toolship(parallel=parallel, **kwargs)
+  for idx, latency in enumerate(latencies):
+    toolship.add_plugin(f'syn{idx}', SyntheticPlugin(count, latency, failure_rate, cacheable=cacheable, seed=idx))
+  return toolship
+
+
+@benchmark('manager')
+def bench_manager(recorder: Recorder) -> None:
+  # Pure overhead of the manager: fast plugins without latency.
+  for parallel in (False, True):
+    mode = 'parallel' if parallel else 'sequential'
+    toolship = _make_toolship(parallel, [0.0] * 4, 1000, cache=QueryCache(maxsize=0))
+    queries = _queries()
+    recorder.measure(f'get_commands.{mode}.4x1000', lambda: toolship.get_commands(next(queries)))
+    toolship.shutdown()
+
+  # Many prefix plugins, only one of which is addressed by the query.
+  toolship = Toolship(cache=QueryCache(maxsize=0))
+  for idx in range(100):
+    toolship.add_plugin(f'syn{idx}', SyntheticPlugin(10, prefix=f'p{idx}', seed=idx))
+  recorder.measure('get_commands.routing.100-prefixes', lambda: toolship.get_commands('p42 alpha'))
+
+  # Tail latency with a mix of fast and slow plugins and failures.
+  toolship = _make_toolship(True, [0.0, 0.001, 0.005, 0.02], 200, failure_rate=0.1, budget=0.01, cache=QueryCache(maxsize=0))
+  queries = _queries()
+  recorder.measure('get_commands.parallel.mixed-latency', lambda: toolship.get_commands(next(queries)), repeat=50)
+  toolship.shutdown()
+
+  # Typing the same few words again, which is answered from the result cache.
+  toolship = _make_toolship(False, [0.0] * 4, 1000, cacheable=True)
+  words = list(itertools.islice(_queries(), 20))
+  queries = itertools.cycle(words)
+  recorder.measure('get_commands.cached.4x1000', lambda: toolship.get_commands(next(queries)))
+  # Only the first time that every query is seen may miss the cache.
+  assert toolship.cache.misses == 4 * len(set(words)), toolship.cache.misses
+  assert toolship.cache.hits > 0
+
+  toolship = _make_toolship(False, [0.0], 0, limit=50)
+  commands = [('syn0', result) for result in make_catalog(10000)]
+  recorder.measure('rank.10000', lambda: toolship.rank('alp', commands), repeat=20)
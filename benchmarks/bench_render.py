@@ -0,0 +1,37 @@
+
+import os
+import typing as t
+
+from .harness import Recorder, SkipBenchmark, benchmark
+from .synthetic import make_catalog
+
+
+@benchmark('render')
+def bench_render(recorder: Recorder) -> None:
+  os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+  try:
+    from PySide2.QtWidgets import QApplication
+    from toolship.core.manager import Toolship
+    from toolship.qt.commandpalette import CommandPalette
+    from toolship.qt.utils import extend_or_trim
+  except ImportError as exc:
+    raise SkipBenchmark(str(exc))
+
+  target: t.List[int] = []
+  reference = list(range(1000))
+  recorder.measure('extend_or_trim.1000', lambda: extend_or_trim(
+    target, reference[:len(reference) - len(target) % 2], lambda i, v: v, lambda i, v, w: None))
+
+  app = QApplication.instance() or QApplication([])
+  palette = CommandPalette(Toolship())
+  palette.show()
+  for count in (10, 100, 1000):
+    # Alternate between two result sets to force every row to be updated.
+    results = [[('syn', r) for r in make_catalog(count, seed)] for seed in (0, 1)]
+    state = {'idx': 0}
+    def _update() -> None:
+      state['idx'] ^= 1
+      palette._setResults(results[state['idx']])
+      app.processEvents()
+    recorder.measure(f'CommandPalette.update.{count}', _update, repeat=50 if count < 1000 else 10, warmup=2)
+  palette.close()
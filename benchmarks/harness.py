@@ -0,0 +1,145 @@
+
+"""
+A minimal benchmark harness. Benchmarks are functions decorated with #benchmark() that
+record measurements with #Recorder.measure(). Results can be saved as a JSON baseline and
+compared against a previously saved baseline to catch regressions.
+"""
+
+import json
+import math
+import os
+import platform
+import sys
+import time
+import typing as t
+
+_Benchmark = t.Callable[['Recorder'], None]
+_BENCHMARKS: t.Dict[str, _Benchmark] = {}
+
+#: The statistics that are compared against the baseline.
+COMPARED_STATS = ('p50', 'p95')
+
+
+class SkipBenchmark(Exception):
+  """
+  Raised by a benchmark if it can not run in the current environment, e.g. because an
+  optional dependency is not installed.
+  """
+
+
+def benchmark(name: str) -> t.Callable[[_Benchmark], _Benchmark]:
+  """
+  Decorator to register a benchmark function under the given *name*.
+  """
+
+  def decorator(func: _Benchmark) -> _Benchmark:
+    _BENCHMARKS[name] = func
+    return func
+  return decorator
+
+
+def get_benchmarks() -> t.Dict[str, _Benchmark]:
+  return dict(_BENCHMARKS)
+
+
+def _percentile(samples: t.List[float], p: float) -> float:
+  return samples[min(len(samples) - 1, max(0, math.ceil(len(samples) * p / 100.0) - 1))]
+
+
+def summarize(samples: t.List[float]) -> t.Dict[str, float]:
+  """
+  Summarizes a list of durations in seconds. Latencies in the result are in milliseconds.
+  """
+
+  samples = sorted(samples)
+  total = sum(samples)
+  return {
+    'n': len(samples),
+    'mean': total / len(samples) * 1000,
+    'p50': _percentile(samples, 50) * 1000,
+    'p95': _percentile(samples, 95) * 1000,
+    'p99': _percentile(samples, 99) * 1000,
+    'max': samples[-1] * 1000,
+    'ops_per_sec': len(samples) / total if total else math.inf,
+  }
+
+
+class Recorder:
+  """
+  Collects the measurements of a benchmark.
+  """
+
+  def __init__(self, prefix: str, scale: float = 1.0) -> None:
+    self.prefix = prefix
+    self.scale = scale
+    self.results: t.Dict[str, t.Dict[str, float]] = {}
+
+  def measure(self, name: str, func: t.Callable[[], t.Any], repeat: int = 200, warmup: int = 10) -> t.Dict[str, float]:
+    """
+    Call *func* *repeat* times (scaled by the #scale of the recorder) after *warmup* calls
+    that are not recorded, and record the duration of every call.
+    """
+
+    for _ in range(warmup):
+      func()
+    samples = []
+    for _ in range(max(1, int(repeat * self.scale))):
+      started = time.perf_counter()
+      func()
+      samples.append(time.perf_counter() - started)
+    summary = summarize(samples)
+    self.results[self.prefix + '.' + name] = summary
+    return summary
+
+
+def environment() -> t.Dict[str, str]:
+  from toolship.core import __version__
+  return {
+    'version': __version__,
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'machine': platform.machine(),
+  }
+
+
+def save_baseline(path: str, results: t.Dict[str, t.Dict[str, float]]) -> None:
+  os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+  with open(path, 'w') as fp:
+    json.dump({'environment': environment(), 'results': results}, fp, indent=2, sort_keys=True)
+    fp.write('\n')
+
+
+def load_baseline(path: str) -> t.Dict[str, t.Dict[str, float]]:
+  with open(path) as fp:
+    return json.load(fp)['results']
+
+
+def compare(
+  baseline: t.Dict[str, t.Dict[str, float]],
+  results: t.Dict[str, t.Dict[str, float]],
+  threshold: float,
+) -> t.List[str]:
+  """
+  Compare *results* against a *baseline* and return a description of every measurement
+  whose #COMPARED_STATS got slower by more than *threshold* (a fraction, e.g. `0.2` for 20%).
+  Measurements that are missing from either side are reported as well, since a benchmark
+  without a baseline can not catch a regression.
+  """
+
+  regressions = [f'{name}: not measured' for name in sorted(baseline.keys() - results.keys())]
+  for name, summary in sorted(results.items()):
+    if name not in baseline:
+      regressions.append(f'{name}: not in the baseline')
+      continue
+    for stat in COMPARED_STATS:
+      before, after = baseline[name][stat], summary[stat]
+      if before > 0 and (after - before) / before > threshold:
+        regressions.append(f'{name} {stat}: {before:.3f}ms -> {after:.3f}ms (+{(after - before) / before:.0%})')
+  return regressions
+
+
+def print_results(results: t.Dict[str, t.Dict[str, float]], file: t.TextIO = sys.stdout) -> None:
+  width = max((len(name) for name in results), default=10)
+  print(f'{"benchmark":<{width}} {"p50":>10} {"p95":>10} {"p99":>10} {"ops/s":>12}', file=file)
+  for name, s in results.items():
+    print(f'{name:<{width}} {s["p50"]:>8.3f}ms {s["p95"]:>8.3f}ms {s["p99"]:>8.3f}ms {s["ops_per_sec"]:>12.1f}', file=file)
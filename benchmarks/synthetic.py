@@ -0,0 +1,97 @@
+
+"""
+Synthetic plugins with a configurable number of results, latency and failure rate.
+"""
+
+import argparse
+import random
+import time
+import typing as t
+
+from toolship.core.plugins import ArgparsingPlugin, Plugin, PluginMatchError, Result
+
+WORDS = (
+  'alpha bravo charlie delta echo foxtrot golf hotel india juliett kilo lima mike november '
+  'oscar papa quebec romeo sierra tango uniform victor whiskey xray yankee zulu').split()
+
+
+def make_catalog(count: int, seed: int = 0) -> t.List[Result]:
+  """
+  Generate *count* results with pseudo-random names and descriptions.
+  """
+
+  rng = random.Random(seed)
+  return [
+    Result(
+      str(idx),
+      ' '.join(rng.choice(WORDS) for _ in range(2)) + f' {idx}',
+      ' '.join(rng.choice(WORDS) for _ in range(6)))
+    for idx in range(count)]
+
+
+class SyntheticPlugin(Plugin):
+  """
+  A plugin that filters a generated catalog of *count* results by substring. Every query
+  takes at least *latency* seconds and fails with a #PluginMatchError with the probability
+  *failure_rate*.
+  """
+
+  def __init__(
+    self,
+    count: int = 100,
+    latency: float = 0.0,
+    failure_rate: float = 0.0,
+    prefix: t.Optional[str] = None,
+    cacheable: bool = False,
+    seed: int = 0,
+  ) -> None:
+    self.catalog = make_catalog(count, seed)
+    self.latency = latency
+    self.failure_rate = failure_rate
+    self.prefix = prefix
+    self.cacheable = cacheable
+    self._rng = random.Random(seed)
+
+  def get_prefix(self) -> t.Optional[str]:
+    return self.prefix
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    if self.prefix is not None:
+      parts = query.split(None, 1)
+      if not parts or parts[0] != self.prefix:
+        return []
+      query = parts[1] if len(parts) > 1 else ''
+    if self.latency:
+      time.sleep(self.latency)
+    if self.failure_rate and self._rng.random() < self.failure_rate:
+      raise PluginMatchError('synthetic failure')
+    query = query.strip().lower()
+    results = []
+    for result in self.catalog:
+      if query in result.name:
+        results.append(result)
+        if limit is not None and len(results) >= limit:
+          break
+    return results
+
+
+class SyntheticArgparsingPlugin(ArgparsingPlugin):
+  """
+  An #ArgparsingPlugin that returns a fixed set of results, to measure the parsing overhead.
+  """
+
+  def __init__(self, prefix: str = 'syn', count: int = 10) -> None:
+    self.prefix = prefix
+    self.catalog = make_catalog(count)
+
+  def get_prefix(self) -> str:
+    return self.prefix
+
+  def get_parser(self) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('-n', '--number', type=int)
+    return parser
+
+  def match_arguments(self, args: argparse.Namespace, limit: t.Optional[int] = None) -> t.List[Result]:
+    return self.catalog
@@ -37,7 +37,11 @@ setuptools.setup(
   tests_require = [],
   python_requires = '>=3.5.0,<4.0.0',
   data_files = [],
-  entry_points = {},
+  entry_points = {
+    'console_scripts': [
+      'toolship = toolship.core.cli:main',
+    ]
+  },
   cmdclass = {},
   keywords = [],
   classifiers = [],
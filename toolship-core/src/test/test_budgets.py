@@ -0,0 +1,88 @@
+
+import time
+import typing as t
+
+from toolship.core.manager import Toolship
+from toolship.core.metrics import BreakerState, CircuitBreaker, LatencyHistogram
+from toolship.core.plugins import Plugin, Result
+
+
+class SleepingPlugin(Plugin):
+
+  cacheable = False
+
+  def __init__(self, delay: float) -> None:
+    self.delay = delay
+    self.calls = 0
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    self.calls += 1
+    time.sleep(self.delay)
+    return [Result('item', 'item')]
+
+
+class Clock:
+
+  def __init__(self) -> None:
+    self.now = 0.0
+
+  def __call__(self) -> float:
+    return self.now
+
+
+def test_circuit_breaker():
+  clock = Clock()
+  breaker = CircuitBreaker(threshold=2, cooldown=10.0, clock=clock)
+  breaker.record(False)
+  assert breaker.state == BreakerState.CLOSED and breaker.allow()
+  breaker.record(False)
+  assert breaker.state == BreakerState.OPEN and not breaker.allow()
+
+  # Only one probe is allowed after the cooldown, and a failed probe opens it again.
+  clock.now = 10.0
+  assert breaker.state == BreakerState.HALF_OPEN
+  assert breaker.allow() and not breaker.allow()
+  breaker.record(False)
+  assert breaker.state == BreakerState.OPEN
+
+  clock.now = 20.0
+  assert breaker.allow()
+  breaker.record(True)
+  assert breaker.state == BreakerState.CLOSED and breaker.allow()
+
+
+def test_slow_plugin_is_skipped():
+  ship = Toolship(budget=0.01, breaker_threshold=2, breaker_cooldown=60.0)
+  plugin = SleepingPlugin(0.02)
+  ship.add_plugin('slow', plugin)
+  ship.get_commands('a')
+  ship.get_commands('b')
+  [(_plugin_id, result)] = ship.get_commands('c')
+  assert result.error is not None and 'temporarily disabled' in result.error
+  assert plugin.calls == 2
+  stats = ship.get_stats()['slow']
+  assert (stats['calls'], stats['over_budget'], stats['skipped']) == (2, 2, 1)
+  assert stats['breaker'] == 'open'
+
+
+def test_per_plugin_budget():
+  ship = Toolship(parallel=True, budget=1.0)
+  ship.add_plugin('slow', SleepingPlugin(0.3), budget=0.05)
+  ship.add_plugin('fast', SleepingPlugin(0.0))
+  started = time.perf_counter()
+  commands = ship.get_commands('item')
+  assert time.perf_counter() - started < 0.25
+  assert sorted((plugin_id, result.id) for plugin_id, result in commands) == \
+    [('fast', 'item'), ('slow', Toolship.PENDING_ID)]
+  assert ship.get_budget('slow') == 0.05 and ship.get_budget('fast') == 1.0
+  ship.shutdown()
+
+
+def test_latency_histogram():
+  histogram = LatencyHistogram()
+  for ms in range(1, 101):
+    histogram.record(ms / 1000)
+  # Accurate to within the bucket resolution.
+  assert abs(histogram.percentile(50) - 0.050) < 0.050 * 0.2
+  assert abs(histogram.percentile(99) - 0.099) < 0.099 * 0.2
+  assert histogram.to_json()['count'] == 100
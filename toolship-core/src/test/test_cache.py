@@ -0,0 +1,68 @@
+
+from toolship.core.cache import QueryCache
+from toolship.core.plugins import Result
+
+
+class Clock:
+
+  def __init__(self) -> None:
+    self.now = 0.0
+
+  def __call__(self) -> float:
+    return self.now
+
+
+def _results(name: str):
+  return [Result(name, name)]
+
+
+def test_ttl():
+  clock = Clock()
+  cache = QueryCache(ttl=10.0, clock=clock)
+  cache.put('p', 'query', _results('a'))
+  clock.now = 10.0
+  assert cache.get('p', 'query') == _results('a')
+  clock.now = 10.5
+  assert cache.get('p', 'query') is None
+  assert len(cache) == 0
+  assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction():
+  cache = QueryCache(maxsize=2)
+  cache.put('p', 'a', _results('a'))
+  cache.put('p', 'b', _results('b'))
+  cache.get('p', 'a')
+  cache.put('p', 'c', _results('c'))
+  assert cache.get('p', 'b') is None
+  assert cache.get('p', 'a') == _results('a')
+  assert cache.get('p', 'c') == _results('c')
+
+
+def test_disabled():
+  cache = QueryCache(maxsize=0)
+  cache.put('p', 'a', _results('a'))
+  assert cache.get('p', 'a') is None
+
+
+def test_find_prefix():
+  clock = Clock()
+  cache = QueryCache(clock=clock)
+  cache.put('p', 'f no', _results('short'))
+  cache.put('p', 'f not', _results('long'))
+  cache.put('other', 'f note', _results('other'))
+  assert cache.find_prefix('p', 'f note') == ('f not', _results('long'))
+  assert cache.find_prefix('p', 'f not') == ('f no', _results('short'))
+  assert cache.find_prefix('p', 'x') is None
+  clock.now = 100.0
+  assert cache.find_prefix('p', 'f note') is None
+
+
+def test_invalidate():
+  cache = QueryCache()
+  cache.put('p', 'a', _results('a'))
+  cache.put('q', 'a', _results('a'))
+  cache.invalidate('p')
+  assert cache.get('p', 'a') is None and cache.get('q', 'a') is not None
+  cache.invalidate()
+  assert len(cache) == 0
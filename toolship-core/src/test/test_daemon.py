@@ -0,0 +1,119 @@
+
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import typing as t
+
+import pytest
+
+from toolship.core import protocol
+from toolship.core.client import DaemonClient
+from toolship.core.daemon import ToolshipDaemon
+from toolship.core.manager import Toolship
+from toolship.core.plugins import IsClipboardValueProducer, Plugin, Result
+from toolship.core.protocol import DaemonError, ProtocolError, recv_message, send_message
+
+
+class ValueResult(Result, IsClipboardValueProducer):
+
+  __slots__ = ()
+
+  def get_value(self) -> str:
+    return 'value of ' + self.id
+
+
+class ItemsPlugin(Plugin):
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    if query == 'fail':
+      raise RuntimeError('plugin failed')
+    return [ValueResult('item', 'item ' + query)]
+
+
+@pytest.fixture
+def daemon(tmp_path):
+  ship = Toolship()
+  ship.add_plugin('items', ItemsPlugin())
+  daemon = ToolshipDaemon(ship, str(tmp_path / 'd.sock'))
+  thread = threading.Thread(target=daemon.serve_forever)
+  thread.start()
+  deadline = time.perf_counter() + 2
+  while daemon._server is None and time.perf_counter() < deadline:
+    time.sleep(0.01)
+  yield daemon
+  daemon.shutdown()
+  thread.join(2)
+
+
+def _stream(sock: socket.socket, message: t.Dict[str, t.Any]) -> t.List[t.Dict[str, t.Any]]:
+  send_message(sock, message)
+  messages = []
+  while True:
+    response = recv_message(sock)
+    assert response is not None
+    messages.append(response)
+    if 'done' in response or 'error' in response:
+      return messages
+
+
+def test_framing():
+  left, right = socket.socketpair()
+  with left, right:
+    send_message(left, {'op': 'query', 'query': 'ä'})
+    assert recv_message(right) == {'op': 'query', 'query': 'ä'}
+    right.sendall(struct.pack('>I', protocol.MAX_MESSAGE_SIZE + 1))
+    with pytest.raises(ProtocolError, match='too large'):
+      recv_message(left)
+    data = b'[1, 2]'
+    right.sendall(struct.pack('>I', len(data)) + data)
+    with pytest.raises(ProtocolError, match='JSON object'):
+      recv_message(left)
+    right.sendall(struct.pack('>I', 10) + b'{}')
+    right.close()
+    with pytest.raises(ProtocolError, match='middle of a message'):
+      recv_message(left)
+    assert recv_message(left) is None
+
+
+def test_query_and_action(daemon):
+  client = DaemonClient(daemon.path, timeout=2)
+  [(plugin_id, result)] = client.query('one')
+  assert (plugin_id, result.id, result.name) == ('items', 'item', 'item one')
+  assert isinstance(result, IsClipboardValueProducer)
+  assert result.get_value() == 'value of item'
+  client.close()
+
+
+def test_errors_keep_the_connection_open(daemon):
+  client = DaemonClient(daemon.path, timeout=2)
+  with pytest.raises(DaemonError, match='Unknown operation'):
+    client.request({'op': 'unknown'})
+  with pytest.raises(DaemonError, match='query'):
+    client.request({'op': 'query'})
+  with pytest.raises(DaemonError, match='No result'):
+    client.request({'op': 'action', 'plugin': 'items', 'id': 'missing'})
+  assert client.request({'op': 'query', 'query': 'two'})['results']
+  client.close()
+
+
+def test_stream(daemon):
+  with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+    sock.settimeout(2)
+    sock.connect(daemon.path)
+    messages = _stream(sock, {'op': 'stream', 'query': 'one'})
+    assert [message.get('plugin') for message in messages] == ['items', None]
+    assert messages[-1] == {'done': True}
+
+    assert 'error' in _stream(sock, {'op': 'stream'})[-1]
+    assert 'error' in _stream(sock, {'op': 'stream', 'query': ['one']})[-1]
+    # The connection can still be used.
+    assert _stream(sock, {'op': 'stream', 'query': 'two'})[-1] == {'done': True}
+
+
+def test_client_does_not_import_the_manager():
+  code = 'import sys, toolship.core.cli; assert "toolship.core.manager" not in sys.modules'
+  subprocess.run([sys.executable, '-c', code], check=True, env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)})
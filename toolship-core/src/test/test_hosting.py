@@ -0,0 +1,70 @@
+
+import os
+import typing as t
+
+import pytest
+
+from toolship.core.discovery import PluginSpec
+from toolship.core.hosting import HostedPlugin, parse_host_argument
+from toolship.core.plugins import IsClipboardValueProducer, Plugin, PluginMatchError, Result
+
+
+class PidResult(Result, IsClipboardValueProducer):
+
+  __slots__ = ()
+
+  def get_value(self) -> str:
+    return f'{self.id}:{os.getpid()}'
+
+
+class CrashingPlugin(Plugin):
+  # Imported by the host processes from this module.
+
+  def get_prefix(self) -> str:
+    return 'h'
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    term = query.split(None, 1)[1] if ' ' in query else ''
+    if term == 'crash':
+      os._exit(3)
+    return [PidResult(term or 'empty', 'item ' + term)]
+
+
+@pytest.fixture
+def plugin():
+  plugin = HostedPlugin(PluginSpec('hosted', f'{__name__}:CrashingPlugin', 'h'))
+  plugin.on_load()
+  yield plugin
+  plugin.on_unload()
+
+
+def test_results_are_performed_by_the_host(plugin):
+  results = plugin.match_search_query('h one')
+  assert [result.name for result in results] == ['item one']
+  value = results[0].get_value()
+  assert value.startswith('one:') and value != f'one:{os.getpid()}'
+
+
+def test_crashed_host_is_restarted(plugin):
+  stale = plugin.match_search_query('h one')[0]
+  with pytest.raises(PluginMatchError):
+    plugin.match_search_query('h crash')
+  assert plugin.restarts == 1
+  assert [result.name for result in plugin.match_search_query('h two')] == ['item two']
+  with pytest.raises(RuntimeError, match='query again'):
+    stale.get_value()
+
+
+def test_actions_after_unload_do_not_start_a_host(plugin):
+  result = plugin.match_search_query('h one')[0]
+  plugin.on_unload()
+  with pytest.raises(RuntimeError, match='query again'):
+    result.get_value()
+  assert not any(host.running for host in plugin._hosts)
+
+
+def test_parse_host_argument():
+  assert parse_host_argument('files') == ('files', 1)
+  assert parse_host_argument('files:3') == ('files', 3)
+  with pytest.raises(ValueError):
+    parse_host_argument('files:x')
@@ -0,0 +1,87 @@
+
+import threading
+import typing as t
+
+import pytest
+
+pytest.importorskip('pynput')
+
+from pynput.keyboard import Key, KeyCode
+from toolship.core.hotkeys import HotkeyListener
+
+
+class Recorder:
+
+  def __init__(self) -> None:
+    self.events: t.List[str] = []
+    self._cond = threading.Condition()
+
+  def __call__(self, name: str) -> t.Callable[[], None]:
+    def callback() -> None:
+      with self._cond:
+        self.events.append(name)
+        self._cond.notify_all()
+    return callback
+
+  def wait(self, count: int) -> t.List[str]:
+    with self._cond:
+      self._cond.wait_for(lambda: len(self.events) >= count, timeout=2)
+      return list(self.events)
+
+
+@pytest.fixture
+def listener():
+  listener = HotkeyListener()
+  yield listener
+  listener.stop()
+
+
+def _press(listener: HotkeyListener, *keys: t.Any) -> None:
+  for key in keys:
+    listener._on_down(key)
+
+
+def _release(listener: HotkeyListener, *keys: t.Any) -> None:
+  for key in keys:
+    listener._on_up(key)
+
+
+def test_hotkey_and_partial(listener):
+  recorder = Recorder()
+  listener.add('ctrl+alt+space', recorder('open'), on_partial=recorder('partial'))
+  _press(listener, Key.ctrl_l, Key.alt_r, Key.space)
+  _release(listener, Key.space, Key.alt_r, Key.ctrl_l)
+  assert recorder.wait(2) == ['partial', 'open']
+
+
+def test_single_modifier_does_not_fire_partial(listener):
+  recorder = Recorder()
+  listener.add('ctrl+alt+space', recorder('open'), on_partial=recorder('partial'))
+  listener.add('ctrl+x', recorder('marker'))
+  # Ctrl+C must not prepare the palette.
+  c = KeyCode(char='c')
+  _press(listener, Key.ctrl_l, c)
+  _release(listener, c, Key.ctrl_l)
+  x = KeyCode(char='x')
+  _press(listener, Key.ctrl_l, x)
+  _release(listener, x, Key.ctrl_l)
+  assert recorder.wait(1) == ['marker']
+
+
+def test_partial_requires_two_modifiers(listener):
+  recorder = Recorder()
+  listener.add('ctrl+space', recorder('open'), on_partial=recorder('partial'))
+  _press(listener, Key.ctrl_l, Key.space)
+  _release(listener, Key.space, Key.ctrl_l)
+  assert recorder.wait(1) == ['open']
+
+
+def test_chord(listener):
+  recorder = Recorder()
+  listener.add('ctrl+k, ctrl+t', recorder('chord'))
+  k, t_ = KeyCode(char='k'), KeyCode(char='t')
+  _press(listener, Key.ctrl_l, k)
+  _release(listener, k)
+  _press(listener, t_)
+  _release(listener, t_, Key.ctrl_l)
+  assert recorder.wait(1) == ['chord']
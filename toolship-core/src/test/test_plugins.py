@@ -0,0 +1,79 @@
+
+import argparse
+import typing as t
+
+from toolship.core.manager import Toolship
+from toolship.core.plugins import ArgparsingPlugin, Plugin, Result, call_with_limit
+
+
+class OldPlugin(Plugin):
+  # Written before match_search_query() took a limit.
+
+  def match_search_query(self, query):
+    return [Result('old', 'old item')]
+
+
+class OldArgparsingPlugin(ArgparsingPlugin):
+
+  def get_prefix(self):
+    return 'o'
+
+  def get_parser(self):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('terms', nargs='*')
+    return parser
+
+  def match_arguments(self, args):
+    return [Result('args', 'args ' + ' '.join(args.terms))]
+
+
+class NewPlugin(Plugin):
+
+  def __init__(self) -> None:
+    self.limits: t.List[t.Optional[int]] = []
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    self.limits.append(limit)
+    return [Result('new', 'new item')]
+
+
+def test_plugins_without_limit_parameter():
+  ship = Toolship(limit=10)
+  ship.add_plugin('old', OldPlugin())
+  ship.add_plugin('args', OldArgparsingPlugin())
+  ids = sorted(result.id for _plugin_id, result in ship.get_commands('o item'))
+  assert ids == ['args', 'old']
+
+
+def test_plugins_receive_limit():
+  ship = Toolship(limit=10)
+  plugin = NewPlugin()
+  ship.add_plugin('new', plugin)
+  ship.get_commands('item')
+  assert plugin.limits == [10]
+
+
+def test_call_with_limit_functions():
+  assert call_with_limit(lambda query: [query], 'q', 5) == ['q']
+  assert call_with_limit(lambda query, limit: [query, limit], 'q', 5) == ['q', 5]
+  assert call_with_limit(lambda *args: list(args), 'q', 5) == ['q', 5]
+
+
+class PrefixPlugin(Plugin):
+
+  def get_prefix(self) -> str:
+    return 'p'
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    return [Result(str(idx), f'item {idx}') for idx in range(5)]
+
+
+def test_prefix_is_not_part_of_the_ranking_query():
+  plugin = PrefixPlugin()
+  assert plugin.get_ranking_query('p item 3') == 'item 3'
+  assert plugin.get_ranking_query('other') == 'other'
+  ship = Toolship()
+  ship.add_plugin('p', plugin)
+  scores = [score for score, _command in ship.score_commands('p item', ship.get_commands('p item'))]
+  assert all(score > 0 for score in scores)
+  assert ship.get_commands('p item 3')[0][1].id == '3'
@@ -0,0 +1,103 @@
+
+import threading
+import time
+import typing as t
+
+from toolship.core.manager import Toolship
+from toolship.core.plugins import Plugin, Result
+
+
+class SlowPlugin(Plugin):
+
+  cacheable = False
+
+  def __init__(self, delay: float) -> None:
+    self.delay = delay
+    self.queries: t.List[str] = []
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    self.queries.append(query)
+    time.sleep(self.delay)
+    return [Result('slow', 'slow ' + query)]
+
+
+class FastPlugin(Plugin):
+
+  cacheable = False
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    return [Result('fast', 'fast ' + query)]
+
+
+def _collect() -> t.Tuple[t.List[t.Tuple[str, str]], t.Callable[[str, t.List], None]]:
+  batches: t.List[t.Tuple[str, str]] = []
+  lock = threading.Lock()
+
+  def callback(plugin_id: str, commands: t.List) -> None:
+    with lock:
+      batches.append((plugin_id, commands[0][1].id))
+
+  return batches, callback
+
+
+def test_stream_delivers_every_plugin():
+  ship = Toolship(parallel=True)
+  ship.add_plugin('slow', SlowPlugin(0.05))
+  ship.add_plugin('fast', FastPlugin())
+  batches, callback = _collect()
+  pending = ship.stream_commands('item', callback)
+  assert pending.wait(2)
+  assert sorted(batches) == [('fast', 'fast'), ('slow', 'slow')]
+  ship.shutdown()
+
+
+def test_stream_busy_plugin_does_not_starve_others():
+  ship = Toolship(parallel=True, max_workers=2)
+  slow = SlowPlugin(0.3)
+  ship.add_plugin('slow', slow)
+  ship.add_plugin('fast', FastPlugin())
+
+  previous = None
+  for idx in range(6):
+    if previous is not None:
+      previous.cancel()
+    batches, callback = _collect()
+    started = time.perf_counter()
+    previous = ship.stream_commands('query%d' % idx, callback)
+    deadline = started + 0.2
+    while ('fast', 'fast') not in batches and time.perf_counter() < deadline:
+      time.sleep(0.005)
+    assert ('fast', 'fast') in batches, idx
+    if idx > 0:
+      assert ('slow', Toolship.PENDING_ID) in batches
+
+  assert previous.wait(2)
+  assert ('slow', 'slow') in batches
+  # The first query and the most recent one, the queries in between were superseded.
+  assert slow.queries == ['query0', 'query5']
+  ship.shutdown()
+
+
+def test_cancelled_stream_does_not_invoke_waiting_plugin():
+  ship = Toolship(parallel=True)
+  slow = SlowPlugin(0.1)
+  ship.add_plugin('slow', slow)
+  ship._locks['slow'].acquire()  # Simulate the plugin being loaded.
+  batches, callback = _collect()
+  pending = ship.stream_commands('item', callback)
+  time.sleep(0.05)
+  pending.cancel()
+  ship._locks['slow'].release()
+  assert pending.wait(2)
+  assert slow.queries == []
+  assert batches == []
+  ship.shutdown()
+
+
+def test_done_callback_for_unrouted_query():
+  ship = Toolship(parallel=True)
+  done = []
+  pending = ship.stream_commands('#unknown-prefix', lambda *args: None)
+  pending.add_done_callback(done.append)
+  assert done == [pending]
+  ship.shutdown()
@@ -0,0 +1,103 @@
+
+"""
+A least-recently-used cache for the results of #Plugin.match_search_query(), used by the
+#Toolship to avoid re-computing the results for a query it has seen before (e.g. when the
+user deletes a character and types it again).
+"""
+
+import collections
+import threading
+import time
+import typing as t
+
+from .plugins import Result
+
+_Key = t.Tuple[str, str]
+_Entry = t.Tuple[float, t.List[Result]]
+
+
+class QueryCache:
+  """
+  Caches the results of plugins keyed by `(plugin_id, query)`. The cache is bounded by the
+  number of entries it holds and the age of every entry. All methods are thread-safe.
+
+  # Arguments
+  maxsize: The maximum number of entries in the cache. When the cache is full, the least
+    recently used entry is evicted. Pass `0` to disable the cache.
+  ttl: The number of seconds after which an entry expires.
+
+  #hits and #misses count the lookups with #get().
+  """
+
+  def __init__(self, maxsize: int = 256, ttl: float = 10.0,
+               clock: t.Callable[[], float] = time.monotonic) -> None:
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self._clock = clock
+    self._entries: 't.OrderedDict[_Key, _Entry]' = collections.OrderedDict()
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def _get(self, key: _Key, now: float) -> t.Optional[t.List[Result]]:
+    entry = self._entries.get(key)
+    if entry is None:
+      return None
+    if now - entry[0] > self.ttl:
+      del self._entries[key]
+      return None
+    self._entries.move_to_end(key)
+    return entry[1]
+
+  def get(self, plugin_id: str, query: str) -> t.Optional[t.List[Result]]:
+    """
+    Returns the cached results for exactly the given *query*, or #None.
+    """
+
+    with self._lock:
+      results = self._get((plugin_id, str(query)), self._clock())
+      if results is None:
+        self.misses += 1
+      else:
+        self.hits += 1
+      return results
+
+  def find_prefix(self, plugin_id: str, query: str) -> t.Optional[t.Tuple[str, t.List[Result]]]:
+    """
+    Returns the longest query that *query* starts with (excluding *query* itself) for which
+    results are cached, together with these results. Returns #None if there is no such query.
+    """
+
+    query = str(query)
+    with self._lock:
+      now = self._clock()
+      for length in range(len(query) - 1, -1, -1):
+        results = self._get((plugin_id, query[:length]), now)
+        if results is not None:
+          return query[:length], results
+    return None
+
+  def put(self, plugin_id: str, query: str, results: t.List[Result]) -> None:
+    if self.maxsize <= 0:
+      return
+    with self._lock:
+      key = (plugin_id, str(query))
+      self._entries[key] = (self._clock(), results)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.maxsize:
+        self._entries.popitem(last=False)
+
+  def invalidate(self, plugin_id: t.Optional[str] = None) -> None:
+    """
+    Remove all entries of the plugin with the given ID, or all entries if no ID is given.
+    """
+
+    with self._lock:
+      if plugin_id is None:
+        self._entries.clear()
+      else:
+        for key in [k for k in self._entries if k[0] == plugin_id]:
+          del self._entries[key]
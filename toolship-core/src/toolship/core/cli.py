@@ -0,0 +1,102 @@
+
+"""
+The `toolship` command line interface. `toolship daemon` hosts the plugins, `toolship query`
+and `toolship run` are clients of the daemon that print JSON.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import typing as t
+
+from . import tracing
+from .client import DaemonClient
+from .protocol import DaemonError, encode_result
+
+
+def _daemon(args: argparse.Namespace) -> None:
+  # Only the daemon imports the plugins.
+  from .daemon import ToolshipDaemon
+  from .discovery import LazyPlugin, StartupReport, discover_plugins
+  from .frecency import FrecencyStore, default_frecency_path
+  from .hosting import HostedPlugin
+  from .manager import Toolship
+
+  logging.basicConfig(level=logging.INFO)
+  if args.trace:
+    tracing.enable(args.trace)
+  toolship = Toolship(parallel=True, idle_timeout=args.idle_timeout,
+    frecency=FrecencyStore(default_frecency_path()))
+  report = StartupReport()
+  for spec in discover_plugins(report):
+    if spec.id in args.host:
+      toolship.add_plugin(spec.id, HostedPlugin(spec, args.host[spec.id]))
+    else:
+      toolship.add_plugin(spec.id, LazyPlugin(spec, report))
+  daemon = ToolshipDaemon(toolship, args.socket)
+  try:
+    daemon.serve_forever()
+  except KeyboardInterrupt:
+    pass
+
+
+def _query(args: argparse.Namespace) -> None:
+  client = DaemonClient(args.socket)
+  results = [encode_result(plugin_id, result) for plugin_id, result in client.query(args.query)]
+  json.dump(results, sys.stdout, indent=2 if args.pretty else None)
+  print()
+
+
+def _run(args: argparse.Namespace) -> None:
+  client = DaemonClient(args.socket)
+  response = client.request({'op': 'action', 'plugin': args.plugin, 'id': args.id,
+    'action': args.action, 'query': args.query})
+  if 'value' in response:
+    print(response['value'])
+
+
+def main(argv: t.Optional[t.List[str]] = None) -> None:
+  parser = argparse.ArgumentParser(prog='toolship')
+  parser.add_argument('-s', '--socket', metavar='PATH',
+    help='the socket of the daemon (default: $TOOLSHIP_SOCKET or a per-user socket)')
+  subparsers = parser.add_subparsers(dest='command')
+  subparsers.required = True
+
+  daemon = subparsers.add_parser('daemon', help='run the daemon that hosts the plugins')
+  daemon.add_argument('--idle-timeout', type=float, default=300.0, metavar='SECONDS',
+    help='unload plugins this long after the last frontend was deactivated (default: %(default)s)')
+  daemon.add_argument('--trace', metavar='PATH',
+    help='record a trace and write it to PATH on exit (Chrome trace format, see also $TOOLSHIP_TRACE)')
+  daemon.add_argument('--host', action='append', default=[], metavar='PLUGIN_ID[:PROCESSES]',
+    help='run a plugin in PROCESSES separate processes (default: 1), can be specified multiple times')
+  daemon.set_defaults(func=_daemon)
+
+  query = subparsers.add_parser('query', help='print the results for a query as JSON')
+  query.add_argument('query')
+  query.add_argument('-p', '--pretty', action='store_true', help='indent the JSON output')
+  query.set_defaults(func=_query)
+
+  run = subparsers.add_parser('run', help='perform the action of a result')
+  run.add_argument('query', help='the query that returned the result')
+  run.add_argument('plugin', help='the plugin ID of the result')
+  run.add_argument('id', help='the ID of the result')
+  run.add_argument('-a', '--action', choices=('copy', 'run'),
+    help='the action to perform (default: copy if the result supports it, otherwise run)')
+  run.set_defaults(func=_run)
+
+  args = parser.parse_args(argv)
+  if args.command == 'daemon':
+    from .hosting import parse_host_argument
+    try:
+      args.host = dict(map(parse_host_argument, args.host))
+    except ValueError as exc:
+      parser.error(str(exc))
+  try:
+    args.func(args)
+  except (DaemonError, OSError, RuntimeError) as exc:
+    sys.exit(f'error: {exc}')
+
+
+if __name__ == '__main__':
+  main()
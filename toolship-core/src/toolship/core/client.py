@@ -0,0 +1,193 @@
+
+"""
+The client side of the daemon protocol (see #toolship.core.daemon). This module does not
+import any plugins, so that clients start quickly.
+"""
+
+import concurrent.futures
+import logging
+import math
+import socket
+import threading
+import typing as t
+
+from .metrics import LatencyHistogram
+from .pending import PendingQuery
+from .plugins import Result
+from .protocol import (
+  DaemonError, ProtocolError, RemoteResult, decode_result, default_socket_path, recv_message, send_message)
+from .ranking import top_k
+
+log = logging.getLogger(__name__)
+_Commands = t.List[t.Tuple[str, Result]]
+_BatchCallback = t.Callable[[str, _Commands], None]
+
+
+class DaemonClient:
+  """
+  A connection to the toolship daemon listening on *path*. The connection is opened with
+  the first request and re-opened if it was closed. Requests can be sent from multiple
+  threads, but are processed one after another. Actions, which may take a long time, are
+  performed on a connection of their own (see #perform()).
+  """
+
+  def __init__(self, path: t.Optional[str] = None, timeout: t.Optional[float] = None) -> None:
+    self.path = path or default_socket_path()
+    self.timeout = timeout
+    self._sock: t.Optional[socket.socket] = None
+    self._lock = threading.Lock()
+
+  def connect(self) -> socket.socket:
+    """
+    Opens a new connection to the daemon.
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(self.timeout)
+    try:
+      sock.connect(self.path)
+    except OSError:
+      sock.close()
+      raise
+    return sock
+
+  def close(self) -> None:
+    with self._lock:
+      if self._sock:
+        self._sock.close()
+        self._sock = None
+
+  def request(self, message: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    """
+    Sends a request to the daemon and returns the response. Raises a #DaemonError if the
+    daemon responded with an error.
+    """
+
+    with self._lock:
+      if self._sock is None:
+        self._sock = self.connect()
+      try:
+        response = self._exchange(self._sock, message)
+      except Exception:
+        self._sock.close()
+        self._sock = None
+        raise
+    return self._check(response)
+
+  @staticmethod
+  def _exchange(sock: socket.socket, message: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    send_message(sock, message)
+    response = recv_message(sock)
+    if response is None:
+      raise ConnectionError('The toolship daemon closed the connection.')
+    return response
+
+  @staticmethod
+  def _check(response: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    if 'error' in response:
+      raise DaemonError(response['error'])
+    return response
+
+  def perform(self, result: RemoteResult, action: str, query: str = '') -> t.Optional[str]:
+    """
+    Performs the *action* of a result. Uses a new connection, so that other requests (e.g.
+    from the frontend being shown or hidden) are not blocked while a YubiKey waits to be
+    touched.
+    """
+
+    message = {'op': 'action', 'plugin': result.plugin_id, 'id': result.id, 'action': action, 'query': query}
+    with self.connect() as sock:
+      return self._check(self._exchange(sock, message)).get('value')
+
+  def query(self, query: str) -> t.List[t.Tuple[str, RemoteResult]]:
+    results = self.request({'op': 'query', 'query': query})['results']
+    perform = lambda result, action: self.perform(result, action, query)
+    return [decode_result(data, perform) for data in results]
+
+
+class RemoteToolship:
+  """
+  A stand-in for a #Toolship that forwards all queries to the daemon, so that a frontend
+  can attach to the plugins loaded by the daemon. Implements the parts of the #Toolship
+  interface that the frontends use. Results are ranked by the scores that the daemon
+  computed for them.
+  """
+
+  #: The plugin ID that errors communicating with the daemon are reported with.
+  DAEMON_ID = 'toolship.daemon'
+
+  def __init__(self, client: DaemonClient, limit: t.Optional[int] = 50) -> None:
+    self.client = client
+    self.limit = limit
+    #: Like #Toolship.latencies. These are only kept locally, the `#stats` query displays
+    #: the statistics of the daemon.
+    self.latencies: t.Dict[str, LatencyHistogram] = {}
+    self._executor = concurrent.futures.ThreadPoolExecutor(4, thread_name_prefix='toolship.remote')
+
+  def on_load(self) -> None:
+    pass
+
+  def on_unload(self) -> None:
+    # The plugins belong to the daemon.
+    pass
+
+  def _notify(self, op: str) -> None:
+    # The lifecycle events are hints for the daemon, a frontend works without them.
+    try:
+      self.client.request({'op': op})
+    except (DaemonError, OSError, ProtocolError) as exc:
+      log.warning('Unable to send %r to the toolship daemon: %s', op, exc)
+
+  def activate(self) -> None:
+    self._notify('activate')
+
+  def deactivate(self) -> None:
+    self._notify('deactivate')
+
+  def prewarm(self) -> None:
+    self._notify('prewarm')
+
+  def shutdown(self) -> None:
+    self._executor.shutdown(wait=False)
+    self.client.close()
+
+  def get_stats(self) -> t.Dict[str, t.Any]:
+    return self.client.request({'op': 'stats'})['stats']
+
+  def record_selection(self, plugin_id: str, result: Result) -> None:
+    # The daemon records the selection when the action of the result is performed.
+    pass
+
+  def get_commands(self, query: str) -> t.List[t.Tuple[str, Result]]:
+    return self.rank(query, self.client.query(query))
+
+  def rank(self, query: str, commands: t.Iterable[t.Tuple[str, Result]]) -> t.List[t.Tuple[str, Result]]:
+    return top_k(((t.cast(RemoteResult, result).score, (plugin_id, result)) for plugin_id, result in commands), self.limit)
+
+  def stream_commands(self, query: str, callback: _BatchCallback) -> PendingQuery:
+    """
+    Like #Toolship.stream_commands(). Every query uses its own connection to the daemon.
+    """
+
+    pending = PendingQuery(query)
+    perform = lambda result, action: self.client.perform(result, action, query)
+
+    def _worker() -> None:
+      try:
+        with self.client.connect() as sock:
+          send_message(sock, {'op': 'stream', 'query': query})
+          while not pending.cancelled:
+            message = recv_message(sock)
+            if message is None or message.get('done'):
+              break
+            if 'error' in message:
+              raise DaemonError(message['error'])
+            callback(message['plugin'], [decode_result(data, perform) for data in message['results']])
+      except (DaemonError, OSError, ProtocolError) as exc:
+        log.warning('Unable to query the toolship daemon: %s', exc)
+        if not pending.cancelled:
+          error = RemoteResult(self.DAEMON_ID, '#error', 'Error', None, str(exc), [], math.inf, perform)
+          callback(self.DAEMON_ID, [(self.DAEMON_ID, error)])
+
+    pending._futures.append(self._executor.submit(_worker))
+    return pending
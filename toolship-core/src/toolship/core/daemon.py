@@ -0,0 +1,237 @@
+
+"""
+A headless daemon that hosts a #Toolship and serves queries over a Unix domain socket, so
+that the plugins stay loaded between uses and can be shared by multiple frontends. See
+#toolship.core.protocol for the wire format and #toolship.core.client for the client side.
+
+Operations:
+
+* `query` (`query`): Returns the ranked `results` of #Toolship.get_commands().
+* `stream` (`query`): Sends the `results` of every `plugin` as soon as it responded,
+  followed by `{"done": true}`.
+* `action` (`plugin`, `id`, `action`, `query`): Performs the `copy` or `run` action of a
+  result that was previously returned for the `query` and returns its `value`. The result
+  is recorded as selected (see #Toolship.record_selection()).
+* `activate`, `deactivate`, `prewarm`: Forward the lifecycle events of a frontend to the
+  #Toolship. The plugins are only deactivated when no frontend is active.
+* `stats`: Returns the plugin statistics.
+"""
+
+import collections
+import logging
+import os
+import socket
+import socketserver
+import threading
+import typing as t
+
+from .manager import Toolship
+from .plugins import IsClipboardValueProducer, IsRunnable, Result
+from .protocol import (
+  ProtocolError, default_socket_path, encode_result, ensure_socket_directory, recv_message, send_message)
+
+log = logging.getLogger(__name__)
+
+
+def _get_query(message: t.Dict[str, t.Any]) -> str:
+  query = message.get('query')
+  if not isinstance(query, str):
+    raise ValueError(f'Expected a string "query", got {query!r}')
+  return query
+
+
+class _Connection(socketserver.BaseRequestHandler):
+
+  server: '_Server'
+
+  def handle(self) -> None:
+    daemon = self.server.daemon
+    active = False
+    try:
+      while True:
+        message = recv_message(self.request)
+        if message is None:
+          break
+        op = message.get('op')
+        if op == 'stream':
+          daemon._stream(self.request, message)
+          continue
+        if op in ('activate', 'deactivate'):
+          if active != (op == 'activate'):
+            active = not active
+            daemon._set_active(active)
+          response: t.Dict[str, t.Any] = {}
+        else:
+          try:
+            response = daemon.handle(message)
+          except Exception as exc:
+            log.exception('Error while handling request: %s', op)
+            response = {'error': str(exc)}
+        send_message(self.request, response)
+    except (OSError, ProtocolError, ValueError) as exc:
+      log.debug('Closing connection: %s', exc)
+    finally:
+      if active:
+        daemon._set_active(False)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  daemon_threads = True
+  daemon: 'ToolshipDaemon'
+
+
+class ToolshipDaemon:
+  """
+  Serves the *toolship* on the Unix domain socket at *path*. The plugins are loaded when
+  the daemon starts. Results that were sent to a client are remembered (up to
+  #max_recent_results) so that their actions can be performed without running the query
+  again.
+  """
+
+  #: The number of results that are remembered for the `action` operation.
+  max_recent_results = 4096
+
+  def __init__(self, toolship: Toolship, path: t.Optional[str] = None) -> None:
+    self.toolship = toolship
+    self.path = path or default_socket_path()
+    self._server: t.Optional[_Server] = None
+    self._recent: 'collections.OrderedDict[t.Tuple[str, str], Result]' = collections.OrderedDict()
+    self._recent_lock = threading.Lock()
+    self._active_frontends = 0
+    self._active_lock = threading.Lock()
+
+  def _bind(self) -> _Server:
+    ensure_socket_directory(self.path)
+    if os.path.exists(self.path):
+      with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+          sock.connect(self.path)
+        except OSError:
+          os.remove(self.path)  # A stale socket of a daemon that did not shut down cleanly.
+        else:
+          raise RuntimeError(f'A toolship daemon is already listening on {self.path}')
+    # Create the socket with mode 0600 right away instead of changing its mode after it
+    # was bound, when other users could already connect. This happens before the plugins
+    # are loaded, so no other thread creates files in the meantime.
+    umask = os.umask(0o177)
+    try:
+      server = _Server(self.path, _Connection)
+    finally:
+      os.umask(umask)
+    server.daemon = self
+    return server
+
+  def serve_forever(self) -> None:
+    """
+    Load the plugins and serve requests until #shutdown() is called.
+    """
+
+    self._server = self._bind()
+    log.info('Listening on %s', self.path)
+    self.toolship.on_load()
+    try:
+      self._server.serve_forever()
+    finally:
+      self._server.server_close()
+      try:
+        os.remove(self.path)
+      except OSError:
+        pass
+      self.toolship.on_unload()
+      self.toolship.shutdown()
+
+  def shutdown(self) -> None:
+    """
+    Stop serving requests. Must not be called from the thread that runs #serve_forever().
+    """
+
+    if self._server:
+      self._server.shutdown()
+
+  def _set_active(self, active: bool) -> None:
+    with self._active_lock:
+      self._active_frontends += 1 if active else -1
+      if active and self._active_frontends == 1:
+        self.toolship.activate()
+      elif not active and self._active_frontends == 0:
+        self.toolship.deactivate()
+
+  def _encode(self, query: str, commands: t.List[t.Tuple[str, Result]]) -> t.List[t.Dict[str, t.Any]]:
+    with self._recent_lock:
+      for plugin_id, result in commands:
+        self._recent[(plugin_id, result.id)] = result
+        self._recent.move_to_end((plugin_id, result.id))
+      while len(self._recent) > self.max_recent_results:
+        self._recent.popitem(last=False)
+    return [encode_result(plugin_id, result, score)
+      for score, (plugin_id, result) in self.toolship.score_commands(query, commands)]
+
+  def _stream(self, sock: socket.socket, message: t.Dict[str, t.Any]) -> None:
+    # Failures are answered with an error like those of #handle(), which also ends the
+    # stream. They can occur after some batches were sent already.
+    try:
+      query = _get_query(message)
+      self.toolship.prewarm()
+      batches = self.toolship.iter_commands(query)
+    except Exception as exc:
+      log.exception('Error while handling request: stream')
+      send_message(sock, {'error': str(exc)})
+      return
+    try:
+      while True:
+        try:
+          batch = next(batches, None)
+          if batch is None:
+            response: t.Dict[str, t.Any] = {'done': True}
+          else:
+            response = {'plugin': batch[0], 'results': self._encode(query, batch[1])}
+        except Exception as exc:
+          log.exception('Error while handling request: stream')
+          response = {'error': str(exc)}
+        # Raises an OSError when the client went away, which also cancels the query.
+        send_message(sock, response)
+        if 'plugin' not in response:
+          break
+    finally:
+      t.cast(t.Generator, batches).close()
+
+  def _find(self, message: t.Dict[str, t.Any]) -> Result:
+    key = (message['plugin'], message['id'])
+    with self._recent_lock:
+      result = self._recent.get(key)
+    if result is None:
+      for plugin_id, other in self.toolship.get_commands(message.get('query', '')):
+        if (plugin_id, other.id) == key:
+          return other
+      raise LookupError(f'No result {key[1]!r} from plugin {key[0]!r}')
+    return result
+
+  def handle(self, message: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    """
+    Handles a request and returns the response. See the module documentation for the
+    supported operations.
+    """
+
+    op = message.get('op')
+    if op == 'query':
+      query = _get_query(message)
+      self.toolship.prewarm()
+      return {'results': self._encode(query, self.toolship.get_commands(query))}
+    elif op == 'action':
+      result = self._find(message)
+      action = message.get('action') or ('copy' if isinstance(result, IsClipboardValueProducer) else 'run')
+      if action == 'copy' and isinstance(result, IsClipboardValueProducer):
+        response: t.Dict[str, t.Any] = {'value': result.get_value()}
+      elif action == 'run' and isinstance(result, IsRunnable):
+        result.run()
+        response = {}
+      else:
+        raise ValueError(f'Result {result.id!r} does not support the {action!r} action')
+      self.toolship.record_selection(message['plugin'], result)
+      return response
+    elif op == 'prewarm':
+      self.toolship.prewarm()
+      return {}
+    elif op == 'stats':
+      return {'stats': self.toolship.get_stats()}
+    raise ValueError(f'Unknown operation: {op!r}')
@@ -0,0 +1,191 @@
+
+"""
+Discovery of plugins via the `toolship.plugins` entry point group.
+
+An entry point in that group must point to a #PluginSpec. The spec is lightweight metadata
+about the plugin and should live in a module that is cheap to import. The plugin itself is
+only imported when the first query is routed to it (see #LazyPlugin).
+
+Example (in `setup.py`):
+
+```python
+entry_points = {
+  'toolship.plugins': [
+    'yk = toolship.yubikey:spec',
+  ]
+}
+```
+"""
+
+import dataclasses
+import importlib
+import logging
+import time
+import typing as t
+
+from .plugins import Plugin, Result, call_with_limit
+
+log = logging.getLogger(__name__)
+
+#: The name of the entry point group that plugins are discovered from.
+ENTRYPOINT_GROUP = 'toolship.plugins'
+
+
+@dataclasses.dataclass
+class PluginSpec:
+  """
+  Describes a plugin without importing it.
+
+  # Arguments
+  id: The plugin ID. When discovered via entry points, this is the entry point name.
+  factory: The plugin class or a function that returns the plugin, in the form
+    `module:member`.
+  prefix: The value that the plugin's #Plugin.get_prefix() returns. Must be #None for
+    plugins that handle every query.
+  """
+
+  id: str
+  factory: str
+  prefix: t.Optional[str] = None
+
+  @property
+  def catch_all(self) -> bool:
+    return self.prefix is None
+
+
+@dataclasses.dataclass
+class StartupReport:
+  """
+  Records the time it took to discover, import and instantiate plugins.
+  """
+
+  #: Maps a plugin ID to a dictionary that maps the phase (`discover`, `import` and `init`)
+  #: to the number of seconds it took.
+  timings: t.Dict[str, t.Dict[str, float]] = dataclasses.field(default_factory=dict)
+
+  def record(self, plugin_id: str, phase: str, seconds: float) -> None:
+    self.timings.setdefault(plugin_id, {})[phase] = seconds
+
+  def format(self) -> str:
+    phases = ('discover', 'import', 'init')
+    lines = ['{:<20}'.format('plugin') + ''.join('{:>12}'.format(p) for p in phases)]
+    for plugin_id, timings in self.timings.items():
+      lines.append('{:<20}'.format(plugin_id) + ''.join(
+        '{:>10.1f}ms'.format(timings[p] * 1000) if p in timings else '{:>12}'.format('-')
+        for p in phases))
+    return '\n'.join(lines)
+
+
+class LazyPlugin(Plugin):
+  """
+  A proxy for the plugin described by a #PluginSpec that imports the plugin only when it
+  is needed for the first time, usually when the first query is routed to it. Calls to
+  #on_load() are deferred until then.
+  """
+
+  def __init__(self, spec: PluginSpec, report: t.Optional[StartupReport] = None) -> None:
+    self.spec = spec
+    self._report = report
+    self._plugin: t.Optional[Plugin] = None
+    self._active = False
+
+  def __repr__(self) -> str:
+    return f'LazyPlugin({self.spec!r})'
+
+  @property
+  def imported(self) -> bool:
+    return self._plugin is not None
+
+  @property
+  def plugin(self) -> Plugin:
+    """
+    The plugin object. Imports the plugin when accessed for the first time.
+    """
+
+    if self._plugin is None:
+      module_name, member = self.spec.factory.partition(':')[::2]
+      started = time.perf_counter()
+      factory = getattr(importlib.import_module(module_name), member)
+      imported = time.perf_counter()
+      plugin = factory()
+      initialized = time.perf_counter()
+      log.info('Imported plugin %s in %.1fms', self.spec.id, (initialized - started) * 1000)
+      if self._report is not None:
+        self._report.record(self.spec.id, 'import', imported - started)
+        self._report.record(self.spec.id, 'init', initialized - imported)
+      if plugin.get_prefix() != self.spec.prefix:
+        log.warning('Plugin %s has prefix %r but its spec says %r',
+          self.spec.id, plugin.get_prefix(), self.spec.prefix)
+      if self._active:
+        plugin.on_load()
+      self._plugin = plugin
+    return self._plugin
+
+  @property  # type: ignore
+  def cacheable(self) -> bool:  # type: ignore
+    return self.plugin.cacheable
+
+  @property  # type: ignore
+  def refinable(self) -> bool:  # type: ignore
+    return self.plugin.refinable
+
+  def on_load(self) -> None:
+    self._active = True
+    if self._plugin is not None:
+      self._plugin.on_load()
+
+  def on_unload(self) -> None:
+    self._active = False
+    if self._plugin is not None:
+      self._plugin.on_unload()
+
+  def get_prefix(self) -> t.Optional[str]:
+    return self.spec.prefix
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    return call_with_limit(self.plugin.match_search_query, query, limit)
+
+  def get_ranking_query(self, query: str) -> str:
+    return self.plugin.get_ranking_query(query)
+
+  def refine_results(self, query: str, cached_query: str, results: t.List[Result]) -> t.Optional[t.List[Result]]:
+    return self.plugin.refine_results(query, cached_query, results)
+
+
+def _iter_entry_points(group: str) -> t.Iterator[t.Any]:
+  try:
+    from importlib.metadata import entry_points
+  except ImportError:
+    import pkg_resources
+    yield from pkg_resources.iter_entry_points(group)
+    return
+  eps = entry_points()
+  if hasattr(eps, 'select'):
+    yield from eps.select(group=group)
+  else:
+    yield from eps.get(group, [])
+
+
+def discover_plugins(report: t.Optional[StartupReport] = None) -> t.List[PluginSpec]:
+  """
+  Discover the #PluginSpec#s of all installed plugins. Entry points that fail to load are
+  logged and skipped.
+  """
+
+  specs: t.List[PluginSpec] = []
+  for ep in _iter_entry_points(ENTRYPOINT_GROUP):
+    started = time.perf_counter()
+    try:
+      spec = ep.load()
+    except Exception:
+      log.exception('Unable to load plugin entry point: %s', ep)
+      continue
+    if not isinstance(spec, PluginSpec):
+      log.error('Plugin entry point %s does not point to a PluginSpec, got %r', ep, spec)
+      continue
+    if spec.id != ep.name:
+      spec = dataclasses.replace(spec, id=ep.name)
+    if report is not None:
+      report.record(spec.id, 'discover', time.perf_counter() - started)
+    specs.append(spec)
+  return specs
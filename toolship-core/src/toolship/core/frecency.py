@@ -0,0 +1,176 @@
+
+"""
+Remembers which results the user selected, so that the #Toolship can rank the results
+that are used frequently and recently first.
+
+Selections are appended to a log file, one JSON array `[timestamp, weight, plugin_id,
+result_id]` per line. The log is read in one go when the store is first used, and is
+rewritten with one line per result (with the weights decayed up to that point) when it
+has grown too long.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+import typing as t
+
+log = logging.getLogger(__name__)
+_Key = t.Tuple[str, str]
+
+
+def default_frecency_path() -> str:
+  """
+  Returns the path of the frecency log, which is `$XDG_DATA_HOME/toolship/frecency.log`.
+  """
+
+  data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+  return os.path.join(data_home, 'toolship', 'frecency.log')
+
+
+class FrecencyStore:
+  """
+  Stores a score for every `(plugin_id, result_id)` that was selected. Every selection adds
+  `1.0` to the score, and scores halve every *half_life* seconds. All methods are
+  thread-safe.
+
+  # Arguments
+  path: The path of the log file. If #None, selections are only kept in memory.
+  half_life: The number of seconds after which a selection counts half as much.
+  compact_after: The number of lines that may be appended to the log before it is
+    compacted.
+  min_score: Results whose score decayed below this value are dropped on compaction.
+  """
+
+  def __init__(
+    self,
+    path: t.Optional[str] = None,
+    half_life: float = 14 * 24 * 3600.0,
+    compact_after: int = 1000,
+    min_score: float = 0.01,
+    clock: t.Callable[[], float] = time.time,
+  ) -> None:
+    self.path = path
+    self.half_life = half_life
+    self.compact_after = compact_after
+    self.min_score = min_score
+    self._clock = clock
+    self._entries: t.Dict[_Key, t.Tuple[float, float]] = {}  # (score, timestamp)
+    self._log_lines = 0
+    self._loaded = False
+    self._lock = threading.Lock()
+
+  def __len__(self) -> int:
+    with self._lock:
+      self._ensure_loaded()
+      return len(self._entries)
+
+  def _decay(self, score: float, since: float, now: float) -> float:
+    return score * math.pow(0.5, max(0.0, now - since) / self.half_life)
+
+  def _add(self, key: _Key, weight: float, now: float) -> None:
+    score, since = self._entries.get(key, (0.0, now))
+    self._entries[key] = (self._decay(score, since, now) + weight, now)
+
+  def _ensure_loaded(self) -> None:
+    # Note: Must be called with the lock held.
+    if self._loaded:
+      return
+    self._loaded = True
+    if self.path is None:
+      return
+    try:
+      with open(self.path, encoding='utf8') as fp:
+        lines = fp.read().splitlines()
+    except FileNotFoundError:
+      return
+    except OSError as exc:
+      log.warning('Unable to read %s: %s', self.path, exc)
+      return
+    for line in lines:
+      try:
+        timestamp, weight, plugin_id, result_id = json.loads(line)
+      except ValueError:
+        # Most likely the last line of a process that exited while writing it.
+        log.debug('Skipping invalid line in %s: %r', self.path, line)
+        continue
+      self._add((plugin_id, result_id), weight, timestamp)
+    self._log_lines = len(lines)
+
+  def _append(self, line: str) -> None:
+    # Note: Must be called with the lock held.
+    if self.path is None:
+      return
+    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+    with open(self.path, 'a', encoding='utf8') as fp:
+      fp.write(line)
+
+  def record(self, plugin_id: str, result_id: str) -> None:
+    """
+    Records that the result *result_id* of the plugin *plugin_id* was selected.
+    """
+
+    now = self._clock()
+    with self._lock:
+      self._ensure_loaded()
+      self._add((plugin_id, result_id), 1.0, now)
+      try:
+        self._append(json.dumps([now, 1.0, plugin_id, result_id]) + '\n')
+      except OSError as exc:
+        log.warning('Unable to write %s: %s', self.path, exc)
+        return
+      self._log_lines += 1
+      if self._log_lines > len(self._entries) + self.compact_after:
+        self._compact(now)
+
+  def score(self, plugin_id: str, result_id: str) -> float:
+    """
+    Returns the decayed score of a result, or `0.0` if it was never selected.
+    """
+
+    with self._lock:
+      self._ensure_loaded()
+      entry = self._entries.get((plugin_id, result_id))
+      if entry is None:
+        return 0.0
+      return self._decay(entry[0], entry[1], self._clock())
+
+  def boost(self, plugin_id: str, result_id: str) -> float:
+    """
+    Returns the #score() of a result mapped to the range `[0.0, 1.0)`, so that it can be
+    added to the score of a match.
+    """
+
+    score = self.score(plugin_id, result_id)
+    return score / (1.0 + score)
+
+  def compact(self) -> None:
+    """
+    Rewrites the log with one line per result and drops the results whose score decayed
+    below #min_score.
+    """
+
+    with self._lock:
+      self._ensure_loaded()
+      self._compact(self._clock())
+
+  def _compact(self, now: float) -> None:
+    # Note: Must be called with the lock held.
+    entries = {}
+    for key, (value, since) in self._entries.items():
+      value = self._decay(value, since, now)
+      if value >= self.min_score:
+        entries[key] = (value, now)
+    self._entries = entries
+    if self.path is not None:
+      tmp = self.path + '.tmp'
+      try:
+        with open(tmp, 'w', encoding='utf8') as fp:
+          fp.writelines(json.dumps([now, value, *key]) + '\n' for key, (value, _) in entries.items())
+        os.replace(tmp, self.path)
+      except OSError as exc:
+        log.warning('Unable to compact %s: %s', self.path, exc)
+        return
+    self._log_lines = len(entries)
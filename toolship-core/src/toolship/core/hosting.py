@@ -0,0 +1,257 @@
+
+"""
+Runs plugins in separate processes, so that a CPU-heavy plugin does not compete with the
+frontend for the GIL and a plugin that crashes (e.g. in a native extension) does not take
+the whole application down.
+
+A #HostedPlugin is a proxy for the plugin described by a #PluginSpec. It starts one or
+more host processes that import the plugin and serve queries. Queries and results are
+exchanged as JSON, using the same encoding as the daemon (see #toolship.core.protocol).
+A host that crashes is restarted.
+
+Example:
+
+```python
+spec = PluginSpec('files', 'toolship.files.plugin:FilesPlugin', prefix='f')
+toolship.add_plugin(spec.id, HostedPlugin(spec, processes=4))
+```
+"""
+
+import collections
+import importlib
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import typing as t
+
+from .discovery import PluginSpec
+from .plugins import IsClipboardValueProducer, IsRunnable, Plugin, PluginMatchError, Result, call_with_limit
+from .protocol import RemoteResult, decode_result, encode_result
+from .query import Query
+
+log = logging.getLogger(__name__)
+
+#: The number of results that a host remembers so that their actions can be performed.
+MAX_RECENT_RESULTS = 4096
+
+
+def _host_main(spec: PluginSpec, conn: t.Any) -> None:
+  # The entry point of a host process.
+  logging.basicConfig(level=logging.WARNING)
+  module_name, member = spec.factory.partition(':')[::2]
+  plugin: Plugin = getattr(importlib.import_module(module_name), member)()
+  recent: 'collections.OrderedDict[str, Result]' = collections.OrderedDict()
+
+  while True:
+    try:
+      message = json.loads(conn.recv_bytes())
+    except EOFError:
+      break
+    op = message.get('op')
+    response: t.Dict[str, t.Any] = {}
+    try:
+      if op == 'match':
+        results = call_with_limit(plugin.match_search_query, Query(message['query']), message.get('limit'))
+        for result in results:
+          recent[result.id] = result
+          recent.move_to_end(result.id)
+        while len(recent) > MAX_RECENT_RESULTS:
+          recent.popitem(last=False)
+        response['results'] = [encode_result(spec.id, result) for result in results]
+      elif op == 'action':
+        result = recent[message['id']]
+        if message['action'] == 'copy' and isinstance(result, IsClipboardValueProducer):
+          response['value'] = result.get_value()
+        elif message['action'] == 'run' and isinstance(result, IsRunnable):
+          result.run()
+        else:
+          raise ValueError(f'Result {result.id!r} does not support the {message["action"]!r} action')
+      elif op == 'load':
+        plugin.on_load()
+      elif op == 'unload':
+        plugin.on_unload()
+      elif op == 'exit':
+        break
+      else:
+        raise ValueError(f'Unknown operation: {op!r}')
+    except PluginMatchError as exc:
+      response = {'error': str(exc), 'match_error': True}
+    except Exception as exc:
+      log.exception('Unhandled error in plugin host %s: %s', spec.id, op)
+      response = {'error': f'{type(exc).__name__}: {exc}'}
+    conn.send_bytes(json.dumps(response, separators=(',', ':')).encode('utf8'))
+
+
+class _HostCrashed(Exception):
+  pass
+
+
+class _Host:
+  """
+  A host process and the connection to it. Requests are sent one at a time.
+  """
+
+  def __init__(self, spec: PluginSpec, context: t.Any, index: int) -> None:
+    self.spec = spec
+    self.index = index
+    self.generation = 0
+    self.lock = threading.Lock()
+    self._context = context
+    self._process: t.Any = None
+    self._conn: t.Any = None
+
+  @property
+  def running(self) -> bool:
+    return self._process is not None
+
+  def start(self) -> None:
+    # Note: Must be called with the lock held.
+    parent_conn, child_conn = self._context.Pipe()
+    self._process = self._context.Process(
+      target=_host_main,
+      args=(self.spec, child_conn),
+      name=f'toolship-host-{self.spec.id}-{self.index}',
+      daemon=True)
+    self._process.start()
+    child_conn.close()
+    self._conn = parent_conn
+    self.generation += 1
+
+  def stop(self) -> None:
+    # Note: Must be called with the lock held.
+    if self._process is None:
+      return
+    try:
+      self._conn.send_bytes(b'{"op":"exit"}')
+    except OSError:
+      pass
+    self._process.join(1.0)
+    if self._process.is_alive():
+      self._process.terminate()
+      self._process.join()
+    self._conn.close()
+    self._process = self._conn = None
+
+  def request(self, message: t.Dict[str, t.Any], start: bool = True) -> t.Dict[str, t.Any]:
+    # Note: Must be called with the lock held. Starts the host if it is not running, unless
+    # *start* is disabled.
+    if self._process is None:
+      if not start:
+        raise RuntimeError(f'The plugin host of {self.spec.id} is not running.')
+      self.start()
+    try:
+      self._conn.send_bytes(json.dumps(message, separators=(',', ':')).encode('utf8'))
+      response = json.loads(self._conn.recv_bytes())
+    except (EOFError, OSError) as exc:
+      exitcode = self._process.exitcode
+      self.stop()
+      raise _HostCrashed(f'exit code {exitcode}') from exc
+    if 'error' in response:
+      raise (PluginMatchError if response.get('match_error') else RuntimeError)(response['error'])
+    return response
+
+
+class HostedPlugin(Plugin):
+  """
+  Runs the plugin described by *spec* in *processes* host processes. Up to that many
+  queries are processed at the same time (see #Plugin.max_concurrency). Host processes are
+  started with the `spawn` method when the plugin is loaded or first queried, and stopped
+  when the plugin is unloaded. A host that crashes is restarted, and the query that it was
+  processing fails with a #PluginMatchError.
+
+  Results are proxies whose actions are performed by the host that returned them. Results
+  can not be refined (#Plugin.refinable), and may only be cached if *cacheable* is #True.
+  The ranking query is derived from the prefix of the *spec* without asking the plugin.
+  """
+
+  def __init__(self, spec: PluginSpec, processes: int = 1, cacheable: bool = True) -> None:
+    self.spec = spec
+    self.cacheable = cacheable
+    self.max_concurrency = max(1, processes)
+    self.restarts = 0
+    self._context = multiprocessing.get_context('spawn')
+    self._hosts = [_Host(spec, self._context, idx) for idx in range(self.max_concurrency)]
+    self._idle: 'queue.Queue[_Host]' = queue.Queue()
+    for host in self._hosts:
+      self._idle.put(host)
+    self._loaded = False
+
+  def __repr__(self) -> str:
+    return f'HostedPlugin({self.spec!r}, processes={self.max_concurrency})'
+
+  def _acquire_all(self) -> t.List[_Host]:
+    # Waits until no host is processing a query.
+    return [self._idle.get() for _ in self._hosts]
+
+  def _release_all(self, hosts: t.List[_Host]) -> None:
+    for host in hosts:
+      self._idle.put(host)
+
+  def _call(self, host: _Host, message: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+    with host.lock:
+      try:
+        return host.request(message)
+      except _HostCrashed as exc:
+        self.restarts += 1
+        log.error('The plugin host %s of %s crashed (%s), restarting it.', host.index, self.spec.id, exc)
+        host.start()
+        if self._loaded:
+          host.request({'op': 'load'})
+        raise PluginMatchError(f'The plugin host of {self.spec.id} crashed and was restarted.')
+
+  def on_load(self) -> None:
+    hosts = self._acquire_all()
+    try:
+      self._loaded = True
+      for host in hosts:
+        self._call(host, {'op': 'load'})
+    finally:
+      self._release_all(hosts)
+
+  def on_unload(self) -> None:
+    hosts = self._acquire_all()
+    try:
+      self._loaded = False
+      for host in hosts:
+        with host.lock:
+          if host.running:
+            try:
+              host.request({'op': 'unload'})
+            except (_HostCrashed, RuntimeError, PluginMatchError) as exc:
+              log.warning('Unable to unload plugin host %s of %s: %s', host.index, self.spec.id, exc)
+            host.stop()
+    finally:
+      self._release_all(hosts)
+
+  def get_prefix(self) -> t.Optional[str]:
+    return self.spec.prefix
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    host = self._idle.get()
+    try:
+      response = self._call(host, {'op': 'match', 'query': str(query), 'limit': limit})
+      generation = host.generation
+    finally:
+      self._idle.put(host)
+
+    def _perform(result: RemoteResult, action: str) -> t.Optional[str]:
+      # A host that was stopped or restarted since does not know the result anymore.
+      with host.lock:
+        if not host.running or host.generation != generation:
+          raise RuntimeError(f'The plugin host of {self.spec.id} was stopped or restarted, query again.')
+        return host.request({'op': 'action', 'id': result.id, 'action': action}, start=False).get('value')
+
+    return [decode_result(data, _perform)[1] for data in response['results']]
+
+
+def parse_host_argument(value: str) -> t.Tuple[str, int]:
+  """
+  Parses the value of a `--host PLUGIN_ID[:PROCESSES]` command line option.
+  """
+
+  plugin_id, sep, processes = value.partition(':')
+  if not plugin_id or (sep and not processes.isdigit()):
+    raise ValueError(f'Expected PLUGIN_ID[:PROCESSES], got {value!r}')
+  return plugin_id, int(processes) if sep else 1
@@ -1,4 +1,3 @@
-
 """
 A small wrapper around #pynput to provide an easy-to-use API to listen to keyboard shortcuts
 globally.
@@ -13,22 +12,30 @@ from toolship.core.hotkeys import HotkeyListener
 
 listener = HotkeyListener()
 listener.add('ctrl+alt+space', _on_hotkey_down)
+listener.add('ctrl+k, ctrl+t', _on_hotkey_down)  # A chord of two keystrokes.
 listener.start()
 
 ```
 """
 
+import queue
 import re
 import logging
+import threading
 import time
 import typing as t
 
 from pynput import keyboard
 from pynput.keyboard import Key, KeyCode
 
+from . import tracing
+from .metrics import LatencyHistogram
+
 _Callback = t.Callable[[], t.Any]
 _KeySeq = t.Sequence[t.Union[Key, KeyCode]]
 _KeySet = t.Set[t.Union[Key, KeyCode]]
+_Keystroke = t.FrozenSet[t.Union[Key, KeyCode]]
+_Chord = t.Tuple[_Keystroke, ...]
 log = logging.getLogger(__name__)
 
 MODIFIERS = {
@@ -38,6 +45,8 @@ MODIFIERS = {
   Key.shift: Key.shift, Key.shift_l: Key.shift, Key.shift_r: Key.shift,
 }
 
+_MODIFIER_KEYS = frozenset(MODIFIERS.values())
+
 
 def keyset_match(reference: _KeySet, current: _KeySet) -> bool:
   """
@@ -56,9 +65,29 @@ def keyset_match(reference: _KeySet, current: _KeySet) -> bool:
   return True
 
 
+def normalize(keys: t.Iterable[t.Union[Key, KeyCode]]) -> _Keystroke:
+  """
+  Translates the left and right variants of modifier keys in *keys* via the #MODIFIERS
+  mapping and returns the result as a hashable keystroke.
+  """
+
+  return frozenset(MODIFIERS.get(key, key) for key in keys)
+
+
 class HotkeyListener:
   """
   A smaller wrapper around #pynput to make listening to hotkeys globally easy.
+
+  Hotkeys are indexed by their normalized keystrokes, so the cost of handling a key event
+  does not depend on the number of registered hotkeys. A hotkey may be a chord of multiple
+  keystrokes (e.g. `ctrl+k, ctrl+t`); the steps of a chord must follow each other within
+  #chord_timeout seconds.
+
+  Key events are delivered on the keyboard hook thread of the OS, which must return quickly
+  (on Windows, the hook is removed silently if it times out). Callbacks are therefore not
+  invoked on that thread, but passed to a dispatcher thread through a bounded queue. A
+  callback that is triggered again while it is still queued or running is not queued a
+  second time. The time spent on the hook thread per event is recorded in #hook_latency.
   """
 
   #: The maximum number of seconds since the previous key-down event to still consider
@@ -67,36 +96,136 @@ class HotkeyListener:
   #: represents the active keystroke. (at least on Windows 10).
   consistent_keystroke_threshold: float
 
-  def __init__(self, consistent_keystroke_threshold: float = 1.0) -> None:
+  #: The maximum number of seconds between two keystrokes of a chord.
+  chord_timeout: float
+
+  #: The time spent on the keyboard hook thread per key event.
+  hook_latency: LatencyHistogram
+
+  def __init__(
+    self,
+    consistent_keystroke_threshold: float = 1.0,
+    chord_timeout: float = 1.0,
+    max_pending: int = 16,
+  ) -> None:
     self.consistent_keystroke_threshold = consistent_keystroke_threshold
+    self.chord_timeout = chord_timeout
+    self.hook_latency = LatencyHistogram()
     self._current: _KeySet = set()
     self._last_modified = time.time()
-    self._listeners: t.List[t.Tuple[_KeySet, _Callback]] = []
+    self._hotkeys: t.Dict[_Chord, t.List[_Callback]] = {}
+    self._chord_prefixes: t.Set[_Chord] = set()
+    self._partial_listeners: t.Dict[_Keystroke, t.List[_Callback]] = {}
+    self._partial_fired = False
+    self._chord: _Chord = ()
+    self._chord_deadline = 0.0
     self._listener: t.Optional[keyboard.Listener] = None
+    self._queue: 'queue.Queue[t.Optional[t.Tuple[_Callback, _Chord, str]]]' = queue.Queue(max_pending)
+    self._in_flight: t.Set[_Callback] = set()
+    self._in_flight_lock = threading.Lock()
+    self._dispatcher: t.Optional[threading.Thread] = None
+
+  def _fire(self, callbacks: t.List[_Callback], chord: _Chord, kind: str = 'callback') -> None:
+    # Note: Called from the keyboard hook thread, must not block.
+    tracing.instant('HotkeyListener.trigger', keyseq=str(chord), kind=kind)
+    if self._dispatcher is None:
+      self._start_dispatcher()
+    for callback in callbacks:
+      with self._in_flight_lock:
+        if callback in self._in_flight:
+          continue
+        self._in_flight.add(callback)
+      try:
+        self._queue.put_nowait((callback, chord, kind))
+      except queue.Full:
+        with self._in_flight_lock:
+          self._in_flight.discard(callback)
+        log.warning('HotkeyListener dispatch queue is full, dropping %s for keyseq %s', kind, chord)
+
+  def _start_dispatcher(self) -> None:
+    self._dispatcher = threading.Thread(target=self._dispatch, name='HotkeyListener', daemon=True)
+    self._dispatcher.start()
+
+  def _dispatch(self) -> None:
+    while True:
+      item = self._queue.get()
+      if item is None:
+        break
+      callback, chord, kind = item
+      try:
+        with tracing.span('HotkeyListener.callback', keyseq=str(chord), kind=kind):
+          callback()
+      except Exception:
+        log.exception('Unhandled exception in HotkeyListener %s for keyseq %s', kind, chord)
+      finally:
+        with self._in_flight_lock:
+          self._in_flight.discard(callback)
+
+  def _advance(self, chord: _Chord, now: float) -> bool:
+    """
+    Fires the callbacks of *chord* and/or remembers it as the chord in progress. Returns
+    #False if *chord* is neither a hotkey nor the beginning of one.
+    """
+
+    callbacks = self._hotkeys.get(chord)
+    is_prefix = chord in self._chord_prefixes
+    self._chord = chord if is_prefix else ()
+    self._chord_deadline = now + self.chord_timeout
+    if callbacks:
+      self._fire(callbacks, chord)
+    return callbacks is not None or is_prefix
 
   def _on_down(self, key: t.Union[Key, KeyCode]) -> None:
-    if (time.time() - self._last_modified) > self.consistent_keystroke_threshold:
+    started = time.perf_counter()
+    try:
+      with tracing.span('HotkeyListener.key_down'):
+        self._handle_down(key)
+    finally:
+      self.hook_latency.record(time.perf_counter() - started)
+
+  def _handle_down(self, key: t.Union[Key, KeyCode]) -> None:
+    now = time.time()
+    if (now - self._last_modified) > self.consistent_keystroke_threshold:
       self._current.clear()
+      self._partial_fired = False
     self._current.add(key)
-    self._last_modified = time.time()
-    for keyseq, callback in self._listeners:
-      if keyset_match(keyseq, self._current):
-        try:
-          callback()
-        except Exception:
-          log.exception('Unhandled exception in HotkeyListener callback for keyseq %s', keyseq)
+    self._last_modified = now
+    keystroke = normalize(self._current)
+
+    if self._chord and now > self._chord_deadline:
+      self._chord = ()
+    chord = self._chord
+    if not chord:
+      self._advance((keystroke,), now)
+    elif not self._advance(chord + (keystroke,), now):
+      if keystroke <= _MODIFIER_KEYS:
+        # Pressing the modifiers of the next keystroke does not break the chord.
+        self._chord = chord
+      else:
+        self._advance((keystroke,), now)
+
+    if not self._partial_fired:
+      callbacks = self._partial_listeners.get(keystroke)
+      if callbacks:
+        self._partial_fired = True
+        self._fire(callbacks, (keystroke,), 'on_partial callback')
 
   def _on_up(self, key: t.Union[Key, KeyCode]) -> None:
+    started = time.perf_counter()
     try:
-      self._current.remove(key)
-    except KeyError:
-      pass
+      self._current.discard(key)
+      if not self._current:
+        self._partial_fired = False
+    finally:
+      self.hook_latency.record(time.perf_counter() - started)
 
   def start(self) -> None:
     """
     Start the #pynput listener. You should call #stop() before exiting your application.
     """
 
+    if self._dispatcher is None:
+      self._start_dispatcher()
     self._listener = keyboard.Listener(on_press=self._on_down, on_release=self._on_up)
     self._listener.__enter__()
 
@@ -109,21 +238,48 @@ class HotkeyListener:
     if self._listener:
       self._listener.__exit__(None, None, None)
       self._listener.join()
-
-  def add(self, keyseq: t.Union[str, _KeySeq], callback: _Callback) -> None:
+    if self._dispatcher:
+      self._queue.put(None)
+      self._dispatcher.join()
+      self._dispatcher = None
+
+  def add(
+    self,
+    keyseq: t.Union[str, _KeySeq],
+    callback: _Callback,
+    on_partial: t.Optional[_Callback] = None,
+  ) -> None:
     """
     Register a callback to be invoked when a given sequence of keys is active at the same time.
 
     # Arguments
     keyseq: A list of #Key#s and #KeyCode#s or a string representing the keystroke. Examples:
-      `ctrl+alt+space`, `cmd+t+0`.
+      `ctrl+alt+space`, `cmd+t+0`. The string may describe a chord of multiple keystrokes
+      separated by commas, e.g. `ctrl+k, ctrl+t`.
     callback: The function to call if the global keystroke is matched. The function does not
-      accept arguments and the return value is ignored.
+      accept arguments and the return value is ignored. It is called from the dispatcher
+      thread of the listener.
+    on_partial: A function to call when all modifier keys of the (first) keystroke are down,
+      i.e. when it is likely that the keystroke is about to be completed. Called at most once
+      until all keys are released again. Use this to prepare for *callback* being invoked. Not
+      called for keystrokes with a single modifier, which is pressed all the time for other
+      shortcuts (e.g. `ctrl` for Ctrl+C).
     """
 
     if isinstance(keyseq, str):
-      keyseq = from_string(keyseq)
-    self._listeners.append((set(keyseq), callback))
+      chord = tuple(normalize(step) for step in parse_chord(keyseq))
+    else:
+      chord = (normalize(keyseq),)
+    if not chord or not all(chord):
+      raise ValueError(f'empty keystroke in hotkey: {keyseq!r}')
+
+    self._hotkeys.setdefault(chord, []).append(callback)
+    for idx in range(1, len(chord)):
+      self._chord_prefixes.add(chord[:idx])
+
+    modifiers = chord[0] & _MODIFIER_KEYS
+    if on_partial is not None and len(modifiers) > 1 and modifiers != chord[0]:
+      self._partial_listeners.setdefault(modifiers, []).append(on_partial)
 
 
 def from_string(seq: str) -> _KeySet:
@@ -140,8 +296,25 @@ def from_string(seq: str) -> _KeySet:
   result: _KeySet = set()
   parts = re.split(r'[\+\- ,]', seq)
   for part in parts:
+    if not part:
+      continue
     if hasattr(Key, part):
       result.add(getattr(Key, part))
     else:
       result.add(KeyCode(char=part))
   return result
+
+
+def parse_chord(seq: str) -> t.List[_KeySet]:
+  """
+  Converts a string representing a chord of one or more keystrokes separated by commas to a
+  list of key sets.
+
+  Example:
+
+  ```python
+  >>> parse_chord('ctrl+k, ctrl+t')
+  ```
+  """
+
+  return [from_string(step) for step in seq.split(',')]
@@ -2,44 +2,640 @@
 __author__ = 'Niklas Rosenstein <rosensteinniklas@gmail.com>'
 __version__ = '0.0.0'
 
+import concurrent.futures
+import json
 import logging
+import math
+import threading
+import time
 import typing as t
 
-from .plugins import Plugin, Result, PluginMatchError
+from . import tracing
+from .cache import QueryCache
+from .discovery import LazyPlugin
+from .frecency import FrecencyStore
+from .metrics import CircuitBreaker, LatencyHistogram, PluginStats
+from .pending import PendingQuery
+from .plugins import IsClipboardValueProducer, Plugin, Result, PluginMatchError, call_with_limit
+from .query import PrefixTrie, Query
+from .ranking import score_result, top_k
 
 log = logging.getLogger(__name__)
+_Commands = t.List[t.Tuple[str, Result]]
+_BatchCallback = t.Callable[[str, _Commands], None]
+T = t.TypeVar('T')
 
 
 class Toolship:
+  """
+  Manages a set of #Plugin#s and dispatches search queries to them. Every query is
+  tokenized once into a #Query and only passed to the plugins whose #Plugin.get_prefix()
+  matches the first token, plus the plugins that have no prefix.
 
-  def __init__(self) -> None:
+  # Arguments
+  parallel: If enabled, #get_commands() queries all plugins at the same time on a bounded
+    worker pool instead of one after another on the caller's thread. Plugins that do not
+    respond within their budget are reported with a #PENDING_ID result.
+  max_workers: The maximum number of worker threads used in parallel mode.
+  budget: The default number of seconds that a plugin may take to respond to a query in
+    parallel mode. Can be overwritten per plugin with #add_plugin().
+  cache: The cache for plugin results. If not specified, a #QueryCache with default
+    settings is used. The cache is cleared when the plugins are unloaded.
+  limit: The maximum number of results returned by #get_commands(). The results of all
+    plugins are ranked by how well they match the query and only the best are kept. The
+    limit is also passed to the plugins. Pass #None to disable the limit.
+  idle_timeout: The number of seconds that plugins are kept loaded after #deactivate().
+    Pass #None to keep them loaded until #on_unload() is called explicitly.
+  breaker_threshold: The number of consecutive queries that a plugin may exceed its budget
+    before it is temporarily skipped. Skipped plugins are reported with an error result.
+  breaker_cooldown: The number of seconds after which a skipped plugin is probed again.
+  frecency: Records the results that the user selected (see #record_selection()). Results
+    that were selected frequently and recently are ranked higher.
+  frecency_weight: The most that the #frecency can add to the score of a result, whose
+    fuzzy match score is between `0.0` and `1.0`.
+
+  The #Toolship records the latencies of all plugin calls (see #get_stats()). They can be
+  viewed by entering `#stats` as the query, along with the histograms in #latencies.
+  """
+
+  #: The #Result.id of the result that is returned for a plugin that did not respond
+  #: within its budget in parallel mode.
+  PENDING_ID = '#pending'
+
+  #: The ID of the built-in plugin that displays the plugin statistics.
+  STATS_PLUGIN_ID = 'toolship.stats'
+
+  def __init__(
+    self,
+    parallel: bool = False,
+    max_workers: int = 4,
+    budget: float = 0.1,
+    cache: t.Optional[QueryCache] = None,
+    limit: t.Optional[int] = 50,
+    idle_timeout: t.Optional[float] = 300.0,
+    breaker_threshold: int = 3,
+    breaker_cooldown: float = 30.0,
+    frecency: t.Optional[FrecencyStore] = None,
+    frecency_weight: float = 0.5,
+  ) -> None:
+    self.parallel = parallel
+    self.max_workers = max_workers
+    self.budget = budget
+    self.cache = QueryCache() if cache is None else cache
+    self.limit = limit
+    self.idle_timeout = idle_timeout
+    self.breaker_threshold = breaker_threshold
+    self.breaker_cooldown = breaker_cooldown
+    self.frecency = frecency
+    self.frecency_weight = frecency_weight
+    #: Latencies that are not recorded for a plugin, e.g. the time that the frontend takes
+    #: to appear, by name. They are displayed by the `#stats` query.
+    self.latencies: t.Dict[str, LatencyHistogram] = {}
     self._plugins: t.Dict[str, Plugin] = {}
+    self._budgets: t.Dict[str, float] = {}
+    self._locks: t.Dict[str, threading.Semaphore] = {}
+    self._stats: t.Dict[str, PluginStats] = {}
+    self._breakers: t.Dict[str, CircuitBreaker] = {}
+    self._prefixes: t.Dict[str, t.Optional[str]] = {}
+    self._prefix_trie: PrefixTrie[str] = PrefixTrie()
+    self._executor: t.Optional[concurrent.futures.ThreadPoolExecutor] = None
+    self._loaded: t.Set[str] = set()
+    self._loading: t.Dict[str, concurrent.futures.Future] = {}
+    self._in_flight: t.Dict[str, int] = {}
+    self._deferred: t.Dict[str, t.Tuple[t.Callable[..., t.Any], t.Tuple[t.Any, ...], concurrent.futures.Future]] = {}
+    self._in_flight_lock = threading.Lock()
+    self._active = False
+    self._idle_timer: t.Optional[threading.Timer] = None
+    self._lifecycle_lock = threading.Lock()
+    self.add_plugin(self.STATS_PLUGIN_ID, _StatsPlugin(self))
+
+  def add_plugin(self, plugin_id: str, plugin: Plugin, budget: t.Optional[float] = None) -> None:
+    """
+    Register a plugin.
 
-  def add_plugin(self, plugin_id: str, plugin: Plugin) -> None:
+    # Arguments
+    plugin_id: The ID of the plugin. Results are reported alongside this ID.
+    plugin: The plugin object.
+    budget: The number of seconds the plugin may take to respond to a query in parallel
+      mode. Defaults to #Toolship.budget.
+    """
+
+    if plugin_id in self._plugins:
+      self._remove_prefix(plugin_id)
     self._plugins[plugin_id] = plugin
+    self._locks[plugin_id] = threading.BoundedSemaphore(max(1, plugin.max_concurrency))
+    self._stats[plugin_id] = PluginStats()
+    self._breakers[plugin_id] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+    self._prefixes[plugin_id] = prefix = plugin.get_prefix()
+    if prefix is not None:
+      self._prefix_trie.add(prefix, plugin_id)
+    if budget is not None:
+      self._budgets[plugin_id] = budget
+    self.cache.invalidate(plugin_id)
 
-  def on_load(self) -> None:
-    for plugin_id, plugin in self._plugins.items():
+  def _remove_prefix(self, plugin_id: str) -> None:
+    prefix = self._prefixes.pop(plugin_id)
+    if prefix is not None:
+      self._prefix_trie.remove(prefix, plugin_id)
+
+  def route(self, query: Query) -> t.List[str]:
+    """
+    Returns the IDs of the plugins that the *query* is dispatched to, in the order that
+    they were registered.
+    """
+
+    matched = set(self._prefix_trie.get(query.prefix)) if query.prefix is not None else set()
+    return [
+      plugin_id for plugin_id, prefix in self._prefixes.items()
+      if prefix is None or plugin_id in matched]
+
+  def get_budget(self, plugin_id: str) -> float:
+    return self._budgets.get(plugin_id, self.budget)
+
+  def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+    if self._executor is None:
+      self._executor = concurrent.futures.ThreadPoolExecutor(
+        self.max_workers, thread_name_prefix='toolship')
+    return self._executor
+
+  def shutdown(self) -> None:
+    """
+    Shut down the worker pool used for parallel and streaming queries. Does not wait for
+    plugins that are still running.
+    """
+
+    self._cancel_idle_timer()
+    if self._executor is not None:
+      self._executor.shutdown(wait=False)
+      self._executor = None
+
+  def _load_plugin(self, plugin_id: str, resolve: bool = False) -> None:
+    plugin = self._plugins[plugin_id]
+
+    def _load() -> None:
+      plugin.on_load()
+      if resolve and isinstance(plugin, LazyPlugin):
+        # Import the plugin (which also calls its on_load()) now rather than on the first
+        # query that is routed to it.
+        plugin.plugin
+
+    with self._locks[plugin_id]:
+      if plugin_id in self._loaded:
+        return
       try:
-        plugin.on_load()
+        self._invoke(plugin_id, 'on_load', _load)
       except:
         log.exception('Unhandled error in Plugin.on_load: %s', plugin_id)
+      self._loaded.add(plugin_id)
+
+  def _load_in_background(self) -> t.List[concurrent.futures.Future]:
+    """
+    Load all plugins that are not currently loaded at the same time on the worker pool.
+    Queries to a plugin that is being loaded wait until it is loaded. Returns the futures
+    of all plugins that are being loaded, including those that were already loading.
+    """
+
+    futures = []
+    with self._lifecycle_lock:
+      for plugin_id in self._plugins:
+        if plugin_id in self._loaded:
+          continue
+        # Note: Entries are removed by the done callbacks from the worker threads.
+        future = self._loading.get(plugin_id)
+        if future is None:
+          future = self._get_executor().submit(self._load_plugin, plugin_id, True)
+          self._loading[plugin_id] = future
+          future.add_done_callback(lambda _, plugin_id=plugin_id: self._loading.pop(plugin_id, None))
+        futures.append(future)
+    return futures
+
+  def on_load(self) -> None:
+    """
+    Load all plugins that are not currently loaded. In parallel mode, the plugins are loaded
+    at the same time.
+    """
+
+    if self.parallel:
+      concurrent.futures.wait(self._load_in_background())
+    else:
+      for plugin_id in list(self._plugins):
+        self._load_plugin(plugin_id)
 
   def on_unload(self) -> None:
-    for plugin_id, plugin in self._plugins.items():
+    """
+    Unload all plugins that are currently loaded.
+    """
+
+    self._cancel_idle_timer()
+    self.cache.invalidate()
+    for plugin_id, plugin in list(self._plugins.items()):
+      with self._locks[plugin_id]:
+        if plugin_id not in self._loaded:
+          continue
+        self._loaded.discard(plugin_id)
+        try:
+          self._invoke(plugin_id, 'on_unload', plugin.on_unload)
+        except:
+          log.exception('Unhandled error in Plugin.on_unload: %s', plugin_id)
+
+  def _cancel_idle_timer(self) -> None:
+    with self._lifecycle_lock:
+      if self._idle_timer is not None:
+        self._idle_timer.cancel()
+        self._idle_timer = None
+
+  def _start_idle_timer(self) -> None:
+    with self._lifecycle_lock:
+      if self._idle_timer is not None:
+        self._idle_timer.cancel()
+        self._idle_timer = None
+      if self.idle_timeout is None:
+        return
+      self._idle_timer = threading.Timer(self.idle_timeout, self._on_idle)
+      self._idle_timer.daemon = True
+      self._idle_timer.start()
+
+  def _on_idle(self) -> None:
+    with self._lifecycle_lock:
+      if self._active or self._idle_timer is None:
+        return
+      self._idle_timer = None
+    log.info('Unloading plugins after %s seconds of inactivity.', self.idle_timeout)
+    self.on_unload()
+    if self._active:
+      # The frontend was shown again while we were unloading.
+      self._load_in_background()
+
+  def activate(self) -> None:
+    """
+    Called by the frontend when it becomes visible. Stops the plugins from being unloaded
+    due to inactivity and loads all plugins that are not already loaded in the background.
+    Returns immediately; queries to plugins that are still being loaded wait for them (or
+    report them as pending, see #get_commands()).
+    """
+
+    self._active = True
+    self._cancel_idle_timer()
+    self._load_in_background()
+
+  def deactivate(self) -> None:
+    """
+    Called by the frontend when it is hidden. The plugins stay loaded for #idle_timeout
+    seconds so that they do not need to be loaded again if the frontend is shown again
+    shortly after, and are then unloaded in the background.
+    """
+
+    self._active = False
+    if self.idle_timeout is not None and self.idle_timeout <= 0:
+      self.on_unload()
+    else:
+      self._start_idle_timer()
+
+  def prewarm(self) -> None:
+    """
+    Load all plugins in the background, e.g. when it is likely that the frontend is about
+    to be shown. If the frontend is not shown, the plugins are unloaded again after
+    #idle_timeout seconds. Returns immediately.
+    """
+
+    if not self._active:
+      self._start_idle_timer()
+    if len(self._loaded) < len(self._plugins):
+      self._load_in_background()
+
+  def _match(self, plugin_id: str, query: str, pending: t.Optional[PendingQuery] = None) -> _Commands:
+    # Plugins were not written with concurrent calls in mind, thus we never enter the
+    # same plugin from more threads at the same time than its max_concurrency allows.
+    # Returns no commands if the *pending* query was cancelled while waiting.
+    with tracing.span('Toolship.match', plugin=plugin_id):
+      commands: _Commands = []
+      loading = self._loading.get(plugin_id)
+      if loading is not None:
+        if loading.cancel():
+          # Loading did not start yet, do it right here instead of waiting for a worker.
+          self._load_plugin(plugin_id, True)
+        else:
+          concurrent.futures.wait([loading])
+      with self._locks[plugin_id]:
+        if pending is not None and pending.cancelled:
+          return commands
+        try:
+          for result in self._query_plugin(plugin_id, query):
+            commands.append((plugin_id, result))
+        except PluginMatchError as exc:
+          commands.append((plugin_id, Result('#error', 'Error', None, str(exc))))
+        except:
+          log.exception('Unhandled error in Plugin.match_search_query: %s', plugin_id)
+      return commands
+
+  def _invoke(self, plugin_id: str, operation: str, func: t.Callable[..., T], *args: t.Any) -> T:
+    # Calls a plugin method and records its latency.
+    stats = self._stats[plugin_id]
+    started = time.perf_counter()
+    try:
+      with tracing.span(operation, plugin=plugin_id):
+        return func(*args)
+    except:
+      if operation == 'match_search_query':
+        stats.errors += 1
+      raise
+    finally:
+      elapsed = time.perf_counter() - started
+      stats.latencies[operation].record(elapsed)
+      if operation == 'match_search_query':
+        stats.calls += 1
+        within_budget = elapsed <= self.get_budget(plugin_id)
+        if not within_budget:
+          stats.over_budget += 1
+        self._breakers[plugin_id].record(within_budget)
+
+  def _query_plugin(self, plugin_id: str, query: str) -> t.List[Result]:
+    plugin = self._plugins[plugin_id]
+    if plugin.cacheable:
+      results = self.cache.get(plugin_id, query)
+      if results is not None:
+        return results
+
+    if not self._breakers[plugin_id].allow():
+      self._stats[plugin_id].skipped += 1
+      raise PluginMatchError(f'{plugin_id} is temporarily disabled because it was too slow.')
+
+    results = None
+    if plugin.cacheable and plugin.refinable:
+      cached = self.cache.find_prefix(plugin_id, query)
+      # If the plugin stopped at the limit, the cached results may be incomplete.
+      if cached is not None and (self.limit is None or len(cached[1]) < self.limit):
+        results = self._invoke(plugin_id, 'match_search_query',
+          plugin.refine_results, query, cached[0], cached[1])
+
+    if results is None:
+      results = self._invoke(plugin_id, 'match_search_query', call_with_limit, plugin.match_search_query, query, self.limit)
+    # Placeholders (e.g. while a plugin builds its index) would hide the real results.
+    if plugin.cacheable and not any(result.id == self.PENDING_ID for result in results):
+      self.cache.put(plugin_id, query, results)
+    return results
+
+  def get_stats(self) -> t.Dict[str, t.Any]:
+    """
+    Returns the statistics of all plugins as a JSON serializable dictionary. Latencies are
+    in milliseconds.
+    """
+
+    result = {}
+    for plugin_id, stats in self._stats.items():
+      result[plugin_id] = stats.to_json()
+      result[plugin_id]['breaker'] = self._breakers[plugin_id].state.value
+    return result
+
+  def _pending(self, plugin_id: str) -> t.Tuple[str, Result]:
+    if plugin_id in self._loading:
+      return (plugin_id, Result(self.PENDING_ID, 'Pending', f'Loading {plugin_id} ...'))
+    return (plugin_id, Result(self.PENDING_ID, 'Pending', f'Waiting for {plugin_id} ...'))
+
+  def score_commands(
+    self,
+    query: str,
+    commands: t.Iterable[t.Tuple[str, Result]],
+  ) -> t.Iterator[t.Tuple[float, t.Tuple[str, Result]]]:
+    """
+    Yields the score of every command in *commands* for the *query*, in the order of the
+    commands. Errors and pending results have an infinite score.
+    """
+
+    query = Query.coerce(query)
+    frecency = self.frecency
+    ranking_queries: t.Dict[str, str] = {}
+    for plugin_id, result in commands:
+      if result.error is not None or result.id == self.PENDING_ID:
+        yield math.inf, (plugin_id, result)
+        continue
+      ranking_query = ranking_queries.get(plugin_id)
+      if ranking_query is None:
+        ranking_query = ranking_queries[plugin_id] = self._plugins[plugin_id].get_ranking_query(query)
+      score = score_result(ranking_query, result)
+      if frecency is not None:
+        score += self.frecency_weight * frecency.boost(plugin_id, result.id)
+      yield score, (plugin_id, result)
+
+  def rank(self, query: str, commands: t.Iterable[t.Tuple[str, Result]]) -> _Commands:
+    """
+    Ranks *commands* by how well they match the *query* and returns the best #limit of them.
+    Errors and pending results are always ranked first.
+    """
+
+    with tracing.span('Toolship.rank'):
+      return top_k(self.score_commands(query, commands), self.limit)
+
+  def record_selection(self, plugin_id: str, result: Result) -> None:
+    """
+    Called by the frontend when the user selected a result, so that it is ranked higher
+    the next time. Does nothing if no #frecency store is configured.
+    """
+
+    if self.frecency is None or result.error is not None or result.id.startswith('#'):
+      return
+    self.frecency.record(plugin_id, result.id)
+
+  def get_commands(self, query: str) -> _Commands:
+    with tracing.span('Toolship.get_commands', query=str(query)):
+      query = Query.coerce(query)
+      if not self.parallel:
+        commands: _Commands = []
+        for plugin_id in self.route(query):
+          commands += self._match(plugin_id, query)
+        return self.rank(query, commands)
+
+      started = time.perf_counter()
+      plugin_ids = self.route(query)
+      futures = {plugin_id: self._submit_match(plugin_id, query) for plugin_id in plugin_ids}
+
+      # Wait on the plugins in the order of their deadline so that a plugin with a short
+      # budget is never kept waiting on one with a longer budget.
+      results: t.Dict[str, _Commands] = {}
+      for plugin_id in sorted(plugin_ids, key=self.get_budget):
+        future = futures[plugin_id]
+        if future is None:
+          # The plugin is still busy with previous queries.
+          results[plugin_id] = [self._pending(plugin_id)]
+          continue
+        timeout = max(0.0, started + self.get_budget(plugin_id) - time.perf_counter())
+        try:
+          results[plugin_id] = future.result(timeout)
+        except concurrent.futures.TimeoutError:
+          log.debug('Plugin %s did not respond within its budget.', plugin_id)
+          # If the call did not start yet, it must not occupy a worker later on.
+          future.cancel()
+          results[plugin_id] = [self._pending(plugin_id)]
+
+      return self.rank(query, (command for plugin_id in plugin_ids for command in results[plugin_id]))
+
+  def _submit_match(self, plugin_id: str, query: Query) -> t.Optional[concurrent.futures.Future]:
+    # Submits a call to #_match() to the worker pool, unless the plugin is busy.
+    future, deferred = self._submit_call(plugin_id, self._match, (plugin_id, query))
+    return None if deferred else future
+
+  def _submit_call(
+    self,
+    plugin_id: str,
+    func: t.Callable[..., T],
+    args: t.Tuple[t.Any, ...],
+    defer: bool = False,
+    future: t.Optional[concurrent.futures.Future] = None,
+  ) -> t.Tuple[concurrent.futures.Future, bool]:
+    # Submits a call to *func* to the worker pool, unless the plugin already has as many
+    # calls in flight as it can process at the same time. Further calls would only block a
+    # worker while they wait for the plugin. If the plugin is busy and *defer* is enabled,
+    # the call is submitted once a call of the plugin completed. Only the most recent
+    # deferred call is kept, earlier ones are cancelled. Returns the future of the call and
+    # whether the plugin was busy.
+
+    future = future or concurrent.futures.Future()
+    superseded = None
+    with self._in_flight_lock:
+      in_flight = self._in_flight.get(plugin_id, 0)
+      if in_flight >= max(1, self._plugins[plugin_id].max_concurrency):
+        if defer:
+          superseded = self._deferred.get(plugin_id)
+          self._deferred[plugin_id] = (func, args, future)
+        busy = True
+      else:
+        self._in_flight[plugin_id] = in_flight + 1
+        busy = False
+    if superseded is not None:
+      superseded[2].cancel()
+    if busy:
+      return future, True
+
+    def _done(_future: concurrent.futures.Future) -> None:
+      with self._in_flight_lock:
+        self._in_flight[plugin_id] -= 1
+        deferred = self._deferred.pop(plugin_id, None)
+      if deferred is not None and not deferred[2].cancelled():
+        self._submit_call(plugin_id, deferred[0], deferred[1], True, deferred[2])
+
+    def _run() -> None:
+      if not future.set_running_or_notify_cancel():  # type: ignore
+        return
       try:
-        plugin.on_unload()
-      except:
-        log.exception('Unhandled error in Plugin.on_load: %s', plugin_id)
+        result = func(*args)
+      except BaseException as exc:
+        future.set_exception(exc)  # type: ignore
+      else:
+        future.set_result(result)  # type: ignore
+
+    future.add_done_callback(_done)
+    self._get_executor().submit(_run)
+    return future, False
+
+  def iter_commands(self, query: str) -> t.Iterator[t.Tuple[str, _Commands]]:
+    """
+    Query all plugins at the same time and yield a `(plugin_id, commands)` tuple for every
+    plugin as soon as it has responded. Unlike #get_commands(), this does not apply any
+    plugin budgets. Every batch is ranked on its own; use #rank() to merge them.
+    """
 
-  def get_commands(self, query: str) -> t.List[t.Tuple[str, Result]]:
-    commands: t.List[t.Tuple[str, Result]] = []
-    for plugin_id, plugin in self._plugins.items():
+    query = Query.coerce(query)
+    executor = self._get_executor()
+    futures = {
+      executor.submit(self._match, plugin_id, query): plugin_id
+      for plugin_id in self.route(query)}
+    try:
+      for future in concurrent.futures.as_completed(futures):
+        yield futures[future], self.rank(query, future.result())
+    finally:
+      for future in futures:
+        future.cancel()
+
+  def stream_commands(self, query: str, callback: _BatchCallback) -> PendingQuery:
+    """
+    Query all plugins at the same time without blocking the caller. The *callback* is
+    invoked with the plugin ID and the commands for every plugin as soon as it has
+    responded. Note that the *callback* is invoked from a worker thread. Every batch is
+    ranked on its own; use #rank() to merge them.
+
+    A plugin that is still busy with a previous query is reported with a #PENDING_ID
+    result right away (from the calling thread) and queried once it is done, unless a more
+    recent query for the plugin is waiting by then.
+
+    Use #PendingQuery.cancel() on the returned object when the results are no longer
+    needed (for example because the query was superseded).
+    """
+
+    query = Query.coerce(query)
+    pending = PendingQuery(query)
+
+    def _worker(plugin_id: str) -> None:
+      if pending.cancelled:
+        return
+      commands = self._match(plugin_id, query, pending)
+      if pending.cancelled:
+        return
       try:
-        for result in plugin.match_search_query(query):
-          commands.append((plugin_id, result))
-      except PluginMatchError as exc:
-        commands.append((plugin_id, Result('#error', 'Error', None, str(exc))))
+        commands = self.rank(query, commands)
       except:
-        log.exception('Unhandled error in Plugin.match_search_query: %s', plugin_id)
-    return commands
+        # Deliver the batch unranked rather than losing it.
+        log.exception('Unhandled error while ranking the results of: %s', plugin_id)
+      if pending.cancelled:
+        return
+      try:
+        with tracing.span('Toolship.stream_commands.callback', plugin=plugin_id):
+          callback(plugin_id, commands)
+      except:
+        log.exception('Unhandled error in Toolship.stream_commands() callback for: %s', plugin_id)
+
+    for plugin_id in self.route(query):
+      future, busy = self._submit_call(plugin_id, _worker, (plugin_id,), defer=True)
+      pending._futures.append(future)
+      if busy:
+        try:
+          callback(plugin_id, [self._pending(plugin_id)])
+        except:
+          log.exception('Unhandled error in Toolship.stream_commands() callback for: %s', plugin_id)
+    return pending
+
+
+class _StatsExportResult(Result, IsClipboardValueProducer):
+
+  __slots__ = ('_toolship',)
+
+  def __init__(self, toolship: Toolship) -> None:
+    super().__init__('#export', 'Copy statistics as JSON', 'Copy the plugin statistics to the clipboard.')
+    self._toolship = toolship
+
+  def get_value(self) -> str:
+    stats = self._toolship.get_stats()
+    stats.update(('#' + name, histogram.to_json()) for name, histogram in self._toolship.latencies.items())
+    return json.dumps(stats, indent=2)
+
+
+class _StatsPlugin(Plugin):
+  """
+  Displays the latency statistics of all plugins when the query is `#stats`.
+  """
+
+  cacheable = False
+
+  def __init__(self, toolship: Toolship) -> None:
+    self._toolship = toolship
+
+  def get_prefix(self) -> str:
+    return '#stats'
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List[Result]:
+    results: t.List[Result] = [_StatsExportResult(self._toolship)]
+    for plugin_id, stats in self._toolship.get_stats().items():
+      latency = stats['match_search_query']
+      results.append(Result(
+        plugin_id,
+        '{}: p50 {:.1f}ms, p95 {:.1f}ms, p99 {:.1f}ms'.format(
+          plugin_id, latency['p50'], latency['p95'], latency['p99']),
+        '{} calls, {} errors, {} over budget, {} skipped, breaker {}'.format(
+          stats['calls'], stats['errors'], stats['over_budget'], stats['skipped'], stats['breaker'])))
+    for name, histogram in list(self._toolship.latencies.items()):
+      latency = histogram.to_json()
+      results.append(Result(
+        '#' + name,
+        '{}: p50 {:.1f}ms, p95 {:.1f}ms, p99 {:.1f}ms'.format(
+          name, latency['p50'], latency['p95'], latency['p99']),
+        '{} samples, max {:.1f}ms'.format(latency['count'], latency['max'])))
+    return results
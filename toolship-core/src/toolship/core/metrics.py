@@ -0,0 +1,165 @@
+
+"""
+Latency metrics and a circuit breaker that the #Toolship uses to keep track of how its
+plugins perform and to temporarily skip plugins that are too slow.
+"""
+
+import enum
+import math
+import threading
+import time
+import typing as t
+
+
+class LatencyHistogram:
+  """
+  A histogram of latencies with logarithmically sized buckets. Percentiles are accurate to
+  within the bucket resolution (about 19%), which is plenty to tell a fast plugin from a slow
+  one while using a small, fixed amount of memory.
+  """
+
+  #: The upper bound of the first bucket in seconds.
+  MIN_LATENCY = 1e-6
+
+  #: The ratio between the upper bounds of two consecutive buckets.
+  FACTOR = 2 ** 0.25
+
+  def __init__(self) -> None:
+    self._buckets: t.Dict[int, int] = {}
+    self._lock = threading.Lock()
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def record(self, seconds: float) -> None:
+    if seconds <= self.MIN_LATENCY:
+      bucket = 0
+    else:
+      bucket = math.ceil(math.log(seconds / self.MIN_LATENCY, self.FACTOR))
+    with self._lock:
+      self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+      self.count += 1
+      self.total += seconds
+      self.max = max(self.max, seconds)
+
+  def percentile(self, p: float) -> float:
+    """
+    Returns the latency in seconds below which *p* percent of the recorded latencies fall.
+    """
+
+    with self._lock:
+      if not self.count:
+        return 0.0
+      rank = math.ceil(self.count * p / 100.0)
+      seen = 0
+      for bucket in sorted(self._buckets):
+        seen += self._buckets[bucket]
+        if seen >= rank:
+          return min(self.MIN_LATENCY * self.FACTOR ** bucket, self.max)
+      return self.max
+
+  @property
+  def mean(self) -> float:
+    return self.total / self.count if self.count else 0.0
+
+  def to_json(self) -> t.Dict[str, t.Any]:
+    """
+    Returns the number of samples and the mean, p50, p95, p99 and max latency in milliseconds.
+    """
+
+    return {
+      'count': self.count,
+      'mean': self.mean * 1000,
+      'p50': self.percentile(50) * 1000,
+      'p95': self.percentile(95) * 1000,
+      'p99': self.percentile(99) * 1000,
+      'max': self.max * 1000,
+    }
+
+
+class PluginStats:
+  """
+  Counters and latency histograms for a single plugin.
+  """
+
+  #: The plugin methods that latencies are recorded for.
+  OPERATIONS = ('match_search_query', 'on_load', 'on_unload')
+
+  def __init__(self) -> None:
+    #: The number of times the plugin was queried (not counting cache hits).
+    self.calls = 0
+    #: The number of queries that raised an exception.
+    self.errors = 0
+    #: The number of queries that took longer than the plugin's budget.
+    self.over_budget = 0
+    #: The number of queries that skipped the plugin because its circuit breaker was open.
+    self.skipped = 0
+    self.latencies = {op: LatencyHistogram() for op in self.OPERATIONS}
+
+  def to_json(self) -> t.Dict[str, t.Any]:
+    result: t.Dict[str, t.Any] = {
+      'calls': self.calls,
+      'errors': self.errors,
+      'over_budget': self.over_budget,
+      'skipped': self.skipped,
+    }
+    for op, histogram in self.latencies.items():
+      result[op] = histogram.to_json()
+    return result
+
+
+class BreakerState(enum.Enum):
+  CLOSED = 'closed'
+  OPEN = 'open'
+  HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+  """
+  Opens after a plugin exceeded its budget *threshold* times in a row. While open, the
+  plugin is skipped. After *cooldown* seconds, a single call is allowed to probe the plugin
+  again. If the probe is within budget the breaker closes, otherwise it opens again.
+  """
+
+  def __init__(self, threshold: int = 3, cooldown: float = 30.0,
+               clock: t.Callable[[], float] = time.monotonic) -> None:
+    self.threshold = threshold
+    self.cooldown = cooldown
+    self._clock = clock
+    self._lock = threading.Lock()
+    self._failures = 0
+    self._opened_at: t.Optional[float] = None
+    self._probing = False
+
+  @property
+  def state(self) -> BreakerState:
+    if self._opened_at is None:
+      return BreakerState.CLOSED
+    if self._probing or self._clock() - self._opened_at >= self.cooldown:
+      return BreakerState.HALF_OPEN
+    return BreakerState.OPEN
+
+  def allow(self) -> bool:
+    """
+    Returns #True if the plugin may be called. When the cooldown has expired, only the first
+    caller is allowed to probe the plugin until #record() is called.
+    """
+
+    with self._lock:
+      if self._opened_at is None:
+        return True
+      if self._probing or self._clock() - self._opened_at < self.cooldown:
+        return False
+      self._probing = True
+      return True
+
+  def record(self, within_budget: bool) -> None:
+    with self._lock:
+      self._probing = False
+      if within_budget:
+        self._failures = 0
+        self._opened_at = None
+      else:
+        self._failures += 1
+        if self._opened_at is not None or self._failures >= self.threshold:
+          self._opened_at = self._clock()
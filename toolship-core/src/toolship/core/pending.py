@@ -0,0 +1,70 @@
+
+"""
+The handle for a query whose results are delivered in batches (see
+#Toolship.stream_commands()). Lives in its own module so that clients of the daemon can
+use it without importing the #Toolship.
+"""
+
+import concurrent.futures
+import threading
+import typing as t
+
+
+class PendingQuery:
+  """
+  A handle for a query that was started with #Toolship.stream_commands() or
+  #RemoteToolship.stream_commands().
+  """
+
+  def __init__(self, query: str) -> None:
+    self.query = query
+    self._futures: t.List[concurrent.futures.Future] = []
+    self._cancelled = False
+
+  @property
+  def cancelled(self) -> bool:
+    return self._cancelled
+
+  def cancel(self) -> None:
+    """
+    Cancel the query. Plugins that have not started processing the query yet will not be
+    invoked and no further batches are passed to the callback. Plugins that are already
+    running can not be interrupted, but their results are discarded.
+    """
+
+    self._cancelled = True
+    for future in self._futures:
+      future.cancel()
+
+  def done(self) -> bool:
+    return all(future.done() for future in self._futures)
+
+  def add_done_callback(self, fn: t.Callable[['PendingQuery'], None]) -> None:
+    """
+    Call *fn* with the query once all plugins have responded or the query was cancelled.
+    If that is already the case, *fn* is called immediately. Otherwise it is called from
+    the worker thread of the plugin that responded last.
+    """
+
+    remaining = [len(self._futures)]
+    lock = threading.Lock()
+
+    def _done(_future: concurrent.futures.Future) -> None:
+      with lock:
+        remaining[0] -= 1
+        if remaining[0] != 0:
+          return
+      fn(self)
+
+    if not self._futures:
+      fn(self)
+    for future in self._futures:
+      future.add_done_callback(_done)
+
+  def wait(self, timeout: t.Optional[float] = None) -> bool:
+    """
+    Wait until all plugins have responded. Returns #False if the *timeout* expired.
+    """
+
+    _done, not_done = concurrent.futures.wait(self._futures, timeout)
+    return not not_done
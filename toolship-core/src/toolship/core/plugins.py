@@ -1,10 +1,15 @@
 
 import abc
 import argparse
-import dataclasses
+import functools
+import inspect
 import shlex
 import typing as t
 
+from .query import Query
+
+T = t.TypeVar('T')
+
 
 class PluginMatchError(Exception):
   ...
@@ -12,32 +17,168 @@ class PluginMatchError(Exception):
 
 class Plugin(abc.ABC):
 
+  #: Set to #False if the results of #match_search_query() may not be cached by the
+  #: #Toolship, e.g. because they change without the query changing.
+  cacheable: bool = True
+
+  #: Set to #True if the plugin implements #refine_results().
+  refinable: bool = False
+
+  #: The number of queries that the #Toolship may send to the plugin at the same time.
+  #: Plugins that allow more than one must be thread-safe.
+  max_concurrency: int = 1
+
   def on_load(self) -> None: pass
 
   def on_unload(self) -> None: pass
 
+  def get_prefix(self) -> t.Optional[str]:
+    """
+    Returns the first token that a query must have for the plugin to handle it, or #None if
+    the plugin handles every query. The #Toolship only calls #match_search_query() for the
+    queries that start with this prefix. The prefix must not change after the plugin was
+    added to the #Toolship.
+    """
+
+    return None
+
   @abc.abstractmethod
-  def match_search_query(self, query: str) -> t.List['Result']: ...
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List['Result']:
+    """
+    Return the results for the search *query*. If a *limit* is specified, only the best
+    *limit* results are displayed, so the plugin may stop after it has found that many.
+    When called by the #Toolship, the *query* is a #Query object that carries the tokens
+    of the query.
+
+    The *limit* parameter is optional for implementations, plugins that only accept the
+    *query* are called without it (see #call_with_limit()).
+    """
+
+  def get_ranking_query(self, query: str) -> str:
+    """
+    Returns the part of the *query* that the results of the plugin are ranked against. For
+    a plugin with a #get_prefix(), that is the query without the prefix.
+    """
+
+    prefix = self.get_prefix()
+    if prefix is None:
+      return query
+    query = Query.coerce(query)
+    return query.remainder if query.prefix == prefix else query
+
+  def refine_results(self, query: str, cached_query: str, results: t.List['Result']) -> t.Optional[t.List['Result']]:
+    """
+    Called instead of #match_search_query() if the plugin is #refinable and the #Toolship
+    has cached *results* for *cached_query*, which *query* starts with. The plugin may return
+    the results for *query* by filtering *results*, or #None if the results can not be
+    derived from *results* (in which case #match_search_query() is called instead).
+    """
+
+    return None
+
+
+def call_with_limit(method: t.Callable[..., T], arg: t.Any, limit: t.Optional[int]) -> T:
+  """
+  Calls #Plugin.match_search_query() or #ArgparsingPlugin.match_arguments() with the
+  *limit*, unless the *method* was implemented before the parameter was added and only
+  accepts the query or arguments.
+  """
+
+  func = getattr(method, '__func__', None)
+  if func is not None:
+    accepts = _accepts_limit(func, 2)  # The function also takes "self".
+  else:
+    accepts = _accepts_limit(method, 1)
+  return method(arg, limit) if accepts else method(arg)
+
+
+@functools.lru_cache(maxsize=None)
+def _accepts_limit(func: t.Callable[..., t.Any], num_args: int) -> bool:
+  try:
+    params = list(inspect.signature(func).parameters.values())
+  except (TypeError, ValueError):
+    return True
+  positional = [p for p in params if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+  return len(positional) > num_args or any(p.kind == p.VAR_POSITIONAL for p in params)
+
+
+_UNSET: t.Any = object()
 
 
-@dataclasses.dataclass
 class Result:
   """
   Represents a result returned from a #Plugin.
+
+  Results use `__slots__` to keep large result sets small. The #description is usually
+  only displayed for the selected result, so subclasses can implement #get_description()
+  instead of passing a description to the constructor; it is computed when it is first
+  accessed and then cached. Subclasses should declare `__slots__` as well.
+
+  Subclasses that do not call the constructor get a #None #error and #description, like
+  they did when #Result was a dataclass.
   """
 
-  id: str
-  name: str
-  description: t.Optional[str] = None
-  error: t.Optional[str] = None
+  __slots__ = ('id', 'name', '_error', '_description')
+
+  def __init__(
+    self,
+    id: str,
+    name: str,
+    description: t.Optional[str] = None,
+    error: t.Optional[str] = None,
+  ) -> None:
+    self.id = id
+    self.name = name
+    self.error = error
+    self._description = _UNSET if description is None else description
+
+  def __repr__(self) -> str:
+    return f'{type(self).__name__}(id={self.id!r}, name={self.name!r}, error={self.error!r})'
+
+  def __eq__(self, other: t.Any) -> bool:
+    if type(other) is not type(self):
+      return NotImplemented
+    # The description is left out so that comparing results does not compute it.
+    return (self.id, self.name, self.error) == (other.id, other.name, other.error)
+
+  __hash__ = None  # type: ignore
+
+  @property
+  def error(self) -> t.Optional[str]:
+    return getattr(self, '_error', None)
+
+  @error.setter
+  def error(self, error: t.Optional[str]) -> None:
+    self._error = error
+
+  @property
+  def description(self) -> t.Optional[str]:
+    description = getattr(self, '_description', _UNSET)
+    if description is _UNSET:
+      description = self._description = self.get_description()
+    return description
+
+  @description.setter
+  def description(self, description: t.Optional[str]) -> None:
+    self._description = _UNSET if description is None else description
+
+  def get_description(self) -> t.Optional[str]:
+    """
+    Returns the description of the result if none was passed to the constructor. Called at
+    most once, when the description is accessed for the first time.
+    """
+
+    return None
 
 
 class IsQuitCommand(abc.ABC):
-  pass
+  __slots__ = ()
 
 
 class QuitResult(Result, IsQuitCommand):
 
+  __slots__ = ()
+
   def __init__(self) -> None:
     super().__init__('#quit', 'Quit', 'Quit toolship.')
 
@@ -47,6 +188,8 @@ class IsRunnable(abc.ABC):
   Can be implemented by #Result#s to make them runnable when the result is selected.
   """
 
+  __slots__ = ()
+
   @abc.abstractmethod
   def run(self) -> None: ...
 
@@ -57,6 +200,8 @@ class IsClipboardValueProducer(abc.ABC):
   the result is selected.
   """
 
+  __slots__ = ()
+
   @abc.abstractmethod
   def get_value(self) -> str: ...
 
@@ -70,14 +215,27 @@ class ArgparsingPlugin(Plugin):
   def get_parser(self) -> argparse.ArgumentParser: ...
 
   @abc.abstractmethod
-  def match_arguments(self, args: argparse.Namespace) -> t.List['Result']: ...
+  def match_arguments(self, args: argparse.Namespace, limit: t.Optional[int] = None) -> t.List['Result']: ...
+
+  def refine_arguments(
+    self,
+    args: argparse.Namespace,
+    cached_args: argparse.Namespace,
+    results: t.List['Result'],
+  ) -> t.Optional[t.List['Result']]:
+    """
+    The #ArgparsingPlugin equivalent of #Plugin.refine_results(). Only called if both queries
+    are addressed to this plugin.
+    """
+
+    return None
 
   _parser: t.Optional[argparse.ArgumentParser] = None
 
-  def match_search_query(self, query: str) -> t.List['Result']:
-    args = shlex.split(query)
+  def _parse(self, query: str) -> t.Optional[argparse.Namespace]:
+    args = query.args if isinstance(query, Query) else shlex.split(query)
     if not args or args[0] != self.get_prefix():
-      return []
+      return None
 
     if self._parser is None:
       self._parser = self.get_parser()
@@ -86,4 +244,19 @@ class ArgparsingPlugin(Plugin):
     if unknowns:
       raise PluginMatchError('unknown arguments: ' + str(unknowns))
 
-    return self.match_arguments(args)
+    return args
+
+  def match_search_query(self, query: str, limit: t.Optional[int] = None) -> t.List['Result']:
+    args = self._parse(query)
+    if args is None:
+      return []
+    return call_with_limit(self.match_arguments, args, limit)
+
+  def refine_results(self, query: str, cached_query: str, results: t.List['Result']) -> t.Optional[t.List['Result']]:
+    try:
+      args, cached_args = self._parse(query), self._parse(cached_query)
+    except (ValueError, PluginMatchError):
+      return None
+    if args is None or cached_args is None:
+      return None
+    return self.refine_arguments(args, cached_args, results)
@@ -0,0 +1,222 @@
+
+"""
+The protocol between the toolship daemon (see #toolship.core.daemon) and its clients.
+
+Clients connect to a Unix domain socket. Every message is a JSON object, prefixed with
+its length in bytes as a 4-byte big endian integer. A client sends a request that has an
+`op` key and the daemon responds with exactly one message, except for the `stream`
+operation, for which the daemon sends a message per plugin and a final `{"done": true}`.
+Failed requests are answered with an `error` key.
+
+Results are encoded as JSON objects (see #encode_result()) and decoded into
+#RemoteResult#s on the client side.
+"""
+
+import getpass
+import json
+import math
+import os
+import socket
+import stat
+import struct
+import tempfile
+import typing as t
+
+from .plugins import IsClipboardValueProducer, IsQuitCommand, IsRunnable, Result
+
+#: The header of a message, the length of the message.
+HEADER = struct.Struct('>I')
+
+#: Messages larger than this are rejected.
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+#: A function that performs an action on a #RemoteResult and returns the value that the
+#: daemon responded with.
+_Perform = t.Callable[['RemoteResult', str], t.Optional[str]]
+
+
+class ProtocolError(Exception):
+  pass
+
+
+class DaemonError(Exception):
+  """
+  Raised on the client side when the daemon responds with an error.
+  """
+
+
+def default_socket_path() -> str:
+  """
+  Returns the path of the socket that the daemon listens on by default. Can be overridden
+  with the `TOOLSHIP_SOCKET` environment variable. The socket is placed in
+  `$XDG_RUNTIME_DIR`, or otherwise in a per-user directory in the temporary directory
+  that only the user can access (see #ensure_socket_directory()).
+  """
+
+  path = os.environ.get('TOOLSHIP_SOCKET')
+  if not path:
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+      path = os.path.join(runtime_dir, f'toolship-{getpass.getuser()}.sock')
+    else:
+      path = os.path.join(tempfile.gettempdir(), f'toolship-{getpass.getuser()}', 'toolship.sock')
+  return path
+
+
+def ensure_socket_directory(path: str) -> None:
+  """
+  Creates the directory of the socket at *path* with mode `0700` if it does not exist.
+  Raises a #RuntimeError if the directory is not owned by the current user or can be
+  written to by other users, because they could replace the socket.
+  """
+
+  directory = os.path.dirname(os.path.abspath(path))
+  os.makedirs(directory, mode=0o700, exist_ok=True)
+  st = os.lstat(directory)
+  if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+    raise RuntimeError(f'{directory} is not a directory owned by the current user')
+  if st.st_mode & 0o022:
+    raise RuntimeError(f'{directory} can be written to by other users')
+
+
+def send_message(sock: socket.socket, message: t.Dict[str, t.Any]) -> None:
+  data = json.dumps(message, separators=(',', ':')).encode('utf8')
+  if len(data) > MAX_MESSAGE_SIZE:
+    raise ProtocolError(f'message too large ({len(data)} bytes)')
+  sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> t.Optional[bytes]:
+  buffer = bytearray()
+  while len(buffer) < size:
+    chunk = sock.recv(size - len(buffer))
+    if not chunk:
+      if buffer:
+        raise ProtocolError('connection closed in the middle of a message')
+      return None
+    buffer += chunk
+  return bytes(buffer)
+
+
+def recv_message(sock: socket.socket) -> t.Optional[t.Dict[str, t.Any]]:
+  """
+  Receives a message from *sock*. Returns #None if the connection was closed.
+  """
+
+  header = _recv_exactly(sock, HEADER.size)
+  if header is None:
+    return None
+  size, = HEADER.unpack(header)
+  if size > MAX_MESSAGE_SIZE:
+    raise ProtocolError(f'message too large ({size} bytes)')
+  data = _recv_exactly(sock, size) if size else b''
+  if data is None:
+    raise ProtocolError('connection closed in the middle of a message')
+  message = json.loads(data.decode('utf8'))
+  if not isinstance(message, dict):
+    raise ProtocolError(f'expected a JSON object, got {type(message).__name__}')
+  return message
+
+
+def get_actions(result: Result) -> t.List[str]:
+  """
+  Returns the names of the actions that *result* supports: `quit`, `copy` and `run`.
+  """
+
+  actions = []
+  if isinstance(result, IsQuitCommand):
+    actions.append('quit')
+  if isinstance(result, IsClipboardValueProducer):
+    actions.append('copy')
+  if isinstance(result, IsRunnable):
+    actions.append('run')
+  return actions
+
+
+def encode_result(plugin_id: str, result: Result, score: t.Optional[float] = None) -> t.Dict[str, t.Any]:
+  data = {
+    'plugin': plugin_id,
+    'id': result.id,
+    'name': result.name,
+    'description': result.description,
+    'error': result.error,
+    'actions': get_actions(result),
+  }
+  if score is not None:
+    # JSON has no infinity, errors and pending results are sent without a score.
+    data['score'] = None if math.isinf(score) else score
+  return data
+
+
+class RemoteResult(Result):
+  """
+  A #Result that was received from the daemon. Actions are performed by the daemon.
+  """
+
+  __slots__ = ('plugin_id', 'actions', 'score', '_perform')
+
+  def __init__(
+    self,
+    plugin_id: str,
+    id: str,
+    name: str,
+    description: t.Optional[str],
+    error: t.Optional[str],
+    actions: t.List[str],
+    score: float,
+    perform: _Perform,
+  ) -> None:
+    super().__init__(id, name, description, error)
+    self.plugin_id = plugin_id
+    self.actions = actions
+    self.score = score
+    self._perform = perform
+
+  def perform(self, action: str) -> t.Optional[str]:
+    return self._perform(self, action)
+
+
+class _RemoteQuitCommand(RemoteResult, IsQuitCommand):
+  __slots__ = ()
+
+
+class _RemoteClipboardValueProducer(RemoteResult, IsClipboardValueProducer):
+  __slots__ = ()
+
+  def get_value(self) -> str:
+    return self.perform('copy') or ''
+
+
+class _RemoteRunnable(RemoteResult, IsRunnable):
+  __slots__ = ()
+
+  def run(self) -> None:
+    self.perform('run')
+
+
+def decode_result(data: t.Dict[str, t.Any], perform: _Perform) -> t.Tuple[str, RemoteResult]:
+  """
+  Decodes a result that was encoded with #encode_result(). If the result supports more
+  than one action, the first of `quit`, `copy` and `run` is used.
+  """
+
+  actions = data.get('actions') or []
+  if 'quit' in actions:
+    cls: t.Type[RemoteResult] = _RemoteQuitCommand
+  elif 'copy' in actions:
+    cls = _RemoteClipboardValueProducer
+  elif 'run' in actions:
+    cls = _RemoteRunnable
+  else:
+    cls = RemoteResult
+  score = data.get('score')
+  result = cls(
+    data['plugin'],
+    data['id'],
+    data['name'],
+    data.get('description'),
+    data.get('error'),
+    actions,
+    math.inf if score is None else score,
+    perform)
+  return data['plugin'], result
@@ -0,0 +1,120 @@
+
+"""
+The #Query is the search query that the #Toolship passes to its plugins. It is tokenized
+once and then shared by all plugins. The #PrefixTrie is used by the #Toolship to route a
+query only to the plugins whose prefix matches the first token of the query.
+"""
+
+import shlex
+import typing as t
+
+T = t.TypeVar('T')
+
+
+def split(query: str) -> t.List[str]:
+  """
+  Like #shlex.split(), but tolerates unclosed quotes at the end of the query, which are
+  common while the user is still typing.
+  """
+
+  try:
+    return shlex.split(query)
+  except ValueError:
+    pass
+  for quote in '"\'':
+    try:
+      return shlex.split(query + quote)
+    except ValueError:
+      pass
+  return query.split()
+
+
+class Query(str):
+  """
+  A search query. Since this is a subclass of #str, plugins can treat it as a plain string,
+  but the tokens of the query are computed only once, no matter how many plugins need them.
+  """
+
+  _args: t.Optional[t.List[str]] = None
+
+  @classmethod
+  def coerce(cls, query: str) -> 'Query':
+    """
+    Returns *query* if it is already a #Query, otherwise wraps it in a #Query.
+    """
+
+    return query if isinstance(query, cls) else cls(query)
+
+  @property
+  def args(self) -> t.List[str]:
+    """
+    The query split into tokens with shell-like syntax. The returned list must not be
+    modified as it is shared between plugins.
+    """
+
+    if self._args is None:
+      self._args = split(self)
+    return self._args
+
+  @property
+  def prefix(self) -> t.Optional[str]:
+    """
+    The first token of the query, or #None if the query is empty.
+    """
+
+    args = self.args
+    return args[0] if args else None
+
+  @property
+  def remainder(self) -> str:
+    """
+    The query text after the first token.
+    """
+
+    parts = self.split(None, 1)
+    return parts[1] if len(parts) > 1 else ''
+
+
+class _TrieNode(t.Generic[T]):
+
+  __slots__ = ('children', 'values')
+
+  def __init__(self) -> None:
+    self.children: t.Dict[str, '_TrieNode[T]'] = {}
+    self.values: t.List[T] = []
+
+
+class PrefixTrie(t.Generic[T]):
+  """
+  Maps string keys to a list of values.
+  """
+
+  def __init__(self) -> None:
+    self._root: _TrieNode[T] = _TrieNode()
+
+  def _find(self, key: str) -> t.Optional[_TrieNode[T]]:
+    node = self._root
+    for char in key:
+      node = node.children.get(char)
+      if node is None:
+        return None
+    return node
+
+  def add(self, key: str, value: T) -> None:
+    node = self._root
+    for char in key:
+      node = node.children.setdefault(char, _TrieNode())
+    node.values.append(value)
+
+  def remove(self, key: str, value: T) -> None:
+    node = self._find(key)
+    if node is not None and value in node.values:
+      node.values.remove(value)
+
+  def get(self, key: str) -> t.List[T]:
+    """
+    Returns the values for exactly the given *key*.
+    """
+
+    node = self._find(key)
+    return list(node.values) if node is not None else []
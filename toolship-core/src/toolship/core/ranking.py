@@ -0,0 +1,85 @@
+
+"""
+Fuzzy scoring of #Result#s against a search query and a bounded top-k merge that the
+#Toolship uses to rank the results of all plugins together.
+"""
+
+import heapq
+import typing as t
+
+from .plugins import Result
+
+T = t.TypeVar('T')
+
+#: Characters after which a match is considered to be at the start of a word.
+WORD_SEPARATORS = frozenset(' -_./\\:@')
+
+
+def _is_word_start(text: str, idx: int) -> bool:
+  return idx == 0 or text[idx - 1] in WORD_SEPARATORS or (text[idx].isupper() and text[idx - 1].islower())
+
+
+def fuzzy_score(query: str, text: t.Optional[str]) -> float:
+  """
+  Computes a score between `0.0` and `1.0` that describes how well *query* matches *text*,
+  ignoring case. A score of `0.0` means that the characters of *query* do not appear in
+  *text* in order. Substring matches always score higher than scattered matches, and matches
+  at the start of the text or of a word score higher than matches in the middle of a word.
+  An empty query matches every text with a score of `0.0`.
+  """
+
+  if not query or not text:
+    return 0.0
+
+  lquery = query.lower()
+  ltext = text.lower()
+  if len(ltext) != len(text):
+    # Lower-casing changed the length (e.g. 'İ'), so the indices into *ltext* do not apply
+    # to *text*. Find word starts in *ltext* instead, which loses camel case boundaries.
+    text = ltext
+
+  idx = ltext.find(lquery)
+  if idx >= 0:
+    score = 0.6 + 0.2 * (len(lquery) / len(ltext))
+    if _is_word_start(text, idx):
+      score += 0.2
+    return score
+
+  # Fall back to matching the query as a subsequence of the text. Consecutive characters
+  # and characters at the start of a word increase the score.
+  bonus = 0
+  pos = -1
+  for char in lquery:
+    next_pos = ltext.find(char, pos + 1)
+    if next_pos < 0:
+      return 0.0
+    if next_pos == pos + 1:
+      bonus += 1
+    if _is_word_start(text, next_pos):
+      bonus += 1
+    pos = next_pos
+
+  return 0.1 + 0.4 * (bonus / (2 * len(lquery)))
+
+
+def score_result(query: str, result: Result) -> float:
+  """
+  Scores a #Result against *query* by its name. The description is not taken into account,
+  as it may be expensive to compute (see #Result.get_description()).
+  """
+
+  return fuzzy_score(query, result.name)
+
+
+def top_k(scored: t.Iterable[t.Tuple[float, T]], k: t.Optional[int]) -> t.List[T]:
+  """
+  Returns the *k* items with the highest score from the `(score, item)` pairs in *scored*,
+  best first. Items with the same score retain their relative order. Uses a heap bounded by
+  *k* so that the full input never has to be sorted. If *k* is #None, all items are returned.
+  """
+
+  if k is None:
+    ranked = sorted(scored, key=lambda x: x[0], reverse=True)
+  else:
+    ranked = heapq.nlargest(k, scored, key=lambda x: x[0])
+  return [item for _score, item in ranked]
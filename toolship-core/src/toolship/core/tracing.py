@@ -0,0 +1,165 @@
+
+"""
+Opt-in tracing of where time is spent, e.g. between a key press and the repaint of the
+results. Spans are recorded with the ID of the thread they ran on and can be written to
+a file in the Chrome trace event format, which can be opened in `chrome://tracing` or
+https://ui.perfetto.dev.
+
+Tracing is disabled by default and then costs next to nothing. It is enabled with
+#enable() or by setting the `TOOLSHIP_TRACE` environment variable to the path of the file
+that the trace is written to when the process exits.
+
+Example:
+
+```python
+from toolship.core import tracing
+
+with tracing.span('Toolship.get_commands', query=query):
+  ...
+```
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import typing as t
+
+_enabled = False
+_path: t.Optional[str] = None
+_events: t.List[t.Dict[str, t.Any]] = []
+_thread_names: t.Dict[int, str] = {}
+_epoch = time.perf_counter()
+
+#: The maximum number of events that are kept. Further events are dropped.
+MAX_EVENTS = 1000000
+
+
+class _NullSpan:
+
+  __slots__ = ()
+
+  def __enter__(self) -> '_NullSpan':
+    return self
+
+  def __exit__(self, *exc_info: t.Any) -> None:
+    pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _timestamp(seconds: float) -> float:
+  return (seconds - _epoch) * 1e6
+
+
+def _record(event: t.Dict[str, t.Any]) -> None:
+  if len(_events) >= MAX_EVENTS:
+    return
+  tid = threading.get_ident()
+  if tid not in _thread_names:
+    _thread_names[tid] = threading.current_thread().name
+  event['pid'] = os.getpid()
+  event['tid'] = tid
+  _events.append(event)
+
+
+class _Span:
+
+  __slots__ = ('name', 'args', 'started')
+
+  def __init__(self, name: str, args: t.Dict[str, t.Any]) -> None:
+    self.name = name
+    self.args = args
+    self.started = 0.0
+
+  def __enter__(self) -> '_Span':
+    self.started = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc_info: t.Any) -> None:
+    ended = time.perf_counter()
+    _record({'name': self.name, 'ph': 'X', 'ts': _timestamp(self.started),
+      'dur': (ended - self.started) * 1e6, 'args': self.args})
+
+
+def is_enabled() -> bool:
+  return _enabled
+
+
+def span(name: str, **args: t.Any) -> t.ContextManager[t.Any]:
+  """
+  Returns a context manager that records the time spent in it as a span. Spans that are
+  entered while another span is active on the same thread are nested in it.
+  """
+
+  if not _enabled:
+    return _NULL_SPAN
+  return _Span(name, args)
+
+
+def instant(name: str, **args: t.Any) -> None:
+  """
+  Records an event that has no duration.
+  """
+
+  if _enabled:
+    _record({'name': name, 'ph': 'i', 's': 't', 'ts': _timestamp(time.perf_counter()), 'args': args})
+
+
+def begin(name: str, id: t.Any, **args: t.Any) -> None:
+  """
+  Begins a span that may end on a different thread than it began, see #end(). Spans with
+  the same *name* are told apart by their *id*.
+  """
+
+  if _enabled:
+    _record({'name': name, 'cat': 'toolship', 'ph': 'b', 'id': str(id),
+      'ts': _timestamp(time.perf_counter()), 'args': args})
+
+
+def end(name: str, id: t.Any, **args: t.Any) -> None:
+  if _enabled:
+    _record({'name': name, 'cat': 'toolship', 'ph': 'e', 'id': str(id),
+      'ts': _timestamp(time.perf_counter()), 'args': args})
+
+
+def enable(path: t.Optional[str] = None) -> None:
+  """
+  Start recording. If a *path* is specified, the trace is written to it when the process
+  exits.
+  """
+
+  global _enabled, _path
+  if path and _path is None:
+    atexit.register(lambda: _path and dump(_path))
+  if path:
+    _path = path
+  _enabled = True
+
+
+def disable() -> None:
+  global _enabled
+  _enabled = False
+
+
+def clear() -> None:
+  del _events[:]
+
+
+def dump(path: str) -> None:
+  """
+  Write the events that were recorded so far to *path* in the Chrome trace event format.
+  """
+
+  pid = os.getpid()
+  metadata = [
+    {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+    for tid, name in list(_thread_names.items())]
+  with open(path, 'w') as fp:
+    json.dump({'traceEvents': metadata + list(_events), 'displayTimeUnit': 'ms'}, fp, default=str)
+
+
+if os.environ.get('TOOLSHIP_TRACE'):
+  enable(os.environ['TOOLSHIP_TRACE'])
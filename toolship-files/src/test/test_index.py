@@ -0,0 +1,106 @@
+
+import os
+import struct
+import threading
+
+import pytest
+
+from toolship.files import index as index_module
+from toolship.files.index import HEADER, MAGIC, FileIndex, build_index, scan
+
+PATHS = [
+  os.path.join('home', 'me', 'src', 'toolship', 'plugin.py'),
+  os.path.join('home', 'me', 'src', 'toolship', 'README.md'),
+  os.path.join('home', 'me', 'Documents', 'Plugin Notes.txt'),
+  os.path.join('home', 'me', 'plugin'),
+  os.path.join('home', 'me', 'a.py'),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+  path = str(tmp_path / 'files.idx')
+  build_index(path, PATHS)
+  return FileIndex(path)
+
+
+def test_header(tmp_path):
+  path = str(tmp_path / 'files.idx')
+  build_index(path, PATHS)
+  with open(path, 'rb') as fp:
+    magic, version, num_paths, _num_trigrams, *offsets = HEADER.unpack(fp.read(HEADER.size))
+  assert magic == MAGIC
+  assert version == index_module.VERSION
+  assert num_paths == len(PATHS)
+  assert offsets == sorted(offsets)
+  assert all(offset % 8 == 0 for offset in offsets)
+
+
+def test_paths_are_sorted_by_length(index):
+  paths = [index.get_path(idx) for idx in range(len(index))]
+  assert sorted(paths) == sorted(PATHS)
+  assert [len(path) for path in paths] == sorted(len(path) for path in PATHS)
+
+
+def test_search(index):
+  assert index.search(['plugin']) == [
+    os.path.join('home', 'me', 'plugin'),
+    os.path.join('home', 'me', 'src', 'toolship', 'plugin.py'),
+    os.path.join('home', 'me', 'Documents', 'Plugin Notes.txt'),
+  ]
+  assert index.search(['toolship', 'READ']) == [os.path.join('home', 'me', 'src', 'toolship', 'README.md')]
+  assert index.search(['toolship', 'missing']) == []
+  assert index.search(['zzz']) == []
+  assert index.search(['']) == []
+
+
+def test_search_prefers_matches_in_the_file_name(index):
+  # "me" occurs in every directory, but only in the file name of README.md.
+  assert index.search(['me'], limit=1) == [os.path.join('home', 'me', 'src', 'toolship', 'README.md')]
+
+
+def test_search_limit(index):
+  assert index.search(['plugin'], limit=2) == [
+    os.path.join('home', 'me', 'plugin'),
+    os.path.join('home', 'me', 'src', 'toolship', 'plugin.py'),
+  ]
+
+
+def test_search_short_terms(index, monkeypatch):
+  expected = [os.path.join('home', 'me', 'a.py'), os.path.join('home', 'me', 'src', 'toolship', 'plugin.py')]
+  assert index.search(['py']) == expected
+  # Chunks smaller than a path must still find every match.
+  monkeypatch.setattr(index_module, '_SCAN_CHUNK_SIZE', 4)
+  assert index.search(['py']) == expected
+  assert index.search(['.P']) == expected
+
+
+def test_invalid_file(tmp_path):
+  path = str(tmp_path / 'files.idx')
+  with open(path, 'wb') as fp:
+    fp.write(struct.pack('=4sI', b'XXXX', index_module.VERSION).ljust(HEADER.size, b'\0'))
+  with pytest.raises(ValueError):
+    FileIndex(path)
+
+
+def test_scan(tmp_path):
+  (tmp_path / 'src').mkdir()
+  (tmp_path / 'src' / 'plugin.py').write_text('')
+  (tmp_path / '.git').mkdir()
+  (tmp_path / 'node_modules').mkdir()
+  root = str(tmp_path)
+
+  paths, state, changed = scan([root], {})
+  assert changed
+  assert sorted(paths) == [root, os.path.join(root, 'src'), os.path.join(root, 'src', 'plugin.py')]
+
+  paths_again, state_again, changed = scan([root], state)
+  assert not changed
+  assert paths_again == paths and state_again == state
+
+
+def test_scan_stop(tmp_path):
+  stop = threading.Event()
+  stop.set()
+  paths, _state, _changed = scan([str(tmp_path)], {}, stop=stop)
+  assert paths == []
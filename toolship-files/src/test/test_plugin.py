@@ -0,0 +1,40 @@
+
+from toolship.core.manager import Toolship
+from toolship.files.plugin import FilesPlugin
+
+
+def test_pending_results_are_not_cached(tmp_path):
+  (tmp_path / 'root').mkdir()
+  (tmp_path / 'root' / 'notes.txt').write_text('')
+  plugin = FilesPlugin([str(tmp_path / 'root')], str(tmp_path / 'cache'))
+  ship = Toolship()
+  ship.add_plugin('files', plugin)
+  assert [result.id for _plugin_id, result in ship.get_commands('f notes')] == [Toolship.PENDING_ID]
+  plugin.rescan()
+  assert [result.name for _plugin_id, result in ship.get_commands('f notes')] == ['notes.txt']
+  assert sorted(path.name for path in (tmp_path / 'cache').iterdir()) == ['files.1.idx', 'files.state.json']
+
+
+def test_extended_queries_are_refined(tmp_path, monkeypatch):
+  root = tmp_path / 'root'
+  for name in ('notes.txt', 'notes.md', 'todo.txt'):
+    (root / 'docs').mkdir(parents=True, exist_ok=True)
+    (root / 'docs' / name).write_text('')
+  plugin = FilesPlugin([str(root)], str(tmp_path / 'cache'))
+  plugin.rescan()
+  ship = Toolship()
+  ship.add_plugin('files', plugin)
+
+  def _names(query):
+    return sorted(result.name for _plugin_id, result in ship.get_commands(query))
+
+  assert _names('f note') == ['notes.md', 'notes.txt']
+  searches = []
+  monkeypatch.setattr(plugin._index, 'search', lambda *args: searches.append(args) or [])
+  assert _names('f notes.t') == ['notes.txt']
+  assert _names('f notes.t DOCS') == ['notes.txt']
+  assert searches == []
+  # Neither can be derived from the cached results.
+  ship.get_commands('f -c notes.txt')
+  ship.get_commands('f otes')
+  assert len(searches) == 2
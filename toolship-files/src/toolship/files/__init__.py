@@ -0,0 +1,18 @@
+
+__author__ = 'Niklas Rosenstein <rosensteinniklas@gmail.com>'
+__version__ = '0.0.0'
+
+import typing as t
+
+from toolship.core.discovery import PluginSpec
+
+#: The spec for the `toolship.plugins` entry point. The plugin is only imported from
+#: #toolship.files.plugin when it is needed.
+spec = PluginSpec('files', 'toolship.files.plugin:FilesPlugin', prefix='f')
+
+
+def __getattr__(name: str) -> t.Any:
+  if name in ('FilesPlugin', 'OpenFileCommand', 'CopyPathCommand'):
+    from . import plugin
+    return getattr(plugin, name)
+  raise AttributeError(name)
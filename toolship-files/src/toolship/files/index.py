@@ -0,0 +1,313 @@
+
+"""
+A trigram index of file paths that is stored in a file and memory-mapped for queries, so
+that the index does not need to be loaded into memory.
+
+The index file consists of a header and the following sections, in which integers are
+stored in native byte order (the index is a local cache and never leaves the machine):
+
+* `path_offsets` (`uint64[num_paths + 1]`): The offset of every path in `path_data`.
+* `path_data`: The paths, encoded with #os.fsencode(), from the shortest to the longest.
+* `trigrams` (`uint32[num_trigrams]`): Every trigram that occurs in the lower-cased
+  paths, as a sorted array of 24-bit integers.
+* `posting_offsets` (`uint32[num_trigrams + 1]`): The offset of the posting list of every
+  trigram in `postings`.
+* `postings` (`uint32[]`): The sorted indices of the paths that contain each trigram.
+
+A substring query is answered by intersecting the posting lists of the trigrams of the
+query and checking the candidates against the path itself. Matching ignores the case of
+ASCII characters only. Because the paths are ordered by length, the candidates are visited
+in the order they are ranked in, and the search can stop when it found enough results.
+
+The index is rebuilt from a scan of the file system (see #scan()). Directories whose
+modification time did not change since the previous scan are not listed again, and the
+index is only rebuilt if a directory changed.
+"""
+
+import array
+import bisect
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import typing as t
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'TSFI'
+VERSION = 1
+HEADER = struct.Struct('=4sIIIQQQQQ')
+_SEP = os.fsencode(os.sep)
+
+#: The number of bytes of path data that are lower-cased at once when searching for a term
+#: that is too short to have a trigram.
+_SCAN_CHUNK_SIZE = 1 << 20
+
+#: Directory names that are never scanned.
+DEFAULT_EXCLUDES = frozenset(['.git', '.hg', '.svn', '__pycache__', 'node_modules', '.tox', '.mypy_cache'])
+
+DirState = t.Dict[str, t.Tuple[int, t.List[str], t.List[str]]]  # (mtime_ns, files, subdirs)
+
+
+def _trigrams(data: bytes) -> t.Set[int]:
+  return {int.from_bytes(data[i:i + 3], 'big') for i in range(len(data) - 2)}
+
+
+def _align(fp: t.BinaryIO) -> None:
+  padding = -fp.tell() % 8
+  fp.write(b'\0' * padding)
+
+
+def build_index(path: str, paths: t.Sequence[str]) -> None:
+  """
+  Writes the index of *paths* to the file at *path*. The file is replaced atomically, so
+  that a reader never sees a partially written index. Note that a file that is opened as
+  a #FileIndex can not be replaced on Windows, write to a new *path* instead.
+  """
+
+  encoded = sorted((os.fsencode(p) for p in paths), key=lambda data: (len(data), data))
+  postings: t.Dict[int, t.List[int]] = {}
+  for idx, data in enumerate(encoded):
+    for trigram in _trigrams(data.lower()):
+      postings.setdefault(trigram, []).append(idx)
+
+  path_offsets = array.array('Q', [0])
+  for data in encoded:
+    path_offsets.append(path_offsets[-1] + len(data))
+  trigrams = array.array('I', sorted(postings))
+  posting_offsets = array.array('I', [0])
+  posting_data = array.array('I')
+  for trigram in trigrams:
+    posting_data.extend(postings[trigram])
+    posting_offsets.append(len(posting_data))
+
+  tmp = path + '.tmp'
+  os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+  with open(tmp, 'wb') as fp:
+    fp.write(b'\0' * HEADER.size)
+    offsets = []
+    for section in (path_offsets, b''.join(encoded), trigrams, posting_offsets, posting_data):
+      _align(fp)
+      offsets.append(fp.tell())
+      fp.write(section)
+    fp.seek(0)
+    fp.write(HEADER.pack(MAGIC, VERSION, len(encoded), len(trigrams), *offsets))
+  os.replace(tmp, path)
+
+
+class FileIndex:
+  """
+  A read-only, memory-mapped view of an index file written by #build_index(). Can be used
+  from multiple threads. The file is unmapped when the object is garbage collected.
+  """
+
+  def __init__(self, path: str) -> None:
+    self.path = path
+    with open(path, 'rb') as fp:
+      self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, num_paths, num_trigrams, *offsets = HEADER.unpack_from(self._mmap)
+    if magic != MAGIC or version != VERSION:
+      raise ValueError(f'{path} is not a toolship-files index (version {VERSION})')
+    view = memoryview(self._mmap)
+    self._path_offsets = view[offsets[0]:offsets[0] + 8 * (num_paths + 1)].cast('Q')
+    self._path_data = view[offsets[1]:offsets[2]]
+    self._trigrams = view[offsets[2]:offsets[2] + 4 * num_trigrams].cast('I')
+    self._posting_offsets = view[offsets[3]:offsets[3] + 4 * (num_trigrams + 1)].cast('I')
+    self._postings = view[offsets[4]:].cast('I')
+
+  def __len__(self) -> int:
+    return len(self._path_offsets) - 1
+
+  def _data(self, idx: int) -> bytes:
+    return self._path_data[self._path_offsets[idx]:self._path_offsets[idx + 1]].tobytes()
+
+  def get_path(self, idx: int) -> str:
+    return os.fsdecode(self._data(idx))
+
+  def _posting_list(self, trigram: int) -> t.Optional[memoryview]:
+    pos = bisect.bisect_left(self._trigrams, trigram)
+    if pos == len(self._trigrams) or self._trigrams[pos] != trigram:
+      return None
+    return self._postings[self._posting_offsets[pos]:self._posting_offsets[pos + 1]]
+
+  def _candidates(self, needles: t.List[bytes]) -> t.Iterable[int]:
+    trigrams: t.Set[int] = set()
+    for needle in needles:
+      trigrams |= _trigrams(needle)
+    if not trigrams:
+      return self._scan(needles[0])
+
+    lists = []
+    for trigram in trigrams:
+      postings = self._posting_list(trigram)
+      if postings is None:
+        return ()
+      lists.append(postings)
+    lists.sort(key=len)
+
+    # Walk the shortest list and look the candidates up in the others, so that nothing is
+    # copied out of the index and the search can stop early.
+    others = [_PostingList(postings) for postings in lists[1:]]
+    return (idx for idx in lists[0] if all(idx in other for other in others))
+
+  def _scan(self, needle: bytes) -> t.Iterator[int]:
+    # Finds the paths that contain a needle that is too short to have a trigram. The paths
+    # are lower-cased and searched a chunk at a time, and chunks end at a path boundary.
+    offsets = self._path_offsets
+    num_paths = len(self)
+    idx = 0
+    while idx < num_paths:
+      start = offsets[idx]
+      end = bisect.bisect_right(offsets, start + _SCAN_CHUNK_SIZE, idx + 1, num_paths + 1) - 1
+      end = max(end, idx + 1)
+      data = self._path_data[start:offsets[end]].tobytes().lower()
+      pos = data.find(needle)
+      while pos >= 0:
+        match = bisect.bisect_right(offsets, start + pos, idx, end + 1) - 1
+        yield match
+        pos = data.find(needle, offsets[match + 1] - start)
+      idx = end
+
+  def search(self, terms: t.Sequence[str], limit: t.Optional[int] = None) -> t.List[str]:
+    """
+    Returns the paths that contain all *terms*. Paths in which the last term occurs in the
+    file name are returned first, and shorter paths before longer paths. If all terms are
+    shorter than three characters, the index can not be used and all paths are searched.
+    """
+
+    needles = [os.fsencode(term).lower() for term in terms if term]
+    if not needles:
+      return []
+    matches = []
+    named = 0
+    for idx in self._candidates(needles):
+      data = self._data(idx).lower()
+      if all(needle in data for needle in needles):
+        in_name = needles[-1] in data[data.rfind(_SEP) + 1:]
+        matches.append((not in_name, len(data), idx))
+        named += in_name
+        if limit is not None and named >= limit:
+          # The remaining candidates are longer and thus ranked lower.
+          break
+    if limit is None:
+      matches.sort()
+    else:
+      matches = heapq.nsmallest(limit, matches)
+    return [self.get_path(idx) for _, _, idx in matches]
+
+
+def filter_paths(paths: t.Sequence[str], terms: t.Sequence[str]) -> t.List[str]:
+  """
+  Returns the *paths* that contain all *terms*, in the order that #FileIndex.search() would
+  return them if *paths* are in that order already. Narrows down the results of a search
+  for a query that *terms* extend.
+  """
+
+  needles = [os.fsencode(term).lower() for term in terms if term]
+  if not needles:
+    return []
+  matches = []
+  for path in paths:
+    data = os.fsencode(path).lower()
+    if all(needle in data for needle in needles):
+      matches.append((needles[-1] not in data[data.rfind(_SEP) + 1:], len(data), path))
+  matches.sort(key=lambda match: match[:2])
+  return [path for _, _, path in matches]
+
+
+class _PostingList:
+  # Binary searches a posting list. Must be queried with increasing indices, every search
+  # starts where the previous one ended.
+
+  __slots__ = ('postings', '_lo')
+
+  def __init__(self, postings: memoryview) -> None:
+    self.postings = postings
+    self._lo = 0
+
+  def __contains__(self, idx: int) -> bool:
+    pos = self._lo = bisect.bisect_left(self.postings, idx, self._lo)
+    return pos < len(self.postings) and self.postings[pos] == idx
+
+
+def load_state(state_path: str) -> DirState:
+  """
+  Loads the directory contents that #scan() returned and #save_state() saved.
+  """
+
+  try:
+    with open(state_path, encoding='utf8') as fp:
+      return {key: tuple(value) for key, value in json.load(fp).items()}  # type: ignore
+  except FileNotFoundError:
+    return {}
+  except (OSError, ValueError) as exc:
+    log.warning('Unable to read %s, scanning all directories: %s', state_path, exc)
+    return {}
+
+
+def save_state(state_path: str, state: DirState) -> None:
+  tmp = state_path + '.tmp'
+  os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+  with open(tmp, 'w', encoding='utf8') as fp:
+    json.dump(state, fp, separators=(',', ':'))
+  os.replace(tmp, state_path)
+
+
+def scan(
+  roots: t.Sequence[str],
+  previous: DirState,
+  excludes: t.AbstractSet[str] = DEFAULT_EXCLUDES,
+  include_hidden: bool = False,
+  stop: t.Optional[threading.Event] = None,
+) -> t.Tuple[t.List[str], DirState, bool]:
+  """
+  Scans the directories *roots* for files and directories. Returns the paths of all files
+  and directories, the contents of every directory along with its modification time, and
+  whether anything changed compared to the *previous* contents. Directories that were not
+  modified since the *previous* scan are not listed again.
+
+  If the *stop* event is set, the scan ends early and the result is incomplete.
+  """
+
+  state: DirState = {}
+  changed = False
+  paths: t.List[str] = []
+  stack = [os.path.abspath(root) for root in reversed(roots)]
+
+  while stack and not (stop is not None and stop.is_set()):
+    directory = stack.pop()
+    try:
+      mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+      continue
+    entry = previous.get(directory)
+    if entry is None or entry[0] != mtime:
+      changed = True
+      files: t.List[str] = []
+      subdirs: t.List[str] = []
+      try:
+        with os.scandir(directory) as it:
+          for item in it:
+            if not include_hidden and item.name.startswith('.'):
+              continue
+            try:
+              is_dir = item.is_dir(follow_symlinks=False)
+            except OSError:
+              continue
+            if is_dir:
+              if item.name not in excludes:
+                subdirs.append(item.name)
+            else:
+              files.append(item.name)
+      except OSError as exc:
+        log.debug('Unable to list %s: %s', directory, exc)
+      entry = (mtime, sorted(files), sorted(subdirs))
+    state[directory] = entry
+    paths.append(directory)
+    paths.extend(os.path.join(directory, name) for name in entry[1])
+    stack.extend(os.path.join(directory, name) for name in reversed(entry[2]))
+
+  return paths, state, changed or state.keys() != previous.keys()
@@ -0,0 +1,218 @@
+
+import argparse
+import glob
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import typing as t
+
+from toolship.core.plugins import ArgparsingPlugin, IsClipboardValueProducer, IsRunnable, Result
+from .index import FileIndex, build_index, filter_paths, load_state, save_state, scan
+
+log = logging.getLogger(__name__)
+
+
+def _default_roots() -> t.List[str]:
+  roots = os.environ.get('TOOLSHIP_FILES_ROOTS')
+  if roots:
+    return [os.path.expanduser(root) for root in roots.split(os.pathsep) if root]
+  return [os.path.expanduser('~')]
+
+
+def _default_cache_dir() -> str:
+  cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+  return os.path.join(cache_home, 'toolship')
+
+
+class FilesPlugin(ArgparsingPlugin):
+  """
+  Locates files and directories by substring, e.g. `f plugin.py` or `f core manager`. The
+  paths are looked up in a memory-mapped trigram index (see #toolship.files.index) that is
+  rebuilt in the background every #rescan_interval seconds while the plugin is loaded.
+
+  The directories that are indexed are read from the `TOOLSHIP_FILES_ROOTS` environment
+  variable (separated by #os.pathsep) and default to the home directory.
+
+  Every rebuild writes the index to a new file (`files.<generation>.idx`) instead of
+  replacing the file that is currently memory-mapped, which Windows does not allow. Index
+  files of previous generations are removed once they can be.
+
+  While typing, the results for an extended query are filtered from the cached results of
+  the query before it (see #refine_arguments()).
+  """
+
+  refinable = True
+
+  #: The number of seconds between two scans of the file system.
+  rescan_interval = 300.0
+
+  def __init__(self, roots: t.Optional[t.List[str]] = None, cache_dir: t.Optional[str] = None) -> None:
+    self.roots = roots or _default_roots()
+    self.cache_dir = cache_dir or _default_cache_dir()
+    self.state_path = os.path.join(self.cache_dir, 'files.state.json')
+    self._index: t.Optional[FileIndex] = None
+    self._scanner: t.Optional[threading.Thread] = None
+    self._stopped = threading.Event()
+    self._error: t.Optional[str] = None
+
+  def on_load(self) -> None:
+    if self._index is None:
+      generations = self._generations()
+      if generations:
+        self._open_index(self._index_path(generations[-1]))
+    if self._scanner is None:
+      self._stopped.clear()
+      self._scanner = threading.Thread(target=self._scan_periodically, name='toolship.files', daemon=True)
+      self._scanner.start()
+
+  def on_unload(self) -> None:
+    if self._scanner is not None:
+      self._stopped.set()
+      self._scanner.join()
+      self._scanner = None
+    self._index = None
+
+  def _index_path(self, generation: int) -> str:
+    return os.path.join(self.cache_dir, f'files.{generation}.idx')
+
+  def _generations(self) -> t.List[int]:
+    # Returns the generations of the index files in the cache directory, oldest first.
+    generations = []
+    for path in glob.glob(os.path.join(glob.escape(self.cache_dir), 'files.*.idx')):
+      generation = os.path.basename(path)[len('files.'):-len('.idx')]
+      if generation.isdigit():
+        generations.append(int(generation))
+    return sorted(generations)
+
+  def _open_index(self, path: str) -> bool:
+    try:
+      self._index = FileIndex(path)
+    except (OSError, ValueError) as exc:
+      log.warning('Unable to open %s: %s', path, exc)
+      return False
+    return True
+
+  def _remove_old_indexes(self, current: int) -> None:
+    for generation in self._generations():
+      if generation != current:
+        try:
+          os.remove(self._index_path(generation))
+        except OSError as exc:
+          # On Windows, the file can not be removed while it is still mapped by a query.
+          log.debug('Unable to remove index of generation %d: %s', generation, exc)
+
+  def _scan_periodically(self) -> None:
+    while not self._stopped.is_set():
+      try:
+        self.rescan()
+      except Exception as exc:
+        log.exception('Unable to index files')
+        self._error = str(exc)
+      self._stopped.wait(self.rescan_interval)
+
+  def rescan(self) -> None:
+    """
+    Scans the file system and rebuilds the index if anything changed. Only the directories
+    that were modified since the previous scan are listed.
+    """
+
+    started = time.perf_counter()
+    paths, state, changed = scan(self.roots, load_state(self.state_path), stop=self._stopped)
+    scanned = time.perf_counter()
+    if self._stopped.is_set():
+      return  # The plugin is being unloaded, the scan is incomplete.
+    if not changed and self._index is not None:
+      log.debug('Scanned %d paths in %.1fms, nothing changed', len(paths), (scanned - started) * 1000)
+      self._error = None
+      return
+    generation = max(self._generations(), default=0) + 1
+    build_index(self._index_path(generation), paths)
+    save_state(self.state_path, state)
+    if self._open_index(self._index_path(generation)):
+      self._remove_old_indexes(generation)
+    self._error = None
+    log.info('Indexed %d paths in %.1fms (scan: %.1fms)', len(paths),
+      (time.perf_counter() - started) * 1000, (scanned - started) * 1000)
+
+  def get_prefix(self) -> str:
+    return 'f'
+
+  def get_parser(self) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--copy', action='store_true', help='copy the path instead of opening it')
+    parser.add_argument('terms', nargs='*')
+    return parser
+
+  def match_arguments(self, args: argparse.Namespace, limit: t.Optional[int] = None) -> t.List[Result]:
+    index = self._index
+    results: t.List[Result] = []
+    if index is None:
+      results.append(Result('#pending', 'Pending', 'Indexing files ...'))
+    elif args.terms:
+      result_type = CopyPathCommand if args.copy else OpenFileCommand
+      results.extend(result_type(path) for path in index.search(args.terms, limit))
+    if self._error is not None:
+      results.append(Result('#error', 'Error', None, self._error))
+    return results
+
+  def refine_arguments(
+    self,
+    args: argparse.Namespace,
+    cached_args: argparse.Namespace,
+    results: t.List[Result],
+  ) -> t.Optional[t.List[Result]]:
+    # Every path that contains the new terms also contains the cached terms if each of them
+    # is part of a new term, e.g. when the last term was extended.
+    result_type = CopyPathCommand if args.copy else OpenFileCommand
+    # Compared like FileIndex.search() compares them, which ignores the case of ASCII only.
+    terms = [os.fsencode(term).lower() for term in args.terms if term]
+    cached_terms = [os.fsencode(term).lower() for term in cached_args.terms if term]
+    if args.copy != cached_args.copy or not cached_terms or self._error is not None:
+      return None
+    if not all(any(cached in term for term in terms) for cached in cached_terms):
+      return None
+    if not all(type(result) is result_type for result in results):
+      return None
+    return [result_type(path) for path in filter_paths([result.id for result in results], args.terms)]
+
+
+class OpenFileCommand(Result, IsRunnable):
+  """
+  Opens a file or directory with the default application. The #Result.id is the path.
+  """
+
+  __slots__ = ()
+
+  def __init__(self, path: str) -> None:
+    super().__init__(path, os.path.basename(path) or path)
+
+  def get_description(self) -> str:
+    return os.path.dirname(self.id)
+
+  def run(self) -> None:
+    if sys.platform == 'win32':
+      os.startfile(self.id)  # type: ignore
+    elif sys.platform == 'darwin':
+      subprocess.Popen(['open', self.id])
+    else:
+      subprocess.Popen(['xdg-open', self.id])
+
+
+class CopyPathCommand(Result, IsClipboardValueProducer):
+  """
+  Copies the path of a file or directory to the clipboard.
+  """
+
+  __slots__ = ()
+
+  def __init__(self, path: str) -> None:
+    super().__init__(path, os.path.basename(path) or path)
+
+  def get_description(self) -> str:
+    return f'Copy <i>{self.id}</i> to clipboard.'
+
+  def get_value(self) -> str:
+    return self.id
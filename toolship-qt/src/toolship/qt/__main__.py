@@ -2,14 +2,17 @@
 import argparse
 import logging
 
+from toolship.core import tracing
+from toolship.core.client import DaemonClient, RemoteToolship
+from toolship.core.discovery import LazyPlugin, StartupReport, discover_plugins
+from toolship.core.frecency import FrecencyStore, default_frecency_path
+from toolship.core.hosting import HostedPlugin, parse_host_argument
 from toolship.core.manager import Toolship
 from .main import ToolshipGui
 #from toolship.plugins.quit import QuitPlugin
-from toolship.yubikey import YubikeyPlugin
 
-ship = Toolship()
+ship = Toolship(parallel=True, frecency=FrecencyStore(default_frecency_path()))
 #ship.add_plugin('quit', QuitPlugin())
-ship.add_plugin('yk', YubikeyPlugin())
 
 
 def main():
@@ -18,7 +21,42 @@ def main():
   parser.add_argument('-k', '--keep-open', action='store_true')
   parser.add_argument('-f', '--frameless', action='store_true')
   parser.add_argument('-H', '--hotkey', default='ctrl+alt+space')
+  parser.add_argument('--idle-timeout', type=float, default=ship.idle_timeout, metavar='SECONDS',
+    help='keep plugins loaded for this long after the window was hidden (default: %(default)s)')
+  parser.add_argument('--startup-report', action='store_true',
+    help='import all plugins immediately and print the time it took for each of them')
+  parser.add_argument('--attach', nargs='?', const='', metavar='SOCKET',
+    help='use the plugins of a running `toolship daemon` instead of loading them')
+  parser.add_argument('--trace', metavar='PATH',
+    help='record a trace and write it to PATH on exit (Chrome trace format, see also $TOOLSHIP_TRACE)')
+  parser.add_argument('--host', action='append', default=[], metavar='PLUGIN_ID[:PROCESSES]',
+    help='run a plugin in PROCESSES separate processes (default: 1), can be specified multiple times')
   args = parser.parse_args()
+  try:
+    hosted = dict(map(parse_host_argument, args.host))
+  except ValueError as exc:
+    parser.error(str(exc))
+  ship.idle_timeout = args.idle_timeout
+  if args.trace:
+    tracing.enable(args.trace)
+
+  if args.attach is not None:
+    remote = RemoteToolship(DaemonClient(args.attach or None), ship.limit)
+    ToolshipGui.mainloop(remote, args.keep_open, args.frameless, args.hotkey)
+    return
+
+  report = StartupReport()
+  plugins = [
+    HostedPlugin(spec, hosted[spec.id]) if spec.id in hosted else LazyPlugin(spec, report)
+    for spec in discover_plugins(report)]
+  for plugin in plugins:
+    ship.add_plugin(plugin.spec.id, plugin)
+  if args.startup_report:
+    for plugin in plugins:
+      if isinstance(plugin, LazyPlugin):
+        plugin.plugin
+    print(report.format())
+
   ToolshipGui.mainloop(ship, args.keep_open, args.frameless, args.hotkey)
 
 
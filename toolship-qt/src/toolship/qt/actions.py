@@ -0,0 +1,120 @@
+
+import concurrent.futures
+import logging
+import typing as t
+
+from PySide2 import QtCore
+from toolship.core import tracing
+from toolship.core.plugins import IsClipboardValueProducer, Result
+
+log = logging.getLogger(__name__)
+
+
+class ActionRunner(QtCore.QObject):
+  """
+  Performs the action of a result (#IsClipboardValueProducer.get_value() or
+  #IsRunnable.run()) on a worker thread, so that the GUI thread is not blocked while e.g. a
+  YubiKey waits to be touched. The outcome is delivered to the GUI thread through the
+  #finished and #failed signals.
+
+  Only one action is pending at a time. An action that is cancelled or does not complete
+  within *timeout* seconds is abandoned: threads can not be interrupted, so it may still
+  complete in the background, but its outcome is discarded.
+
+  # Arguments
+  parent: The parent object.
+  timeout: The number of seconds after which a pending action fails. Pass #None to wait
+    indefinitely.
+  max_workers: The number of worker threads. Should be larger than one so that an action
+    that was abandoned does not delay the next one.
+  """
+
+  #: Emitted on the GUI thread with the plugin ID, the result and the value that it
+  #: produced (#None for #IsRunnable results) when an action completed.
+  finished = QtCore.Signal(str, object, object)
+
+  #: Emitted on the GUI thread with the plugin ID, the result and an error message when an
+  #: action raised an exception or timed out.
+  failed = QtCore.Signal(str, object, str)
+
+  _completed = QtCore.Signal(int, object, object)
+
+  def __init__(self, parent: t.Any = None, timeout: t.Optional[float] = 30.0, max_workers: int = 4) -> None:
+    super().__init__(parent)
+    self.timeout = timeout
+    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix='toolship.action')
+    self._ticket = 0
+    self._current: t.Optional[t.Tuple[int, str, Result, concurrent.futures.Future]] = None
+    self._timer = QtCore.QTimer(self)
+    self._timer.setSingleShot(True)
+    self._timer.timeout.connect(self._onTimeout)
+    self._completed.connect(self._onCompleted)
+
+  @property
+  def pending(self) -> t.Optional[t.Tuple[str, Result]]:
+    """
+    The plugin ID and result of the action that is currently pending.
+    """
+
+    return (self._current[1], self._current[2]) if self._current else None
+
+  def submit(self, plugin_id: str, result: Result) -> None:
+    """
+    Perform the action of *result* on a worker thread. Cancels the pending action.
+    """
+
+    self.cancel()
+    self._ticket += 1
+    ticket = self._ticket
+
+    def _worker() -> None:
+      # Note: Called from a worker thread.
+      with tracing.span('ActionRunner.perform', plugin=plugin_id):
+        try:
+          if isinstance(result, IsClipboardValueProducer):
+            value: t.Optional[str] = result.get_value()
+          else:
+            result.run()  # type: ignore
+            value = None
+        except Exception as exc:
+          log.exception('Unhandled exception while invoking %s', result)
+          self._completed.emit(ticket, None, str(exc) or type(exc).__name__)
+        else:
+          self._completed.emit(ticket, value, None)
+
+    self._current = (ticket, plugin_id, result, self._executor.submit(_worker))
+    if self.timeout is not None:
+      self._timer.start(int(self.timeout * 1000))
+
+  def cancel(self) -> bool:
+    """
+    Cancel the pending action. Returns #True if an action was pending.
+    """
+
+    self._timer.stop()
+    if self._current is None:
+      return False
+    self._current[3].cancel()
+    self._current = None
+    return True
+
+  def shutdown(self) -> None:
+    self.cancel()
+    self._executor.shutdown(wait=False)
+
+  def _onTimeout(self) -> None:
+    pending = self.pending
+    if pending is not None:
+      self.cancel()
+      self.failed.emit(pending[0], pending[1], f'Timed out after {self.timeout:g} seconds')
+
+  def _onCompleted(self, ticket: int, value: t.Optional[str], error: t.Optional[str]) -> None:
+    if self._current is None or self._current[0] != ticket:
+      return  # The action was cancelled or timed out.
+    _ticket, plugin_id, result, _future = self._current
+    self._timer.stop()
+    self._current = None
+    if error is not None:
+      self.failed.emit(plugin_id, result, error)
+    else:
+      self.finished.emit(plugin_id, result, value)
@@ -1,136 +1,373 @@
 
 import typing as t
 
+from nr.optional import Optional
 from PySide2 import QtCore, QtGui, QtWidgets
+from toolship.core import tracing
 from toolship.core.manager import Toolship
-from .utils import extend_or_trim
+from .scheduler import QueryScheduler
+from .utils import contiguous_ranges
 
 from toolship.core.plugins import Result
 
 
-class CommandPaletteItem(QtWidgets.QWidget):
-  clickedEvent = QtCore.Signal()
-  _plugin_id: str
-  _result: Result
+class CommandPaletteModel(QtCore.QAbstractListModel):
+  """
+  A flat list model of `(plugin_id, result)` tuples. The #Result is available through the
+  #ResultRole and the plugin ID through the #PluginIdRole.
+  """
+
+  PluginIdRole = QtCore.Qt.UserRole + 1
+  ResultRole = QtCore.Qt.UserRole + 2
 
   def __init__(self, parent: t.Any = None) -> None:
     super().__init__(parent)
-    self._layout = QtWidgets.QVBoxLayout(self)
-    self._layout.setAlignment(QtCore.Qt.AlignTop)
-    self.setObjectName("root")
-    self._active = False
-    self._name = QtWidgets.QLabel('')
-    self._name.setObjectName("name")
-    self._description = QtWidgets.QLabel('')
-    self._description.setObjectName("description")
-    self.setAttribute(QtCore.Qt.WA_StyledBackground, True)
-    self._layout.addWidget(self._name)
-    self._layout.addWidget(self._description)
-    self._layout.setContentsMargins(3, 4, 4, 4)
-    self._update_style()
-
-  def _update_style(self) -> None:
-    background_color = 'rgba(255, 255, 255, 0.1)' if self._active else 'none'
-    self.setStyleSheet(f"""
-      #root {{ background-color: {background_color}; }}
-      #description {{
-        font-weight: normal;
-        font-size: 12px;
-      }}
-    """)
-
-  def setActive(self, active: bool) -> None:
-    self.setResult(self._plugin_id, self._result, active)
-
-  def setResult(self, plugin_id: str, result: Result, active: bool) -> 'CommandPaletteItem':
-    self._plugin_id = plugin_id
-    self._result = result
-    self._active = active
-    self._name.setText(f'{result.name} <sub>{plugin_id}</sub>')
-    self._description.setText(result.description or result.error or '')
-    self._description.setVisible(bool(active and (result.description or result.error)))
-    self._update_style()
-    return self
+    self._results: t.List[t.Tuple[str, Result]] = []
 
-  def mousePressEvent(self, event: QtGui.QMouseEvent) -> None:
-    self.clickedEvent.emit()
-    event.accept()
+  def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+    return 0 if parent.isValid() else len(self._results)
+
+  def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.DisplayRole) -> t.Any:
+    if not index.isValid() or index.row() >= len(self._results):
+      return None
+    plugin_id, result = self._results[index.row()]
+    if role == QtCore.Qt.DisplayRole:
+      return result.name
+    elif role == self.PluginIdRole:
+      return plugin_id
+    elif role == self.ResultRole:
+      return result
+    return None
+
+  def results(self) -> t.List[t.Tuple[str, Result]]:
+    return self._results
+
+  def setResults(self, results: t.List[t.Tuple[str, Result]]) -> None:
+    """
+    Replace the results of the model. Rows are matched by their `(plugin_id, result.id)` key
+    so that the view is only notified about the rows that were actually removed, inserted,
+    moved or changed.
+    """
+
+    old_keys = [(plugin_id, result.id) for plugin_id, result in self._results]
+    new_keys = [(plugin_id, result.id) for plugin_id, result in results]
+    new_set = set(new_keys)
+    if len(new_set) != len(new_keys) or len(set(old_keys)) != len(old_keys):
+      # Keys are not unique, we can not match the rows.
+      self.beginResetModel()
+      self._results = results
+      self.endResetModel()
+      return
+
+    current = list(self._results)
+
+    # Remove the rows that are gone, bottom to top so that the row numbers stay valid.
+    removed = [idx for idx, key in enumerate(old_keys) if key not in new_set]
+    for first, last in reversed(list(contiguous_ranges(removed))):
+      self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+      del current[first:last + 1]
+      del old_keys[first:last + 1]
+      self._results = current
+      self.endRemoveRows()
+
+    old_set = set(old_keys)
+    if [key for key in new_keys if key in old_set] == old_keys:
+      # The remaining rows are in the right order, insert the new rows in between.
+      inserted = [idx for idx, key in enumerate(new_keys) if key not in old_set]
+      for first, last in contiguous_ranges(inserted):
+        self.beginInsertRows(QtCore.QModelIndex(), first, last)
+        current[first:first] = results[first:last + 1]
+        self._results = current
+        self.endInsertRows()
+    else:
+      # Append the new rows, then move all rows into their new position.
+      added = [command for command in results if (command[0], command[1].id) not in old_set]
+      if added:
+        self.beginInsertRows(QtCore.QModelIndex(), len(current), len(current) + len(added) - 1)
+        current += added
+        self._results = current
+        self.endInsertRows()
+      self.layoutAboutToBeChanged.emit()
+      new_rows = {key: idx for idx, key in enumerate(new_keys)}
+      for index in self.persistentIndexList():
+        plugin_id, result = current[index.row()]
+        self.changePersistentIndex(index, self.index(new_rows[(plugin_id, result.id)]))
+      current = list(results)
+      self._results = current
+      self.layoutChanged.emit()
+
+    # Rows with the same key may still display something else (see #Result.__eq__()). Most
+    # queries return new but equal #Result objects, which do not need to be painted again.
+    changed = [idx for idx, (command, new) in enumerate(zip(current, results)) if command[1] != new[1]]
+    self._results = results
+    for first, last in contiguous_ranges(changed):
+      self.dataChanged.emit(self.index(first), self.index(last))
+
+
+class _Style(t.NamedTuple):
+  font: QtGui.QFont
+  metrics: QtGui.QFontMetrics
+  small_font: QtGui.QFont
+  small_metrics: QtGui.QFontMetrics
+
+
+class CommandPaletteDelegate(QtWidgets.QStyledItemDelegate):
+  """
+  Paints a row of the #CommandPalette: the result name followed by the plugin ID and the
+  status of the row (see #CommandPalette.setStatus()) and, for the current row only, the
+  description (or error) of the result below it. Only the rows that are visible are ever
+  painted.
+
+  Fonts and metrics are derived once per view font, and the laid out description of the
+  current row is kept until the current row or the width of the view changes, so painting
+  a row does not allocate or parse anything.
+  """
+
+  margins = QtCore.QMargins(3, 4, 4, 4)
+  spacing = 4
+  small_font_size = 12
+  active_brush = QtGui.QBrush(QtGui.QColor(255, 255, 255, int(0.1 * 255)))
+
+  def __init__(self, view: 'CommandPalette') -> None:
+    super().__init__(view)
+    self._view = view
+    self._styles: t.Dict[str, _Style] = {}
+    self._document_key: t.Optional[t.Tuple[t.Any, ...]] = None
+    self._document: t.Optional[QtGui.QTextDocument] = None
+
+  def _style(self, font: QtGui.QFont) -> _Style:
+    key = font.key()
+    style = self._styles.get(key)
+    if style is None:
+      small_font = QtGui.QFont(font)
+      small_font.setPixelSize(self.small_font_size)
+      small_font.setBold(False)
+      style = self._styles[key] = _Style(font, QtGui.QFontMetrics(font), small_font, QtGui.QFontMetrics(small_font))
+    return style
+
+  def _textWidth(self) -> int:
+    return self._view.viewport().width() - self.margins.left() - self.margins.right()
+
+  def _descriptionDocument(self, index: QtCore.QModelIndex, style: _Style) -> t.Optional[QtGui.QTextDocument]:
+    if index.row() != self._view.currentRow():
+      return None
+    result: Result = index.data(CommandPaletteModel.ResultRole)
+    text = result.description or result.error
+    if not text:
+      return None
+    width = self._textWidth()
+    key = (index.data(CommandPaletteModel.PluginIdRole), result.id, text, style.font.key(), width)
+    if key != self._document_key:
+      document = QtGui.QTextDocument()
+      document.setDocumentMargin(0)
+      document.setDefaultFont(style.small_font)
+      document.setHtml(text)
+      document.setTextWidth(width)
+      self._document_key, self._document = key, document
+    return self._document
 
+  def sizeHint(self, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> QtCore.QSize:
+    style = self._style(option.font)
+    height = style.metrics.height() + self.margins.top() + self.margins.bottom()
+    document = self._descriptionDocument(index, style)
+    if document is not None:
+      height += self.spacing + int(document.size().height())
+    return QtCore.QSize(option.rect.width(), height)
+
+  def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> None:
+    painter.save()
+    try:
+      rect = option.rect
+      if index.row() == self._view.currentRow():
+        painter.fillRect(rect, self.active_brush)
+
+      style = self._style(option.font)
+      color = option.palette.color(QtGui.QPalette.Text)
+      painter.setPen(color)
+      content = rect.marginsRemoved(self.margins)
+
+      # Name, followed by the plugin ID in a smaller font.
+      painter.setFont(style.font)
+      name = style.metrics.elidedText(index.data(QtCore.Qt.DisplayRole) or '', QtCore.Qt.ElideRight, content.width())
+      baseline = content.top() + style.metrics.ascent()
+      painter.drawText(content.left(), baseline, name)
+      painter.setFont(style.small_font)
+      left = content.left() + style.metrics.horizontalAdvance(name) + self.spacing
+      plugin_id = index.data(CommandPaletteModel.PluginIdRole) or ''
+      painter.drawText(left, baseline, plugin_id)
+      status = self._view.statusText(index)
+      if status:
+        painter.drawText(left + style.small_metrics.horizontalAdvance(plugin_id) + self.spacing, baseline, status)
+
+      document = self._descriptionDocument(index, style)
+      if document is not None:
+        painter.translate(content.left(), content.top() + style.metrics.height() + self.spacing)
+        context = QtGui.QAbstractTextDocumentLayout.PaintContext()
+        context.palette.setColor(QtGui.QPalette.Text, color)
+        document.documentLayout().draw(painter, context)
+    finally:
+      painter.restore()
+
+
+class CommandPalette(QtWidgets.QListView):
+  """
+  Displays the results of a query. The view is virtualized: no matter how many results
+  there are, only the visible rows are laid out and painted.
+  """
 
-class CommandPalette(QtWidgets.QScrollArea):
   selectedEvent = QtCore.Signal(str, Result, name='selectedEvent')
 
   def __init__(self, toolship: Toolship, parent: t.Any = None) -> None:
     super().__init__(parent)
-    self.setWidgetResizable(True)
-    self._container = QtWidgets.QWidget()
-    self._container.setObjectName("container")
-    self.setWidget(self._container)
-    self._toolship = toolship
-    self._layout = QtWidgets.QVBoxLayout(self._container)
-    self._layout.setSpacing(0)
+    self._model = CommandPaletteModel(self)
+    self._delegate = CommandPaletteDelegate(self)
+    self.setModel(self._model)
+    self.setItemDelegate(self._delegate)
+    self.setFocusPolicy(QtCore.Qt.NoFocus)
+    self.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+    self.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+    self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+    self.setLayoutMode(QtWidgets.QListView.Batched)
     self.setContentsMargins(0, 0, 0, 0)
-    self._layout.setContentsMargins(0, 0, 0, 0)
-    self._layout.setAlignment(QtCore.Qt.AlignTop)
-    self._items: t.List[CommandPaletteItem] = []
-    self._results: t.List[t.Tuple[str, Result]] = []
+    self._toolship = toolship
     self._current_row = 0
+    self._generation = 0
+    self._query = ''
+    self._batches: t.Dict[str, t.List[t.Tuple[str, Result]]] = {}
+    self._wanted: t.Optional[t.Tuple[str, str]] = None
+    # The generation of the query whose "keystroke" span was not ended yet.
+    self._keystroke: t.Optional[int] = None
+    # The generation of the query whose first results were not painted yet.
+    self._unpainted: t.Optional[int] = None
+    self._status: t.Optional[t.Tuple[t.Tuple[str, str], str]] = None
+    self._scheduler = QueryScheduler(toolship, self)
+    self._scheduler.batchReady.connect(self._mergeBatch)
+    self._scheduler.finished.connect(self._finishQuery)
 
   def rowCount(self) -> int:
-    return len(self._items)
+    return self._model.rowCount()
 
   def currentRow(self) -> int:
     return self._current_row
 
   def setCurrentRow(self, idx: int) -> None:
     old_idx = self._current_row
-    if self._items:
-      self._current_row = idx % len(self._items)
+    count = self.rowCount()
+    if count:
+      self._current_row = idx % count
     else:
       self._current_row = 0
-    if self._current_row < 0:
-      self._current_row += len(self._items)
     if old_idx != self._current_row:
-      self._items[old_idx].setActive(False)
-      self._items[self._current_row].setActive(True)
-      self.ensureWidgetVisible(self._items[self._current_row])
+      # The current row displays the description, so its size changes.
+      if old_idx < count:
+        self._delegate.sizeHintChanged.emit(self._model.index(old_idx))
+      self._delegate.sizeHintChanged.emit(self._model.index(self._current_row))
+      self.scrollTo(self._model.index(self._current_row))
+    self._wanted = Optional(self.current()).map(lambda c: (c[0], c[1].id)).or_else(None)
 
   def current(self) -> t.Optional[t.Tuple[str, Result]]:
     try:
-      return self._results[self._current_row]
+      return self._model.results()[self._current_row]
     except IndexError:
       return None
 
+  def setStatus(self, key: t.Optional[t.Tuple[str, str]], text: str = '') -> None:
+    """
+    Display *text* next to the plugin ID of the row with the `(plugin_id, result.id)` *key*,
+    e.g. while the action of the result is running. Pass #None to clear the status. The
+    status stays with the result when the results change.
+    """
+
+    self._status = (key, text) if key is not None else None
+    self.viewport().update()
+
+  def statusText(self, index: QtCore.QModelIndex) -> t.Optional[str]:
+    if self._status is None:
+      return None
+    key, text = self._status
+    plugin_id, result = self._model.results()[index.row()]
+    return text if (plugin_id, result.id) == key else None
+
+  def mousePressEvent(self, event: QtGui.QMouseEvent) -> None:
+    index = self.indexAt(event.pos())
+    if index.isValid():
+      if index.row() == self._current_row:
+        self.selectedEvent.emit(*self._model.results()[index.row()])
+      else:
+        self.setCurrentRow(index.row())
+    event.accept()
+
   def update(self, query: str) -> None:
-    selected = self.current()
-    self._results = self._toolship.get_commands(query)
+    """
+    Schedule a query on the #Toolship and paint the results of every plugin as soon as they
+    arrive. The results of the previous query stay visible until the first plugin responds,
+    or are cleared if no plugin responds.
+    """
 
-    # Find the same selected result again.
-    self._current_row = 0
-    if selected:
-      for idx, (plugin_id, result) in enumerate(self._results):
-        if plugin_id == selected[0]  and result.id == selected[1].id:
-          self._current_row = idx
-          break
-
-    # Update the widgets.
-    def _factory(idx: int, t: t.Tuple[str, Result]) -> CommandPalette:
-      widget = CommandPaletteItem()
-      def _clicked():
-        if idx == self._current_row:
-          self.selectedEvent.emit(t[0], t[1])
-        else:
-          self.setCurrentRow(idx)
-      widget.clickedEvent.connect(_clicked)
-      self._layout.addWidget(widget)
-      return widget
-
-    extend_or_trim(
-      self._items,
-      self._results,
-      _factory,
-      lambda idx, t, w: w.setResult(t[0], t[1], idx == self._current_row),
-      lambda idx, w: (self._layout.removeWidget(w), w.setParent(None))
-    )
-
-    self.setVisible(bool(self._items))
+    with tracing.span('CommandPalette.update'):
+      # The previous query may not have been painted yet, its span ends here.
+      self._endKeystroke(superseded=True)
+      self._query = query
+      self._batches = {}
+      self._wanted = Optional(self.current()).map(lambda c: (c[0], c[1].id)).or_else(None)
+      self._generation = self._scheduler.submit(query)
+    tracing.begin('keystroke', self._generation, query=query)
+    self._keystroke = self._generation
+
+  def _mergeBatch(self, generation: int, plugin_id: str, commands: t.List[t.Tuple[str, Result]]) -> None:
+    if generation != self._generation:
+      return  # The batch belongs to a query that has since been superseded.
+
+    with tracing.span('CommandPalette.mergeBatch', plugin=plugin_id):
+      self._batches[plugin_id] = commands
+      results = self._toolship.rank(self._query, (c for batch in self._batches.values() for c in batch))
+
+      # Find the selected result again, it may have moved or been in a previous batch.
+      current_row = 0
+      if self._wanted:
+        for idx, (other_id, result) in enumerate(results):
+          if (other_id, result.id) == self._wanted:
+            current_row = idx
+            break
+
+      self._setResults(results, current_row)
+    if len(self._batches) == 1:
+      if results:
+        self._unpainted = generation
+      else:
+        self._endKeystroke()  # The view is hidden, so there is nothing to paint.
+
+  def _finishQuery(self, generation: int) -> None:
+    if generation != self._generation or self._batches:
+      return
+    # No plugin responded to the query (e.g. because no plugin handles its prefix), so the
+    # results of the previous query must not stay visible and selectable.
+    self._setResults([])
+    self._endKeystroke()
+
+  def paintEvent(self, event: QtGui.QPaintEvent) -> None:
+    with tracing.span('CommandPalette.paint'):
+      super().paintEvent(event)
+    if self._unpainted is not None:
+      # The "keystroke" span ends when the first results of the query are painted.
+      self._endKeystroke()
+
+  def _endKeystroke(self, **args: t.Any) -> None:
+    if self._keystroke is not None:
+      tracing.end('keystroke', self._keystroke, **args)
+      self._keystroke = None
+    self._unpainted = None
+
+  def _setResults(self, results: t.List[t.Tuple[str, Result]], current_row: int = 0) -> None:
+    old_row = self._current_row
+    with tracing.span('CommandPaletteModel.setResults', rows=len(results)):
+      self._model.setResults(results)
+    self._current_row = current_row
+    if results:
+      # Only the rows that display the description change their size, all other rows that
+      # were not touched by the model keep their layout.
+      if old_row != current_row and old_row < len(results):
+        self._delegate.sizeHintChanged.emit(self._model.index(old_row))
+      self._delegate.sizeHintChanged.emit(self._model.index(current_row))
+      self.scrollTo(self._model.index(current_row))
+    self.setVisible(bool(results))
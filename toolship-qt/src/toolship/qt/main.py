@@ -3,17 +3,22 @@ import logging
 import re
 import signal
 import sys
+import time
 import typing as t
 
 from nr.optional import Optional
 from PySide2 import QtCore
+from PySide2 import QtGui
 from PySide2 import QtWidgets
 from PySide2.QtGui import QKeyEvent
 from PySide2.QtWidgets import QApplication, QMainWindow
 
+from toolship.core import tracing
 from toolship.core.hotkeys import HotkeyListener
 from toolship.core.manager import Toolship
-from toolship.core.plugins import IsQuitCommand, IsRunnable, IsClipboardValueProducer
+from toolship.core.metrics import LatencyHistogram
+from toolship.core.plugins import IsQuitCommand, IsRunnable, IsClipboardValueProducer, Result
+from .actions import ActionRunner
 from .utils import qt_threadsafe_connect, qt_threadsafe_method
 from .commandpalette import CommandPalette
 
@@ -27,11 +32,21 @@ class ToolshipGui(QMainWindow):
   text_color: str = 'white'
   background_color: str = '#334'
 
+  #: The time from #summon() being called (usually by the hotkey) until the window was
+  #: painted for the first time.
+  summon_latency: LatencyHistogram
+
   def __init__(self, toolship: Toolship, minimize: bool, frameless: bool = True) -> None:
     super().__init__()
     qt_threadsafe_connect(self)
     self._toolship = toolship
     self._minimize = minimize
+    self._summoned_at: t.Optional[float] = None
+    # Registered with the toolship so that it is displayed by the `#stats` query.
+    self.summon_latency = toolship.latencies.setdefault('summon', LatencyHistogram())
+    self._actions = ActionRunner(self)
+    self._actions.finished.connect(self._onActionFinished)
+    self._actions.failed.connect(self._onActionFailed)
     self.setWindowFlags(QtCore.Qt.WindowStaysOnTopHint)
     if frameless:
       self.setWindowFlag(QtCore.Qt.FramelessWindowHint)
@@ -47,10 +62,8 @@ class ToolshipGui(QMainWindow):
         font: bold large "Segoe UI";
         font-size: 16px;
       }}
-      #searchQueryInput, #searchResults, #searchResults #container {{
-        border-radius: {self.border_radius}px;
-      }}
       #searchQueryInput, #searchResults {{
+        border-radius: {self.border_radius}px;
         padding: {self.padding}px;
         width: 600px;
         background-color: {self.background_color};
@@ -79,7 +92,10 @@ class ToolshipGui(QMainWindow):
 
   def keyPressEvent(self, event: QKeyEvent) -> None:
     if event.key() == QtCore.Qt.Key_Escape:
-      self.close()
+      if self._actions.cancel():
+        self.searchResults.setStatus(None)
+      else:
+        self.close()
     elif event.key() == QtCore.Qt.Key_Down:
       self._moveSelection(1)
     elif event.key() == QtCore.Qt.Key_Up:
@@ -90,36 +106,69 @@ class ToolshipGui(QMainWindow):
 
   @qt_threadsafe_method
   def close(self, force: bool = False) -> None:
-    self._toolship.on_unload()
+    self._actions.cancel()
+    self.searchResults.setStatus(None)
     if not self._minimize or force:
+      self._actions.shutdown()
+      self._toolship.on_unload()
+      self._toolship.shutdown()
       super().close()
       sys.exit()
     else:
+      # Keep the plugins warm in case the window is summoned again shortly.
+      self._toolship.deactivate()
       self.hide()
 
+  def summon(self) -> None:
+    """
+    Show the window and measure the time until it is painted. Can be called from any thread.
+    """
+
+    self._summoned_at = time.perf_counter()
+    tracing.begin('summon', id(self))
+    self.show()
+
   @qt_threadsafe_method
   def show(self) -> None:
-    super().show()
-    self._toolship.on_load()
-    self.searchQueryInput.setText('')
-    self.activateWindow()
-    self.raise_()
-    self.searchQueryInput.setFocus(QtCore.Qt.ActiveWindowFocusReason)
+    with tracing.span('ToolshipGui.show'):
+      # Returns immediately, the plugins are loaded in the background. This must happen
+      # before the query input is cleared so that the query waits for the plugins.
+      self._toolship.activate()
+      self.searchQueryInput.setText('')
+      super().show()
+      self.activateWindow()
+      self.raise_()
+      self.searchQueryInput.setFocus(QtCore.Qt.ActiveWindowFocusReason)
+
+  def paintEvent(self, event: QtGui.QPaintEvent) -> None:
+    with tracing.span('ToolshipGui.paint'):
+      super().paintEvent(event)
+    if self._summoned_at is not None:
+      elapsed = time.perf_counter() - self._summoned_at
+      self._summoned_at = None
+      self.summon_latency.record(elapsed)
+      tracing.end('summon', id(self))
+      log.info('Summoned in %.1fms', elapsed * 1000)
 
   def _dispatchCommand(self) -> None:
-    result = Optional(self.searchResults.current()).map(lambda r: r[1]).or_else(None)
-    try:
-      if isinstance(result, IsQuitCommand):
-        self.close(True)
-      elif isinstance(result, IsClipboardValueProducer):
-        value = result.get_value()
-        QApplication.clipboard().setText(value)
-        self.close()
-      elif isinstance(result, IsRunnable):
-        result.run()
-        self.close()
-    except Exception:
-      log.exception("Unhandled exception while invoking %s", result)
+    plugin_id, result = Optional(self.searchResults.current()).or_else((None, None))
+    if isinstance(result, IsQuitCommand):
+      self.close(True)
+    elif isinstance(result, (IsClipboardValueProducer, IsRunnable)) and self._actions.pending is None:
+      # The action may take a while (e.g. a YubiKey that waits to be touched), so it runs on
+      # a worker thread and the window stays responsive. Esc cancels it.
+      self._actions.submit(plugin_id, result)
+      self.searchResults.setStatus((plugin_id, result.id), 'Working ...')
+
+  def _onActionFinished(self, plugin_id: str, result: Result, value: t.Optional[str]) -> None:
+    self.searchResults.setStatus(None)
+    if value is not None:
+      QApplication.clipboard().setText(value)
+    self._toolship.record_selection(plugin_id, result)
+    self.close()
+
+  def _onActionFailed(self, plugin_id: str, result: Result, message: str) -> None:
+    self.searchResults.setStatus((plugin_id, result.id), 'Failed: ' + message)
 
   def _moveSelection(self, amount: int) -> None:
     idx = self.searchResults.currentRow() + amount
@@ -127,7 +176,8 @@ class ToolshipGui(QMainWindow):
     self.searchResults.setCurrentRow(idx)
 
   def _searchQueryInput_textChanged(self, query: str) -> None:
-    self.searchResults.update(query)
+    with tracing.span('textChanged'):
+      self.searchResults.update(query)
 
   def _onFocusChanged(self, current: t.Optional[QtWidgets.QWidget], next: t.Optional[QtWidgets.QWidget]) -> None:
     if next is None:
@@ -137,14 +187,14 @@ class ToolshipGui(QMainWindow):
   def mainloop(toolship: Toolship, minimize: bool, frameless: bool, hotkey: t.Optional[str] = None) -> None:
     app = QApplication()
     wnd = ToolshipGui(toolship, minimize, frameless)
-    wnd.show()
+    wnd.summon()
     app.focusChanged.connect(wnd._onFocusChanged)
 
     signal.signal(signal.SIGINT, lambda *a: wnd.close(True))
 
     if hotkey:
       kb_listener = HotkeyListener()
-      kb_listener.add(hotkey, wnd.show)
+      kb_listener.add(hotkey, wnd.summon, on_partial=toolship.prewarm)
       kb_listener.start()
       print('started hotkey listener')
 
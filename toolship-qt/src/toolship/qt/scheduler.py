@@ -0,0 +1,128 @@
+
+import time
+import typing as t
+
+from PySide2 import QtCore
+from toolship.core.manager import Toolship
+from toolship.core.pending import PendingQuery
+
+
+class QueryScheduler(QtCore.QObject):
+  """
+  Sits between the search input and the #Toolship. Queries are dispatched to the worker
+  pool of the #Toolship so that the GUI thread is never blocked by a plugin. Every query is
+  tagged with a generation number; when a new query is submitted, the previous one is
+  cancelled and batches that still arrive for it are dropped.
+
+  Queries are debounced based on how long the plugins recently took to respond. If all
+  plugins respond quickly, queries are dispatched immediately. If a plugin is slow, the
+  scheduler waits for the user to pause typing instead of queueing up work that would be
+  outdated by the time it completes.
+
+  # Arguments
+  toolship: The toolship to dispatch queries to.
+  min_debounce: The minimum number of seconds to wait before a query is dispatched.
+  max_debounce: The maximum number of seconds to wait before a query is dispatched.
+  debounce_factor: The debounce interval is the latency of the slowest plugin multiplied
+    with this factor, bounded by *min_debounce* and *max_debounce*.
+  """
+
+  #: Emitted on the GUI thread with the generation, plugin ID and the commands of a plugin
+  #: when a plugin responded to the current query.
+  batchReady = QtCore.Signal(int, str, object)
+
+  #: Emitted on the GUI thread with the generation of the current query once all plugins
+  #: have responded to it. Also emitted when the query is not routed to any plugin.
+  finished = QtCore.Signal(int)
+
+  _batchReceived = QtCore.Signal(int, str, object, float)
+  _queryFinished = QtCore.Signal(int)
+
+  #: The weight of a new latency sample in the moving average of a plugin's latency.
+  _SMOOTHING = 0.3
+
+  def __init__(
+    self,
+    toolship: Toolship,
+    parent: t.Any = None,
+    min_debounce: float = 0.0,
+    max_debounce: float = 0.15,
+    debounce_factor: float = 0.5,
+  ) -> None:
+    super().__init__(parent)
+    self.min_debounce = min_debounce
+    self.max_debounce = max_debounce
+    self.debounce_factor = debounce_factor
+    self._toolship = toolship
+    self._generation = 0
+    self._query = ''
+    self._pending: t.Optional[PendingQuery] = None
+    self._latencies: t.Dict[str, float] = {}
+    self._timer = QtCore.QTimer(self)
+    self._timer.setSingleShot(True)
+    self._timer.timeout.connect(self._dispatch)
+    # Queued, because busy plugins are reported from within #submit().
+    self._batchReceived.connect(self._onBatchReceived, QtCore.Qt.QueuedConnection)
+    # Queued, so that the signal is not emitted from within #submit() for unrouted queries.
+    self._queryFinished.connect(self._onQueryFinished, QtCore.Qt.QueuedConnection)
+
+  @property
+  def generation(self) -> int:
+    return self._generation
+
+  def debounce_interval(self) -> float:
+    """
+    Returns the number of seconds that the next query will be delayed by.
+    """
+
+    latency = max(self._latencies.values(), default=0.0)
+    return min(max(latency * self.debounce_factor, self.min_debounce), self.max_debounce)
+
+  def submit(self, query: str) -> int:
+    """
+    Schedule a query and return its generation number. Cancels the previous query.
+    """
+
+    self.cancel()
+    self._generation += 1
+    self._query = query
+    interval = self.debounce_interval()
+    if interval <= 0:
+      self._dispatch()
+    else:
+      self._timer.start(int(interval * 1000))
+    return self._generation
+
+  def cancel(self) -> None:
+    """
+    Cancel the current query, if it was not already dispatched or completed.
+    """
+
+    self._timer.stop()
+    if self._pending:
+      self._pending.cancel()
+      self._pending = None
+
+  def _dispatch(self) -> None:
+    generation = self._generation
+    dispatched = time.perf_counter()
+
+    def _callback(plugin_id: str, commands: t.List) -> None:
+      # Note: Called from a worker thread.
+      self._batchReceived.emit(generation, plugin_id, commands, time.perf_counter() - dispatched)
+
+    self._pending = self._toolship.stream_commands(self._query, _callback)
+    # Note: Called from a worker thread, or right away if no plugin handles the query.
+    self._pending.add_done_callback(lambda _pending: self._queryFinished.emit(generation))
+
+  def _onBatchReceived(self, generation: int, plugin_id: str, commands: t.List, latency: float) -> None:
+    if not commands or any(result.id != Toolship.PENDING_ID for _plugin_id, result in commands):
+      # A plugin that is busy is reported right away, that is not its latency.
+      previous = self._latencies.get(plugin_id, latency)
+      self._latencies[plugin_id] = previous + self._SMOOTHING * (latency - previous)
+    if generation == self._generation:
+      self.batchReady.emit(generation, plugin_id, commands)
+
+  def _onQueryFinished(self, generation: int) -> None:
+    if generation == self._generation:
+      self.finished.emit(generation)
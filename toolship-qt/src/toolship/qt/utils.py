@@ -62,3 +62,25 @@ def extend_or_trim(
       delete(idx, target.pop())
   else:
     target[:] = target[:len(reference)]
+
+
+def contiguous_ranges(indices: t.Iterable[int]) -> t.Iterator[t.Tuple[int, int]]:
+  """
+  Groups sorted *indices* into inclusive `(first, last)` ranges of consecutive numbers.
+
+  ```python
+  >>> list(contiguous_ranges([0, 1, 2, 5, 7, 8]))
+  [(0, 2), (5, 5), (7, 8)]
+  ```
+  """
+
+  first = last = None
+  for idx in indices:
+    if last is not None and idx == last + 1:
+      last = idx
+      continue
+    if first is not None:
+      yield first, last
+    first = last = idx
+  if first is not None:
+    yield first, last
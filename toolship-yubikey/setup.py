@@ -38,7 +38,11 @@ setuptools.setup(
   tests_require = [],
   python_requires = '>=3.5.0,<4.0.0',
   data_files = [],
-  entry_points = {},
+  entry_points = {
+    'toolship.plugins': [
+      'yk = toolship.yubikey:spec',
+    ]
+  },
   cmdclass = {},
   keywords = [],
   classifiers = [],
@@ -0,0 +1,295 @@
+
+import argparse
+import concurrent.futures
+import logging
+import threading
+import time
+import typing as t
+from yubikit.core.smartcard import SmartCardConnection
+
+from yubikit.oath import OATH_TYPE, Code, Credential, OathSession
+from ykman.device import list_all_devices, scan_devices
+
+from toolship.core.plugins import ArgparsingPlugin, IsClipboardValueProducer, IsRunnable, Result, PluginMatchError
+
+log = logging.getLogger(__name__)
+
+
+class _DeviceSession:
+  """
+  An open connection to a YubiKey. The credentials are read from the device only once. The
+  connection must not be used by multiple threads at the same time, use the #lock.
+
+  TOTP codes are computed for all credentials at once with #refresh_codes() and cached by
+  credential and time step. Codes for credentials that require touch and HOTP credentials
+  are not cached, they are computed when they are requested.
+  """
+
+  def __init__(self, conn: SmartCardConnection, serial: t.Optional[int]) -> None:
+    self.conn = conn
+    self.serial = serial
+    self.session = OathSession(conn)
+    self.lock = threading.Lock()
+    self._credentials: t.Optional[t.List[Credential]] = None
+    self._codes: t.Dict[t.Tuple[bytes, int], Code] = {}
+    self._on_demand: t.Set[bytes] = set()
+    #: The end of the time window that the most recent codes are valid for.
+    self.window_end = 0.0
+
+  def credentials(self) -> t.List[Credential]:
+    # The list is never modified once it was read, so it can be returned without waiting
+    # for the lock while another thread e.g. waits for the device to be touched.
+    credentials = self._credentials
+    if credentials is not None:
+      return credentials
+    with self.lock:
+      if self._credentials is None:
+        self._credentials = sorted(self.session.list_credentials(), key=lambda c: c.issuer or c.name)
+      return self._credentials
+
+  def refresh_codes(self) -> None:
+    """
+    Computes the TOTP codes of all credentials for the current time window, or for the next
+    window if the current one was already computed.
+    """
+
+    now = time.time()
+    with self.lock:
+      entries = self.session.calculate_all(int(max(now, self.window_end)))
+    codes = {key: code for key, code in self._codes.items() if code.valid_to > now}
+    for cred, code in entries.items():
+      if code is None:
+        self._on_demand.add(cred.id)
+      else:
+        codes[(cred.id, code.valid_from // cred.period)] = code
+    window_end = min((code.valid_to for code in entries.values() if code is not None), default=now)
+    self._codes, self.window_end = codes, window_end
+
+  def calculate_code(self, cred: Credential) -> str:
+    if cred.oath_type == OATH_TYPE.TOTP and cred.id not in self._on_demand:
+      code = self._codes.get((cred.id, int(time.time()) // cred.period))
+      if code is not None:
+        return code.value
+    with self.lock:
+      return self.session.calculate_code(cred).value
+
+  def close(self) -> None:
+    try:
+      self.conn.close()
+    except Exception:
+      log.exception('Unable to close YubiKey connection')
+
+
+class YubikeyPlugin(ArgparsingPlugin):
+  """
+  Lists the OATH credentials on all connected YubiKeys. The credentials are read once when
+  a device is connected and then filtered in memory, so typing a query never talks to the
+  devices. While the plugin is loaded, a background thread watches for YubiKeys being
+  inserted or removed and reconnects. Failed connection attempts are retried with an
+  exponential backoff.
+
+  Devices are connected concurrently and each device can be used as soon as its
+  credentials were read, so a slow or locked device does not hold back the others.
+
+  The watcher also computes the TOTP codes of all credentials shortly before each time
+  window starts, so that copying a code does not have to wait for the device.
+
+  The plugin is not cacheable because its results change as devices are connected; it keeps
+  the credentials in memory instead.
+  """
+
+  cacheable = False
+
+  #: The number of seconds between two scans for inserted or removed devices.
+  poll_interval = 1.0
+
+  #: The minimum and maximum number of seconds to wait before connecting again after a
+  #: connection attempt failed.
+  min_backoff = 0.5
+  max_backoff = 30.0
+
+  #: The number of seconds before the end of a TOTP time window to compute the codes for
+  #: the next window. Should be larger than the #poll_interval.
+  refresh_ahead = 2.0
+
+  #: The number of seconds that a query waits for devices that are still being connected.
+  connect_wait = 0.05
+
+  def __init__(self) -> None:
+    self._devices: t.Dict[t.Hashable, _DeviceSession] = {}
+    self._connecting: t.Dict[t.Hashable, 'concurrent.futures.Future[None]'] = {}
+    self._errors: t.Dict[t.Hashable, str] = {}
+    self._generation = 0
+    self._backoff = 0.0
+    self._retry_at: t.Optional[float] = None
+    self._connect_lock = threading.Lock()
+    self._executor = concurrent.futures.ThreadPoolExecutor(4, thread_name_prefix='toolship.yubikey')
+    self._watcher: t.Optional[threading.Thread] = None
+    self._stopped = threading.Event()
+
+  def on_load(self) -> None:
+    if self._watcher is None:
+      self._stopped.clear()
+      self._watcher = threading.Thread(target=self._watch, name='toolship.yubikey', daemon=True)
+      self._watcher.start()
+
+  def on_unload(self) -> None:
+    if self._watcher is not None:
+      self._stopped.set()
+      self._watcher.join()
+      self._watcher = None
+    self._close()
+
+  def _close(self) -> None:
+    with self._connect_lock:
+      devices, self._devices = self._devices, {}
+      self._connecting = {}
+      self._errors = {}
+      self._generation += 1
+      self._backoff = 0.0
+      self._retry_at = None
+    for device in devices.values():
+      device.close()
+
+  def _watch(self) -> None:
+    state = None
+    while not self._stopped.is_set():
+      try:
+        new_state = scan_devices()[1]
+      except Exception:
+        log.exception('Unable to scan for YubiKeys')
+        new_state = state
+      if new_state != state:
+        if state is not None:
+          log.info('YubiKeys were inserted or removed, reconnecting')
+          self._close()
+        state = new_state
+        self._connect()
+      elif self._retry_at is not None and time.monotonic() >= self._retry_at:
+        self._connect()
+
+      due = [d for d in self._devices.values() if time.time() >= d.window_end - self.refresh_ahead]
+      for future in concurrent.futures.as_completed([self._executor.submit(d.refresh_codes) for d in due]):
+        try:
+          future.result()
+        except Exception:
+          log.exception('Unable to compute YubiKey codes')
+      self._stopped.wait(self.poll_interval)
+
+  def _schedule_retry(self) -> None:
+    # Note: Must be called with the connect lock held.
+    self._backoff = min(max(self._backoff * 2, self.min_backoff), self.max_backoff)
+    self._retry_at = time.monotonic() + self._backoff
+    log.info('Connecting to YubiKeys failed, retrying in %.1fs: %s', self._backoff, self._errors)
+
+  def _connect(self) -> None:
+    """
+    Connects to all YubiKeys that are not already connected. Every device is connected on
+    a worker thread of the plugin.
+    """
+
+    with self._connect_lock:
+      self._retry_at = None
+      self._errors.pop(None, None)
+      try:
+        found = list_all_devices()
+        if not found:
+          raise RuntimeError('No YubiKey connected.')
+      except Exception as exc:
+        self._errors[None] = str(exc)
+        self._schedule_retry()
+        return
+      for dev, info in found:
+        key = info.serial or dev.fingerprint
+        if key not in self._devices and key not in self._connecting:
+          self._connecting[key] = self._executor.submit(self._open, self._generation, key, dev, info)
+
+  def _open(self, generation: int, key: t.Hashable, dev: t.Any, info: t.Any) -> None:
+    device = None
+    try:
+      device = _DeviceSession(dev.open_connection(SmartCardConnection), info.serial)
+      device.credentials()
+    except Exception as exc:
+      log.info('Unable to connect to YubiKey %s: %s', key, exc)
+      if device:
+        device.close()
+      device = None
+      error = str(exc)
+    with self._connect_lock:
+      if generation != self._generation:
+        # The devices changed while connecting.
+        if device:
+          device.close()
+        return
+      self._connecting.pop(key, None)
+      if device:
+        self._devices[key] = device
+        self._errors.pop(key, None)
+        if not self._errors:
+          self._backoff = 0.0
+      else:
+        self._errors[key] = error
+        if self._retry_at is None:
+          self._schedule_retry()
+
+  def calculate_code(self, cred: Credential) -> str:
+    for device in list(self._devices.values()):
+      if cred.device_id == device.session.device_id:
+        return device.calculate_code(cred)
+    raise RuntimeError(f'The YubiKey for {cred.issuer or cred.name} is not connected.')
+
+  def get_prefix(self) -> str:
+    return 'yk'
+
+  def get_parser(self) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('query', nargs='?')
+    return parser
+
+  def match_arguments(self, args: argparse.Namespace, limit: t.Optional[int] = None) -> t.List['Result']:
+    if self._watcher is None and not self._devices and not self._connecting and \
+        (self._retry_at is None or time.monotonic() >= self._retry_at):
+      self._connect()
+    concurrent.futures.wait(list(self._connecting.values()), timeout=self.connect_wait)
+
+    query = (args.query or '').strip().lower()
+    results: t.List[Result] = []
+    devices = list(self._devices.values())
+    for device in devices:
+      for cred in device.credentials():
+        if not query or query in (cred.issuer or cred.name).lower():
+          results.append(OathCommand(self, device.serial, cred, show_serial=len(devices) > 1))
+
+    connecting = ', '.join(str(key) for key in list(self._connecting))
+    if connecting:
+      results.append(Result('#pending', 'Pending', f'Connecting to YubiKey {connecting} ...'))
+    errors = list(self._errors.items())
+    if errors:
+      results.append(Result('#error', 'Error', None, '<br/>'.join(
+        (f'YubiKey {key}: {error}' if key is not None else error) for key, error in errors)))
+    return results
+
+
+class OathCommand(Result, IsClipboardValueProducer):
+  """
+  Copies the code of an OATH credential. If *show_serial* is enabled, the name includes
+  the serial of the YubiKey, so that the same account on multiple devices can be told apart.
+  """
+
+  __slots__ = ('serial', '_plugin', '_cred')
+
+  def __init__(self, plugin: YubikeyPlugin, serial: t.Optional[int], cred: Credential, show_serial: bool = False) -> None:
+    name = cred.issuer or cred.name
+    if show_serial and serial is not None:
+      name = f'{name} ({serial})'
+    super().__init__(cred.device_id + '/' + cred.id.decode('utf8'), name)
+    self.serial = serial
+    self._plugin = plugin
+    self._cred = cred
+
+  def get_description(self) -> str:
+    return f'Copy {self._cred.issuer or self._cred.name} {self._cred.oath_type.name} code for <i>{self._cred.name}</i> ' \
+      f'from YubiKey {self.serial} to clipboard.'
+
+  def get_value(self) -> str:
+    return self._plugin.calculate_code(self._cred)